@@ -1,31 +1,297 @@
-from flask import Flask, jsonify, request, send_file, Response, render_template, redirect, url_for
+from flask import Flask, jsonify, request, send_file, Response, render_template, redirect, url_for, g
 from flask_cors import CORS
 import os
 import sys
 import json
+import atexit
+import tempfile
+import time
+import threading
 from pathlib import Path
 import datetime
-import random  # For mock dashboard data
+
+from order_index import OrderIndex, extract_cpt_codes, extract_location
+from pipeline import OrderPipeline, PipelineError
+from jobs import JobQueue, QueueFullError, PRIORITY_HIGH, PRIORITY_NORMAL, PRIORITY_LOW
+from watcher import OrderFolderWatcher, HandOffLater, NEW, MODIFIED, EXISTING
+from batch import BatchRun, pending_order_ids
+from documentai_client import DocumentAIClientCache, processor_health_check
+from startup import StartupTimings
+from ocr_cache import OCRCache
+from parallel_ocr import ParallelOCR, RateLimiter
+from crm import CRMExport, EXPORT_FORMATS, build_crm_payload, write_crm_file, mark_ready
+from caches import TTLCache
+from compression import compress_response
+from results_store import OrderNotFoundError, VersionConflictError, create_results_store, normalize_etag
+from llm_cache import LLMCache, model_settings_from
+from provider_index import ProviderIndex, provider_loader
+from fingerprints import file_digest, json_digest
+from previews import PreviewRenderer, PageNotFoundError, is_previewable
+from documents import OCRTextStore, document_page_count
+from email_cache import EmailCache, AttachmentNotFoundError, INLINE_CONTENT_TYPES, format_email
+from werkzeug.utils import safe_join
+from config import INPUT_DIR, OUTPUT_DIR, OCR_DIR, CRM_DIR, RESULTS_BACKEND, RESULTS_DB
+from stats import OrderStats
+from metrics import Metrics, CONTENT_TYPE as METRICS_CONTENT_TYPE
+from events import (EventBroker, TooManySubscribersError, parse_last_event_id,
+                    PROCESSING_QUEUED, PROCESSING_STARTED, PROCESSING_FINISHED, PROCESSING_FAILED,
+                    ORDER_UPDATED, ORDER_APPROVED, ORDER_PACKAGED, PROVIDER_SELECTED)
 
 # Add the path to your existing code
-sys.path.append(r'C:\Users\ChristopherCato\OneDrive - clarity-dx.com\Intake AI Agent\referrals')
+sys.path.append(os.environ.get('REFERRALS_DIR', r'C:\Users\ChristopherCato\OneDrive - clarity-dx.com\Intake AI Agent\referrals'))
 
-# Import your existing modules
-from process import process_order_folder, format_llm_request, save_results
-from llm_client import call_llm_api
-from extract import initialize_documentai
-from provider_mapping_simple import find_nearest_providers, test_database_connection
+# Import your existing modules (timed, these dominate cold start)
+startup_timings = StartupTimings()
+with startup_timings.measure("import process"):
+    from process import process_order_folder, format_llm_request, save_results
+with startup_timings.measure("import llm_client"):
+    import llm_client
+    from llm_client import call_llm_api
+with startup_timings.measure("import extract"):
+    from extract import initialize_documentai
+with startup_timings.measure("import provider_mapping_simple"):
+    import provider_mapping_simple
+    from provider_mapping_simple import find_nearest_providers, test_database_connection
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
 
+# No pretty-printing, even under the debug server; order lists and OCR text are large
+app.json.compact = True
+# JSON and text responses at least this big are brotli/gzip compressed (COMPRESS_RESPONSES=0 turns this off)
+COMPRESS_RESPONSES = os.environ.get('COMPRESS_RESPONSES', '1').lower() in ('1', 'true', 'yes')
+COMPRESS_MIN_BYTES = int(os.environ.get('COMPRESS_MIN_BYTES', 1024))
+
 # Set secret key for session
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-key-change-in-production')
 
-# Configure paths
-INPUT_DIR = Path(r'C:\Users\ChristopherCato\OneDrive - clarity-dx.com\Intake AI Agent\data\orders')
-OUTPUT_DIR = Path(r'C:\Users\ChristopherCato\OneDrive - clarity-dx.com\Intake AI Agent\data\results')
-OCR_DIR = Path(r'C:\Users\ChristopherCato\OneDrive - clarity-dx.com\Intake AI Agent\data\ocr')
+# Checkpoints of bulk CRM exports, so an interrupted export can resume. Kept on local disk rather than
+# next to the results, which may be on a synced drive
+CRM_EXPORT_DIR = Path(os.environ.get('CRM_EXPORT_DIR', Path(tempfile.gettempdir()) / 'referral_crm_exports'))
+# Completed exports stay visible to GET /api/crm/exports/<id> for a day; interrupted ones can be resumed for a week
+CRM_EXPORT_KEEP_COMPLETED_HOURS = float(os.environ.get('CRM_EXPORT_KEEP_COMPLETED_HOURS', 24))
+CRM_EXPORT_KEEP_INTERRUPTED_HOURS = float(os.environ.get('CRM_EXPORT_KEEP_INTERRUPTED_HOURS', 168))
+
+# Stage histograms, request latency and component counters, scraped from /metrics
+metrics = Metrics()
+
+# All reads and writes of order results go through the store (per-order locks, atomic writes, ETags).
+# RESULTS_BACKEND=json keeps one {order_id}_results.json per order; sqlite uses an indexed database
+# (import existing files with migrate_results.py)
+results_store = create_results_store(RESULTS_BACKEND, OUTPUT_DIR, database_path=RESULTS_DB)
+
+# Running dashboard counters, kept in step with the order index and saved with it
+order_stats = OrderStats()
+
+# Order summaries served to the list views; built on first use and kept fresh in the background
+order_index = OrderIndex(INPUT_DIR, results_store, OUTPUT_DIR / '.order_index.json',
+                         refresh_interval=int(os.environ.get('ORDER_INDEX_REFRESH_SECONDS', 30)),
+                         persist_interval=int(os.environ.get('ORDER_INDEX_PERSIST_SECONDS', 5)),
+                         stats=order_stats)
+results_store.on_change = order_index.refresh_order
+# Write out the last changes on shutdown rather than waiting for the next flush
+atexit.register(order_index.flush)
+
+# One Document AI client per process, rebuilt only on auth failure. With DOCUMENTAI_PROCESSOR_NAME
+# (projects/.../locations/.../processors/...) /readyz also checks the processor can be reached;
+# without it, only that the client can be created
+DOCUMENTAI_PROCESSOR_NAME = os.environ.get('DOCUMENTAI_PROCESSOR_NAME')
+documentai = DocumentAIClientCache(initialize_documentai, timings=startup_timings,
+                                   health_check=processor_health_check(DOCUMENTAI_PROCESSOR_NAME)
+                                   if DOCUMENTAI_PROCESSOR_NAME else None)
+
+# OCR output keyed by document content, so reprocessing skips unchanged files
+ocr_cache = OCRCache(Path(os.environ.get('OCR_CACHE_DIR', OCR_DIR / '.cache')),
+                     max_bytes=int(os.environ.get('OCR_CACHE_MAX_MB', 1024)) * 1024 * 1024)
+
+# Downscaled page renders of TIFF/image documents; PREVIEW_PRERENDER=1 renders them after processing
+preview_renderer = PreviewRenderer(Path(os.environ.get('PREVIEW_CACHE_DIR', OCR_DIR / '.previews')),
+                                   max_bytes=int(os.environ.get('PREVIEW_CACHE_MAX_MB', 512)) * 1024 * 1024)
+PREVIEW_PRERENDER = os.environ.get('PREVIEW_PRERENDER', '').lower() in ('1', 'true', 'yes')
+
+# OCR text served a page or character range at a time by /api/orders/<id>/documents/<name>/ocr
+ocr_texts = OCRTextStore(OCR_DIR)
+
+# .eml documents parsed once per content hash: headers, text body and attachments
+email_cache = EmailCache(Path(os.environ.get('EMAIL_CACHE_DIR', OCR_DIR / '.emails')),
+                         max_bytes=int(os.environ.get('EMAIL_CACHE_MAX_MB', 256)) * 1024 * 1024)
+
+# LLM responses keyed by request + model settings; identical concurrent requests share one call
+llm_cache = LLMCache(Path(os.environ.get('LLM_CACHE_DIR', OUTPUT_DIR / '.llm_cache')),
+                     ttl=int(os.environ.get('LLM_CACHE_TTL_HOURS', 168)) * 3600,
+                     max_entries=int(os.environ.get('LLM_CACHE_MAX_ENTRIES', 5000)),
+                     model_settings=model_settings_from(llm_client, {
+                         "model": os.environ.get('LLM_MODEL'),
+                         "cache_version": os.environ.get('LLM_CACHE_VERSION', '1')
+                     }))
+
+# An order's documents are OCR'd concurrently (OCR_WORKERS=1 OCRs them one at a time), with Document AI
+# calls limited to OCR_RATE_PER_SECOND across all orders (0 turns the limit off)
+OCR_RATE_PER_SECOND = float(os.environ.get('OCR_RATE_PER_SECOND', 5))
+ocr_runner = ParallelOCR(metrics.instrument("ocr_document", documentai.with_reauth(process_order_folder)),
+                         max_workers=int(os.environ.get('OCR_WORKERS', 4)),
+                         rate_limiters={"documentai": RateLimiter(OCR_RATE_PER_SECOND)} if OCR_RATE_PER_SECOND > 0 else {},
+                         attempts=int(os.environ.get('OCR_ATTEMPTS', 3)),
+                         base_delay=float(os.environ.get('OCR_RETRY_DELAY_SECONDS', 1)),
+                         staging_dir=os.environ.get('OCR_STAGING_DIR'),
+                         ocr_cache=ocr_cache)
+
+# Processing pipeline and the worker pool that runs it off the request thread
+pipeline = OrderPipeline(INPUT_DIR,
+                         initialize_documentai=documentai.get,
+                         process_order_folder=metrics.instrument("process_order_folder", ocr_runner),
+                         format_llm_request=metrics.instrument("format_llm_request", format_llm_request),
+                         call_llm_api=metrics.instrument("call_llm_api", call_llm_api),
+                         save_results=metrics.instrument("save_results", save_results),
+                         ocr_cache=ocr_cache,
+                         llm_cache=llm_cache,
+                         results_store=results_store,
+                         stats=order_stats)
+
+# Order lifecycle events streamed to open browser tabs (GET /api/events)
+# Each open stream holds a server thread (WEB_THREADS per process, see wsgi.py/gunicorn.conf.py) for up to
+# 30 minutes, so by default at most half the threads go to streams and the rest stay free for requests.
+# Tabs turned away get a 503 and try again later.
+WEB_THREADS = int(os.environ.get('WEB_THREADS', 32))
+EVENT_STREAM_MAX_CLIENTS = int(os.environ.get('EVENT_STREAM_MAX_CLIENTS', max(1, WEB_THREADS // 2)))
+events = EventBroker(max_subscribers=EVENT_STREAM_MAX_CLIENTS,
+                     heartbeat=int(os.environ.get('EVENT_STREAM_HEARTBEAT_SECONDS', 15)))
+
+def publish_order_event(event_type, order_id, **data):
+    """Push an order event carrying the order's list-view summary, so clients don't refetch"""
+    try:
+        entry = order_index.get(order_id)
+        if entry is not None:
+            entry.pop("result_version", None)
+        events.publish(event_type, order_id, order=entry, **data)
+    except Exception as e:
+        print(f"Error publishing {event_type} event for order {order_id}: {str(e)}")
+
+def run_process_job(order_id, refresh=False):
+    """Job runner: process an order (the store refreshes its index entry on every write)"""
+    publish_order_event(PROCESSING_STARTED, order_id)
+    try:
+        results = pipeline.run(order_id, refresh=refresh)
+    except Exception as e:
+        # Nothing may have been written, but the error counts saved with the index changed
+        order_index.mark_dirty()
+        publish_order_event(PROCESSING_FAILED, order_id, error=str(e))
+        raise
+    publish_order_event(PROCESSING_FINISHED, order_id)
+    
+    if PREVIEW_PRERENDER:
+        try:
+            with metrics.timed("prerender_previews"):
+                preview_renderer.prerender_folder(pipeline.order_folder(order_id))
+        except Exception as e:
+            print(f"Error pre-rendering previews for order {order_id}: {str(e)}")
+    return results
+
+job_queue = JobQueue(run_process_job,
+                     max_workers=int(os.environ.get('PROCESS_WORKERS', 2)),
+                     max_queued=int(os.environ.get('PROCESS_QUEUE_SIZE', 200)),
+                     profiler=metrics.profile)
+
+# New and changed order folders are queued for processing once their files settle (WATCH_ORDERS=0 turns this off).
+# Unprocessed folders already there at start-up are queued too (WATCH_INCLUDE_EXISTING=0 only remembers them)
+WATCH_ORDERS = os.environ.get('WATCH_ORDERS', '1').lower() in ('1', 'true', 'yes')
+# New referrals go ahead of reprocessing changed or left-over ones; clicks in the UI go ahead of both
+WATCH_PRIORITIES = {NEW: PRIORITY_NORMAL, MODIFIED: PRIORITY_LOW, EXISTING: PRIORITY_LOW}
+# Reviewed orders are never reprocessed automatically
+WATCH_SKIP_STATUSES = ('approved', 'ready for crm')
+
+def auto_process_order(order_id, reason):
+    """Watcher callback: index a new or changed order folder and queue it for processing"""
+    entry = order_index.refresh_order(order_id)
+    if entry is None:
+        return
+    status = (entry.get("status") or "Pending").lower()
+    if status in WATCH_SKIP_STATUSES or (reason == EXISTING and status != "pending"):
+        print(f"Order {order_id} changed ({reason}) but is {entry.get('status')}, not reprocessing")
+        return
+    try:
+        job, created = job_queue.submit(order_id, priority=WATCH_PRIORITIES[reason], source=f"watcher:{reason}")
+    except QueueFullError:
+        # The watcher offers it again once the queue has had time to drain
+        raise HandOffLater("processing queue full")
+    if created:
+        publish_order_event(PROCESSING_QUEUED, order_id, job_id=job.job_id)
+
+order_watcher = OrderFolderWatcher(INPUT_DIR, auto_process_order,
+                                   settle_seconds=float(os.environ.get('WATCH_SETTLE_SECONDS', 10)),
+                                   poll_seconds=float(os.environ.get('WATCH_POLL_SECONDS', 5)),
+                                   mode=os.environ.get('WATCH_MODE', 'auto'),
+                                   include_existing=os.environ.get('WATCH_INCLUDE_EXISTING', '1').lower() in ('1', 'true', 'yes'))
+
+# Spatial index of provider locations, loaded at startup and refreshable via /api/providers/refresh
+provider_index = ProviderIndex(provider_loader(provider_mapping_simple, os.environ.get('PROVIDER_INDEX_FILE')),
+                               cell_degrees=float(os.environ.get('PROVIDER_INDEX_CELL_DEGREES', 0.5)))
+
+def nearest_providers(latitude, longitude, proc_code=None, limit=5):
+    """Nearest providers from the in-memory index, or the provider database if the index isn't loaded"""
+    if provider_index.ready:
+        with metrics.timed("provider_index_lookup"):
+            return provider_index.nearest(latitude, longitude, proc_code=proc_code, limit=limit)
+    with metrics.timed("provider_db_lookup"):
+        return find_nearest_providers(latitude, longitude, proc_code=proc_code, limit=limit)
+
+# Short-lived results of provider lookups, keyed by rounded location + procedure code
+provider_query_cache = TTLCache(max_entries=int(os.environ.get('PROVIDER_CACHE_MAX_ENTRIES', 2048)),
+                                ttl=int(os.environ.get('PROVIDER_CACHE_TTL_SECONDS', 300)))
+# Patient location per order, keyed by results file mtime
+order_locations = TTLCache(max_entries=4096, ttl=3600)
+
+def cached_nearest_providers(latitude, longitude, proc_code=None, limit=5):
+    """nearest_providers() behind a TTL cache; a provider index reload starts a new generation"""
+    key = (round(float(latitude), 4), round(float(longitude), 4), proc_code or None, limit,
+           provider_index.generation)
+    providers = provider_query_cache.get(key)
+    if providers is None:
+        providers = nearest_providers(latitude, longitude, proc_code=proc_code, limit=limit)
+        provider_query_cache.set(key, providers)
+    return providers
+
+def match_order_providers(order_id, limit=5):
+    """Nearest providers and rates for every CPT code in an order"""
+    try:
+        results, _ = results_store.read(order_id)
+    except OrderNotFoundError as e:
+        return {"order_id": order_id, "error": str(e)}
+    
+    location = extract_location(results)
+    if location is None:
+        return {"order_id": order_id, "error": "No location data available for this order"}
+    latitude, longitude, address = location
+    cpt_codes = extract_cpt_codes(results)
+    
+    if provider_index.ready:
+        with metrics.timed("provider_index_match"):
+            matches = provider_index.match_procedures(latitude, longitude, cpt_codes, limit=limit)
+    else:
+        with metrics.timed("provider_db_lookup"):
+            matches = {code: find_nearest_providers(latitude, longitude, proc_code=code, limit=limit)
+                       for code in cpt_codes}
+    
+    return {
+        "order_id": order_id,
+        "patient_location": {"latitude": latitude, "longitude": longitude, "address": address},
+        "procedures": [{"cpt_code": code, "providers": matches.get(code) or []} for code in cpt_codes]
+    }
+
+# Batch runs started through the API, by batch ID, oldest first. Only the newest BATCH_KEEP_FINISHED
+# finished ones are kept for polling.
+batch_runs = {}
+batch_runs_lock = threading.Lock()
+BATCH_KEEP_FINISHED = int(os.environ.get('BATCH_KEEP_FINISHED', 50))
+BATCH_MAX_WORKERS = int(os.environ.get('BATCH_MAX_WORKERS', 16))
+
+def add_batch_run(batch):
+    """Register a new batch and forget the oldest finished ones beyond BATCH_KEEP_FINISHED"""
+    with batch_runs_lock:
+        finished = [batch_id for batch_id, run in batch_runs.items() if run.finished_at is not None]
+        for batch_id in finished[:max(0, len(finished) - BATCH_KEEP_FINISHED)]:
+            del batch_runs[batch_id]
+        batch_runs[batch.batch_id] = batch
 
 # Root route redirects to dashboard
 @app.route('/')
@@ -43,54 +309,16 @@ def index():
 
 @app.route('/dashboard')
 def dashboard():
-    # Get all orders
-    orders = []
-    for folder in INPUT_DIR.glob("*"):
-        if folder.is_dir():
-            order_id = folder.name
-            result_path = OUTPUT_DIR / f"{order_id}_results.json"
-            status = "Processed" if result_path.exists() else "Pending"
-            
-            order_info = {
-                "order_id": order_id,
-                "status": status,
-                "processed_date": None,
-                "patient_name": "Unknown Patient"
-            }
-            
-            if result_path.exists():
-                try:
-                    with open(result_path, 'r', encoding='utf-8') as f:
-                        result = json.load(f)
-                        # Add extracted patient name if available
-                        if "extracted_data" in result and "patient_name" in result["extracted_data"]:
-                            patient_data = result["extracted_data"]["patient_name"]
-                            if isinstance(patient_data, dict) and "value" in patient_data:
-                                order_info["patient_name"] = patient_data["value"]
-                                
-                        # Add status and date
-                        order_info["status"] = result.get("status", status)
-                        order_info["processed_date"] = result.get("processed_date")
-                except Exception as e:
-                    print(f"Error reading result file: {str(e)}")
-            
-            orders.append(order_info)
-    
-    # Calculate stats
-    total_orders = len(orders)
-    pending_orders = sum(1 for order in orders if order['status'].lower() == 'pending')
-    processed_orders = sum(1 for order in orders if order['status'].lower() == 'processed')
-    approved_orders = sum(1 for order in orders if order['status'].lower() == 'approved')
-    error_orders = sum(1 for order in orders if 'error' in order['status'].lower())
+    # Counters are kept up to date as orders change, so nothing is scanned here
+    order_index.ensure_built()
+    total_orders = order_stats.total()
+    pending_orders = order_stats.status_count(lambda status: status == 'pending')
+    processed_orders = order_stats.status_count(lambda status: status == 'processed')
+    approved_orders = order_stats.status_count(lambda status: status == 'approved')
+    error_orders = order_stats.status_count(lambda status: 'error' in status)
     
-    # Generate random data for timeline (last 7 days)
-    today = datetime.datetime.now()
-    timeline_labels = []
-    timeline_data = []
-    for i in range(6, -1, -1):
-        day = today - datetime.timedelta(days=i)
-        timeline_labels.append(day.strftime('%b %d'))
-        timeline_data.append(random.randint(0, 5))  # Random data for demonstration
+    # Processed / approved / failed per day for the last 7 days
+    timeline_labels, timeline_data, timeline_approved, timeline_errors = order_stats.timeline(7)
     
     # Calculate percentages
     pending_percentage = round((pending_orders / total_orders * 100) if total_orders > 0 else 0)
@@ -104,14 +332,20 @@ def dashboard():
         'processed_orders': processed_orders,
         'approved_orders': approved_orders,
         'error_orders': error_orders,
-        'new_orders_today': random.randint(0, 3),  # Random for demonstration
+        'new_orders_today': order_stats.received_on(),
         'pending_percentage': pending_percentage,
         'processed_percentage': processed_percentage,
         'approved_percentage': approved_percentage
     }
     
     # Get 5 most recent orders
-    recent_orders = sorted(orders, key=lambda x: x.get('processed_date', '') or '', reverse=True)[:5]
+    entries, _ = order_index.query(sort='processed_date', descending=True, limit=5)
+    recent_orders = [{
+        "order_id": entry["order_id"],
+        "status": entry["status"],
+        "processed_date": entry["processed_date"],
+        "patient_name": entry["patient_name"] or "Unknown Patient"
+    } for entry in entries]
     # Add status class for UI
     for order in recent_orders:
         status = order.get('status', '').lower()
@@ -134,51 +368,91 @@ def dashboard():
                           recent_orders=recent_orders,
                           timeline_labels=json.dumps(timeline_labels),
                           timeline_data=json.dumps(timeline_data),
+                          timeline_approved=json.dumps(timeline_approved),
+                          timeline_errors=json.dumps(timeline_errors),
                           current_user=mock_user)
 
 # API Routes
+ORDER_LIST_FIELDS = ("order_id", "status", "patient_name", "processed_date", "approved_date")
+ORDER_LIST_MAX_LIMIT = 500
+DATE_FIELDS = {"processed": "processed_date", "approved": "approved_date"}
+
+
 @app.route('/api/orders', methods=['GET'])
 def get_orders():
-    """Get all orders"""
+    """Get orders, filtered, sorted and paginated from the order index
+
+    Query parameters (all optional):
+      status, q (search order ID / patient name),
+      date_field (processed|approved), date_from, date_to,
+      sort (order_id|processed_date|approved_date), order (asc|desc),
+      fields (comma-separated), limit, cursor.
+    Without ``limit`` the matching orders are returned as a bare array, as
+    before; with it the response is {"orders", "next_cursor"}.
+    """
     try:
+        args = request.args
+        fields = None
+        if args.get('fields'):
+            fields = [field.strip() for field in args['fields'].split(',') if field.strip()]
+            unknown = [field for field in fields if field not in ORDER_LIST_FIELDS]
+            if unknown:
+                return jsonify({"error": f"Unknown fields: {', '.join(unknown)}"}), 400
+
+        limit = None
+        if args.get('limit'):
+            try:
+                limit = int(args['limit'])
+            except ValueError:
+                return jsonify({"error": "limit must be a number"}), 400
+            limit = max(1, min(limit, ORDER_LIST_MAX_LIMIT))
+
+        sort = args.get('sort', 'order_id')
+        date_field = args.get('date_field', 'processed')
+        try:
+            entries, next_cursor = order_index.query(
+                status=args.get('status') or None,
+                search=args.get('q') or None,
+                date_field=DATE_FIELDS.get(date_field, date_field),
+                date_from=args.get('date_from') or None,
+                date_to=args.get('date_to') or None,
+                sort=DATE_FIELDS.get(sort, sort),
+                descending=args.get('order', 'asc').lower() == 'desc',
+                cursor=args.get('cursor') or None,
+                limit=limit
+            )
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
         orders = []
-        for folder in INPUT_DIR.glob("*"):
-            if folder.is_dir():
-                order_id = folder.name
-                result_path = OUTPUT_DIR / f"{order_id}_results.json"
-                status = "Processed" if result_path.exists() else "Pending"
-                
-                order_info = {
-                    "order_id": order_id,
-                    "status": status,
-                    "processed_date": None
-                }
-                
-                if result_path.exists():
-                    try:
-                        with open(result_path, 'r', encoding='utf-8') as f:
-                            result = json.load(f)
-                            # Add extracted patient name if available
-                            if "extracted_data" in result and "patient_name" in result["extracted_data"]:
-                                patient_data = result["extracted_data"]["patient_name"]
-                                if isinstance(patient_data, dict) and "value" in patient_data:
-                                    order_info["patient_name"] = patient_data["value"]
-                    except Exception as e:
-                        print(f"Error reading result file: {str(e)}")
-                
-                orders.append(order_info)
+        for entry in entries:
+            if fields is not None:
+                orders.append({field: entry[field] for field in fields})
+                continue
+
+            order_info = {
+                "order_id": entry["order_id"],
+                "status": entry["status"],
+                "processed_date": entry["processed_date"]
+            }
+            if entry["patient_name"]:
+                order_info["patient_name"] = entry["patient_name"]
+            
+            orders.append(order_info)
         
-        return jsonify(orders)
+        if limit is None:
+            return jsonify(orders)
+        return jsonify({"orders": orders, "next_cursor": next_cursor})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @app.route('/api/orders/<order_id>', methods=['GET'])
 def get_order(order_id):
-    """Get a specific order's details"""
+    """Get a specific order's details (with an ETag for conditional updates)"""
     try:
-        result_path = OUTPUT_DIR / f"{order_id}_results.json"
-        
-        if not result_path.exists():
+        try:
+            result, etag = results_store.read(order_id)
+        except OrderNotFoundError:
             # Check if the order folder exists
             order_folder = INPUT_DIR / order_id
             if not order_folder.exists() or not order_folder.is_dir():
@@ -190,69 +464,318 @@ def get_order(order_id):
                 "message": "Order exists but has not been processed yet"
             })
         
-        with open(result_path, 'r', encoding='utf-8') as f:
-            result = json.load(f)
-            
-        return jsonify(result)
+        response = jsonify(result)
+        response.set_etag(etag)
+        return response
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @app.route('/api/orders/<order_id>/process', methods=['POST'])
 def process_order(order_id):
-    """Process or reprocess an order"""
+    """Queue an order for processing or reprocessing (?refresh=true bypasses the LLM cache)"""
     try:
-        order_folder = INPUT_DIR / order_id
-        
-        if not order_folder.exists() or not order_folder.is_dir():
-            return jsonify({"error": f"Order folder not found: {order_id}"}), 404
-        
-        # Initialize Document AI
-        initialize_documentai()
-        
-        # Process the order using existing pipeline
-        order_data = process_order_folder(order_folder)
-        
-        if not order_data["documents"]:
-            return jsonify({"error": f"No valid documents found in order folder: {order_id}"}), 400
+        pipeline.order_folder(order_id)
+    except PipelineError as e:
+        return jsonify({"error": str(e)}), 404
+    
+    # refresh=true forces a fresh LLM extraction instead of reusing a cached response
+    data = request.get_json(silent=True) or {}
+    refresh = str(request.args.get('refresh', data.get('refresh', ''))).lower() in ('1', 'true', 'yes')
+    
+    try:
+        job, created = job_queue.submit(order_id, priority=PRIORITY_HIGH, source="manual", refresh=refresh)
+    except QueueFullError as e:
+        return jsonify({"error": str(e)}), 503
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    
+    if created:
+        publish_order_event(PROCESSING_QUEUED, order_id, job_id=job.job_id)
+    
+    response = job.to_dict()
+    response["message"] = f"Order {order_id} queued for processing" if created else f"Order {order_id} is already being processed"
+    response["status_url"] = url_for('get_job', job_id=job.job_id)
+    return jsonify(response), 202
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Poll the status of a processing job"""
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": f"Job not found: {job_id}"}), 404
+    return jsonify(job.to_dict(include_result=True))
+
+@app.route('/api/jobs', methods=['GET'])
+def list_jobs():
+    """List known processing jobs, newest first"""
+    jobs = [job.to_dict() for job in reversed(job_queue.list_jobs())]
+    return jsonify({"jobs": jobs, "stats": job_queue.stats()})
+
+@app.route('/api/orders/<order_id>/job', methods=['GET'])
+def get_order_job(order_id):
+    """Latest processing job for an order"""
+    job = job_queue.latest_for_order(order_id)
+    if job is None:
+        return jsonify({"error": f"No processing job for order: {order_id}"}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/api/batches', methods=['POST'])
+def start_batch():
+    """Process a list of orders (default: all Pending orders) in the background"""
+    try:
+        data = request.get_json(silent=True) or {}
+        try:
+            ocr_workers = int(data.get('ocr_workers', os.environ.get('BATCH_OCR_WORKERS', 4)))
+            llm_workers = int(data.get('llm_workers', os.environ.get('BATCH_LLM_WORKERS', 2)))
+        except (TypeError, ValueError):
+            return jsonify({"error": "ocr_workers and llm_workers must be numbers"}), 400
+        order_ids = data.get('order_ids') or pending_order_ids(order_index)
         
-        api_request = format_llm_request(order_data)
-        llm_response = call_llm_api(api_request)
+        def order_done(order_id):
+            summary = batch.orders.get(order_id) or {}
+            if summary.get("status") == "failed":
+                publish_order_event(PROCESSING_FAILED, order_id, error=summary.get("error"), batch_id=batch.batch_id)
+            else:
+                publish_order_event(PROCESSING_FINISHED, order_id, batch_id=batch.batch_id)
         
-        # Save results using existing function
-        results = save_results(order_id, order_data, api_request, llm_response)
+        batch = BatchRun(pipeline, order_ids,
+                         ocr_workers=min(ocr_workers, BATCH_MAX_WORKERS),
+                         llm_workers=min(llm_workers, BATCH_MAX_WORKERS),
+                         on_order_done=order_done, job_queue=job_queue)
+        add_batch_run(batch)
+        batch.start()
         
-        return jsonify({"message": f"Order {order_id} processed successfully", "results": results})
+        response = batch.summary()
+        response["status_url"] = url_for('get_batch', batch_id=batch.batch_id)
+        return jsonify(response), 202
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/batches/<batch_id>', methods=['GET'])
+def get_batch(batch_id):
+    """Progress and per-order summary of a batch run"""
+    with batch_runs_lock:
+        batch = batch_runs.get(batch_id)
+    if batch is None:
+        return jsonify({"error": f"Batch not found: {batch_id}"}), 404
+    return jsonify(batch.summary())
+
+def collect_component_metrics():
+    """Counters the caches, job queue and other components already keep, read at scrape time"""
+    caches = {"ocr": ocr_cache.stats(), "llm": llm_cache.stats(), "providers": provider_query_cache.stats()}
+    llm = caches["llm"]
+    jobs = job_queue.stats()
+    samples = [
+        ("cache_hits_total", "counter", "Cache lookups that found an entry",
+         {(("cache", name),): stats["hits"] for name, stats in caches.items()}),
+        ("cache_misses_total", "counter", "Cache lookups that found nothing",
+         {(("cache", name),): stats["misses"] for name, stats in caches.items()}),
+        ("cache_evictions_total", "counter", "Entries evicted from a cache",
+         {(("cache", name),): stats["evictions"] for name, stats in caches.items()}),
+        ("cache_entries", "gauge", "Entries currently in a cache",
+         {(("cache", name),): stats["entries"] for name, stats in caches.items()}),
+        ("ocr_documents_total", "counter", "Documents OCRed or served from the OCR cache",
+         {(("result", "ocred"),): caches["ocr"]["documents_ocred"],
+          (("result", "cached"),): caches["ocr"]["documents_skipped"]}),
+        ("llm_upstream_calls_total", "counter", "LLM calls actually sent to the model",
+         {(): llm["upstream_calls"]}),
+        ("llm_coalesced_total", "counter", "LLM requests that waited on an identical in-flight call",
+         {(): llm["coalesced"]}),
+        ("llm_in_flight", "gauge", "LLM calls currently running", {(): llm["in_flight"]}),
+        ("retries_total", "counter", "Operations retried after a transient failure",
+         {(("operation", "documentai_reauth"),): documentai.reinit_count,
+          (("operation", "results_write"),): getattr(results_store, "write_retries", 0),
+          (("operation", "results_read"),): getattr(results_store, "read_retries", 0),
+          (("operation", "ocr_document"),): ocr_runner.retries}),
+        ("jobs", "gauge", "Processing jobs by state",
+         {(("state", state),): jobs[state] for state in ("queued", "running", "succeeded", "failed")}),
+        ("event_stream_clients", "gauge", "Open /api/events streams", {(): events.stats()["subscribers"]}),
+        ("provider_index_providers", "gauge", "Providers in the spatial index",
+         {(): provider_index.stats()["providers"]}),
+        ("watcher_orders_queued_total", "counter", "Order folders handed to processing by the watcher",
+         {(): order_watcher.handed_off}),
+        ("watcher_pending_folders", "gauge", "Changed order folders waiting for their files to settle",
+         {(): order_watcher.stats()["pending"]}),
+    ]
+    order_index.ensure_built()
+    samples.append(("orders", "gauge", "Orders by status",
+                    {(("status", status),): count for status, count in order_stats.summary(days=1)["by_status"].items()}))
+    return samples
+
+metrics.add_collector(collect_component_metrics)
+
+@app.before_request
+def start_request_metrics():
+    g.request_started = time.time()
+    metrics.requests_in_flight.inc()
+    # Send "X-Profile: 1" (or ?profile=1) to get a per-stage timing breakdown back
+    if request.headers.get('X-Profile') or request.args.get('profile'):
+        g.profile = metrics.start_profile()
+
+@app.after_request
+def record_request_metrics(response):
+    route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+    started = g.get('request_started')
+    if started is not None:
+        metrics.request_seconds.observe(time.time() - started, method=request.method, route=route,
+                                        status=response.status_code)
+    profile = g.pop('profile', None)
+    if profile is not None:
+        response.headers['Server-Timing'] = profile.server_timing()
+        response.headers['X-Profile-Timings'] = json.dumps(profile.to_dict())
+    return response
+
+@app.after_request
+def compress(response):
+    if COMPRESS_RESPONSES:
+        compress_response(response, request.headers.get('Accept-Encoding'), min_size=COMPRESS_MIN_BYTES)
+    return response
+
+@app.teardown_request
+def finish_request_metrics(error=None):
+    if g.pop('request_started', None) is not None:
+        metrics.requests_in_flight.dec()
+    metrics.end_profile()
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Prometheus scrape endpoint"""
+    return Response(metrics.render(), content_type=METRICS_CONTENT_TYPE)
+
+@app.route('/api/system/startup', methods=['GET'])
+def get_startup_info():
+    """Cold-start timings and Document AI client state"""
+    info = startup_timings.to_dict()
+    info["documentai"] = documentai.stats()
+    return jsonify(info)
+
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    """Liveness: the process is up and serving requests"""
+    return jsonify({"status": "ok", "pid": os.getpid()})
+
+# The provider database and Document AI checks are network round trips, so their outcome is reused for a while
+READY_DB_CHECK_SECONDS = int(os.environ.get('READY_DB_CHECK_SECONDS', 60))
+provider_db_check = TTLCache(max_entries=1, ttl=READY_DB_CHECK_SECONDS)
+
+def provider_database_ok():
+    ok = provider_db_check.get("ok")
+    if ok is None:
+        try:
+            ok = bool(test_database_connection())
+        except Exception as e:
+            print(f"Provider database check failed: {str(e)}")
+            ok = False
+        provider_db_check.set("ok", ok)
+    return ok
+
+documentai_check = TTLCache(max_entries=1, ttl=READY_DB_CHECK_SECONDS)
+
+def documentai_ok():
+    ok = documentai_check.get("ok")
+    if ok is None:
+        ok = documentai.healthy()
+        documentai_check.set("ok", ok)
+    return ok
+
+def readiness():
+    """(ready, checks): whether this process can serve the UI and match providers"""
+    checks = {
+        "order_index": order_index.ready,
+        "input_dir": INPUT_DIR.is_dir(),
+        "output_dir": OUTPUT_DIR.is_dir(),
+        # Provider matching works from the in-memory index, or the database when the index isn't loaded
+        "providers": provider_index.ready or provider_database_ok(),
+    }
+    return all(checks.values()), checks
+
+@app.route('/readyz', methods=['GET'])
+def readyz():
+    """Readiness: 200 once the indexes are loaded and the data folders and provider data are reachable"""
+    ready, checks = readiness()
+    details = {
+        "provider_index": "loaded" if provider_index.ready else (provider_index.last_error or "not loaded"),
+        "jobs": job_queue.stats(),
+        # Reported, not required: the UI and provider matching work while OCR is down, only processing waits
+        "documentai": "ok" if documentai_ok() else (documentai.last_error or "unavailable"),
+    }
+    return jsonify({"status": "ready" if ready else "not ready", "checks": checks, **details}), 200 if ready else 503
+
+@app.route('/api/system/caches', methods=['GET'])
+def get_cache_stats():
+    """Hit/miss counters for the processing caches"""
+    return jsonify({
+        "ocr": ocr_cache.stats(),
+        "llm": llm_cache.stats(),
+        "providers": provider_query_cache.stats(),
+        "previews": preview_renderer.stats(),
+        "emails": email_cache.stats(),
+        "ocr_runner": ocr_runner.stats()
+    })
+
+# How long a tab turned away by the stream limit waits before trying again (main.js)
+EVENT_STREAM_RETRY_SECONDS = 60
+
+@app.route('/api/events', methods=['GET'])
+def stream_events():
+    """Server-Sent Events stream of order lifecycle events
+
+    Browsers reconnect on their own and send Last-Event-ID, so a reconnect
+    picks up where the stream left off (or gets a ``resync`` event if it
+    was gone too long).
+    """
+    last_event_id = parse_last_event_id(request.headers.get('Last-Event-ID') or request.args.get('last_event_id'))
+    try:
+        subscription = events.subscribe(last_event_id)
+    except TooManySubscribersError as e:
+        response = jsonify({"error": str(e), "max_clients": EVENT_STREAM_MAX_CLIENTS})
+        response.headers['Retry-After'] = str(EVENT_STREAM_RETRY_SECONDS)
+        return response, 503
+    
+    return Response(events.stream(subscription), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/api/system/stats', methods=['GET'])
+def get_order_stats():
+    """Running order counters: per status, per day and average time per pipeline stage"""
+    order_index.ensure_built()
+    summary = order_stats.summary(days=int(request.args.get('days', 7)))
+    summary["event_streams"] = events.stats()
+    summary["watcher"] = order_watcher.stats()
+    return jsonify(summary)
+
+def write_response(payload, etag):
+    """JSON response for a successful write, carrying the new ETag"""
+    response = jsonify(payload)
+    response.set_etag(etag)
+    return response
+
 @app.route('/api/orders/<order_id>/update', methods=['POST'])
 def update_order(order_id):
     """Update extracted data for an order"""
     try:
         data = request.json
-        result_path = OUTPUT_DIR / f"{order_id}_results.json"
-        
-        if not result_path.exists():
-            return jsonify({"error": f"Order results not found: {order_id}"}), 404
         
-        # Read current results
-        with open(result_path, 'r', encoding='utf-8') as f:
-            results = json.load(f)
-        
-        # Update extracted data fields if provided
-        if 'extracted_data' in data:
-            # Handle complete replacement of extracted data
-            results['extracted_data'] = data['extracted_data']
-            
-            # Add edit timestamp
-            results['last_edited'] = str(datetime.datetime.now())
-            results['edited_by'] = "User"  # In a real app, use the actual user
+        def apply_update(results):
+            # Update extracted data fields if provided
+            if 'extracted_data' in data:
+                # Handle complete replacement of extracted data
+                results['extracted_data'] = data['extracted_data']
+                
+                # Add edit timestamp
+                results['last_edited'] = str(datetime.datetime.now())
+                results['edited_by'] = "User"  # In a real app, use the actual user
         
-        # Save updated results
-        with open(result_path, 'w', encoding='utf-8') as f:
-            json.dump(results, f, indent=2)
+        # If-Match makes the edit fail rather than overwrite someone else's newer changes
+        _, etag = results_store.update(order_id, apply_update,
+                                       expected_etag=normalize_etag(request.headers.get('If-Match')))
         
-        return jsonify({"message": f"Order {order_id} updated successfully"})
+        publish_order_event(ORDER_UPDATED, order_id, etag=etag)
+        return write_response({"message": f"Order {order_id} updated successfully"}, etag)
+    except OrderNotFoundError:
+        return jsonify({"error": f"Order results not found: {order_id}"}), 404
+    except VersionConflictError as e:
+        return jsonify({"error": str(e)}), 412
     except Exception as e:
         return jsonify({"error": str(e)}), 500
     
@@ -261,26 +784,22 @@ def update_order(order_id):
 def approve_order(order_id):
     """Mark an order as approved for CRM insertion"""
     try:
-        result_path = OUTPUT_DIR / f"{order_id}_results.json"
-        
-        if not result_path.exists():
-            return jsonify({"error": f"Order results not found: {order_id}"}), 404
-        
-        # Read current results
-        with open(result_path, 'r', encoding='utf-8') as f:
-            results = json.load(f)
-        
-        # Add approval status
-        results['status'] = 'Approved'
-        results['approved_date'] = str(datetime.datetime.now())
+        def apply_approval(results):
+            # Add approval status
+            results['status'] = 'Approved'
+            results['approved_date'] = str(datetime.datetime.now())
         
-        # Save updated results
-        with open(result_path, 'w', encoding='utf-8') as f:
-            json.dump(results, f, indent=2)
+        _, etag = results_store.update(order_id, apply_approval,
+                                       expected_etag=normalize_etag(request.headers.get('If-Match')))
         
         # Here you would add code to format and send to your CRM
         
-        return jsonify({"message": f"Order {order_id} approved for CRM insertion"})
+        publish_order_event(ORDER_APPROVED, order_id, etag=etag)
+        return write_response({"message": f"Order {order_id} approved for CRM insertion"}, etag)
+    except OrderNotFoundError:
+        return jsonify({"error": f"Order results not found: {order_id}"}), 404
+    except VersionConflictError as e:
+        return jsonify({"error": str(e)}), 412
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -289,30 +808,34 @@ def get_order_providers(order_id):
     """Get nearby providers for an order based on patient location"""
     try:
         print(f"Getting providers for order: {order_id}")
-        result_path = OUTPUT_DIR / f"{order_id}_results.json"
+        result_version = results_store.version(order_id)
         
-        if not result_path.exists():
-            print(f"Results file not found: {result_path}")
+        if result_version is None:
+            print(f"Results not found for order: {order_id}")
             return jsonify({"error": f"Order results not found: {order_id}"}), 404
         
-        # Read current results
-        with open(result_path, 'r', encoding='utf-8') as f:
-            results = json.load(f)
-        
-        print(f"Results loaded. Keys available: {list(results.keys())}")
-        
-        # Check if we have mapping data with coordinates
-        if "mapping_data" not in results:
-            print("No mapping_data found in results")
-            return jsonify({"error": "No location data available for this order"}), 400
-            
-        print(f"Mapping data keys: {list(results['mapping_data'].keys())}")
+        # Patient location, re-read only when the stored results change
+        location_key = (order_id, result_version)
+        geocode_data = order_locations.get(location_key)
+        if geocode_data is None:
+            # Read current results
+            results, _ = results_store.read(order_id)
             
-        if "geocode_data" not in results["mapping_data"]:
-            print("No geocode_data found in mapping_data")
-            return jsonify({"error": "No location data available for this order"}), 400
+            print(f"Results loaded. Keys available: {list(results.keys())}")
             
-        geocode_data = results["mapping_data"]["geocode_data"]
+            # Check if we have mapping data with coordinates
+            if "mapping_data" not in results:
+                print("No mapping_data found in results")
+                return jsonify({"error": "No location data available for this order"}), 400
+                
+            print(f"Mapping data keys: {list(results['mapping_data'].keys())}")
+                
+            if "geocode_data" not in results["mapping_data"]:
+                print("No geocode_data found in mapping_data")
+                return jsonify({"error": "No location data available for this order"}), 400
+                
+            geocode_data = results["mapping_data"]["geocode_data"]
+            order_locations.set(location_key, geocode_data)
         print(f"Geocode data: {geocode_data}")
         
         latitude = geocode_data.get("latitude")
@@ -327,7 +850,7 @@ def get_order_providers(order_id):
         print(f"Looking for providers near: {latitude}, {longitude} for procedure: {proc_code}")
         
         # Get nearby providers with rates if proc_code provided
-        providers = find_nearest_providers(latitude, longitude, proc_code=proc_code, limit=5)
+        providers = cached_nearest_providers(latitude, longitude, proc_code=proc_code, limit=5)
         
         if not providers:
             print("No providers found")
@@ -357,91 +880,163 @@ def get_order_providers(order_id):
         return jsonify({"error": str(e)}), 500
     
     
+@app.route('/api/providers/refresh', methods=['POST'])
+def refresh_providers():
+    """Reload the provider index from its source without restarting"""
+    if not provider_index.reload():
+        return jsonify({"error": f"Provider index not reloaded: {provider_index.last_error}",
+                        "index": provider_index.stats()}), 500
+    provider_query_cache.clear()
+    return jsonify({"message": "Provider index reloaded", "index": provider_index.stats()})
+
+@app.route('/api/providers/index', methods=['GET'])
+def get_provider_index_stats():
+    """State of the provider index"""
+    return jsonify(provider_index.stats())
+
+@app.route('/api/orders/<order_id>/provider-matches', methods=['GET'])
+def get_order_provider_matches(order_id):
+    """Nearest providers and rates for every procedure in an order"""
+    try:
+        match = match_order_providers(order_id, limit=int(request.args.get('limit', 5)))
+        if "error" in match:
+            return jsonify(match), 404
+        return jsonify(match)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/provider-matches', methods=['POST'])
+def bulk_provider_matches():
+    """Provider matches for every procedure of a batch of orders"""
+    try:
+        data = request.get_json(silent=True) or {}
+        order_ids = data.get('order_ids') or []
+        if not order_ids:
+            return jsonify({"error": "No order IDs provided"}), 400
+        
+        limit = int(data.get('limit', 5))
+        matches = []
+        for order_id in order_ids:
+            try:
+                matches.append(match_order_providers(order_id, limit=limit))
+            except Exception as e:
+                matches.append({"order_id": order_id, "error": str(e)})
+        return jsonify({"orders": matches})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
 @app.route('/api/orders/<order_id>/package-for-crm', methods=['POST'])
 def package_for_crm(order_id):
     """Package order data for CRM insertion"""
     try:
-        result_path = OUTPUT_DIR / f"{order_id}_results.json"
-        
-        if not result_path.exists():
-            return jsonify({"error": f"Order results not found: {order_id}"}), 404
-        
         # Read current results
-        with open(result_path, 'r', encoding='utf-8') as f:
-            results = json.load(f)
-        
-        # Create CRM insertion folder
-        crm_dir = Path(r'C:\Users\ChristopherCato\OneDrive - clarity-dx.com\Intake AI Agent\data\crm_ready')
-        order_crm_dir = crm_dir / order_id
-        order_crm_dir.mkdir(exist_ok=True, parents=True)
-        
-        # Create CRM-ready format from results
-        crm_data = {
-            "order_id": order_id,
-            "patient_info": {},
-            "procedures": [],
-            "provider_data": {}
-        }
+        results, etag = results_store.read(order_id)
+        expected_etag = normalize_etag(request.headers.get('If-Match'))
+        if expected_etag is not None and expected_etag != etag:
+            raise VersionConflictError(order_id, expected_etag, etag)
         
-        # Extract patient information
-        for field, data in results['extracted_data']['patient_info'].items():
-            if data['value'] and data['value'] != "not found" and data['value'] != "null":
-                crm_data['patient_info'][field] = data['value']
-        
-        # Extract procedures
-        for procedure in results['extracted_data']['procedures']:
-            proc_data = {}
-            for field, data in procedure.items():
-                if data['value'] and data['value'] != "not found" and data['value'] != "null":
-                    proc_data[field] = data['value']
-            
-            if proc_data:  # Only add if we have data
-                crm_data['procedures'].append(proc_data)
-        
-        # Add provider information if available
-        if 'provider_mapping' in results and results['provider_mapping']['status'] == 'success':
-            for proc_mapping in results['provider_mapping']['procedures']:
-                if 'providers' in proc_mapping and proc_mapping['providers']:
-                    # Just get the first provider for each procedure (closest one)
-                    provider = proc_mapping['providers'][0]
-                    
-                    # Match provider to procedure by CPT code if possible
-                    cpt_code = proc_mapping.get('cpt_code')
-                    
-                    # Add to provider data
-                    if cpt_code not in crm_data['provider_data']:
-                        crm_data['provider_data'][cpt_code] = []
-                    
-                    provider_info = {
-                        "name": provider.get("DBA Name Billing Name"),
-                        "address": f"{provider.get('City')}, {provider.get('State')}",
-                        "phone": provider.get("Phone"),
-                        "fax": provider.get("Fax Number"),
-                        "network_status": provider.get("Provider Network"),
-                        "distance_miles": provider.get("distance_miles")
-                    }
-                    crm_data['provider_data'][cpt_code].append(provider_info)
-        
-        # Save the final CRM-ready JSON
-        crm_json_path = order_crm_dir / f"{order_id}_crm.json"
-        with open(crm_json_path, 'w', encoding='utf-8') as f:
-            json.dump(crm_data, f, indent=2)
+        # Create CRM-ready format from results and save it in the CRM insertion folder
+        crm_json_path = write_crm_file(CRM_DIR, order_id, build_crm_payload(order_id, results))
             
-        # Mark order as "Ready for CRM"
-        results['status'] = 'Ready for CRM'
-        results['crm_ready_date'] = str(datetime.datetime.now())
+        # Mark order as "Ready for CRM", provided nobody changed it while we were packaging
+        _, etag = results_store.update(order_id, mark_ready, expected_etag=etag)
         
-        # Save updated results back to results file
-        with open(result_path, 'w', encoding='utf-8') as f:
-            json.dump(results, f, indent=2)
-        
-        return jsonify({
+        publish_order_event(ORDER_PACKAGED, order_id, etag=etag)
+        return write_response({
             "message": f"Order {order_id} packaged for CRM insertion",
             "crm_path": str(crm_json_path)
-        })
+        }, etag)
+    except OrderNotFoundError:
+        return jsonify({"error": f"Order results not found: {order_id}"}), 404
+    except VersionConflictError as e:
+        return jsonify({"error": str(e)}), 412
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+def crm_export_response(export):
+    """Stream an export as a download, with its ID for checking progress or resuming"""
+    mimetype, extension = EXPORT_FORMATS[export.format]
+    response = Response(export.stream(), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename="crm_export_{export.export_id}.{extension}"'
+    response.headers['X-Export-Id'] = export.export_id
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+@app.route('/api/crm/export', methods=['GET', 'POST'])
+def export_for_crm():
+    """Package every order in a status (default Approved), or the given order_ids, for the CRM
+
+    Options (query string or JSON body): format=ndjson|zip, order_files=true to
+    also write each order's {order_id}_crm.json, mark_ready=false to leave the
+    orders' status alone, resume=<export_id> to continue an interrupted export
+    (NDJSON sends the orders not delivered yet, zip the whole bundle again).
+
+    A GET only reads: it never marks orders Ready for CRM or writes order
+    files, so a prefetch or a reload can't change anything. Use POST for that.
+    """
+    try:
+        options = dict(request.args.items())
+        options.update(request.get_json(silent=True) or {})
+        read_only = request.method == 'GET'
+        
+        def post_required():
+            return jsonify({"error": "Marking orders ready or writing order files needs a POST"}), 405
+        workers = int(os.environ.get('CRM_EXPORT_WORKERS', 4))
+        
+        def on_packaged(order_id, etag):
+            publish_order_event(ORDER_PACKAGED, order_id, etag=etag)
+        
+        if options.get('resume'):
+            export = CRMExport.resume(results_store, CRM_EXPORT_DIR, str(options['resume']), crm_dir=CRM_DIR,
+                                      workers=workers, on_packaged=on_packaged)
+            if export is None:
+                return jsonify({"error": f"Export not found: {options['resume']}"}), 404
+            if read_only and (export.mark_ready or export.write_order_files):
+                return post_required()
+            return crm_export_response(export)
+        
+        def flag(name, default):
+            value = options.get(name)
+            return default if value is None else str(value).lower() in ('1', 'true', 'yes')
+        
+        write_order_files = flag('order_files', False)
+        ready = flag('mark_ready', not read_only)
+        if read_only and (ready or write_order_files):
+            return post_required()
+        
+        status = options.get('status', 'Approved')
+        order_ids = options.get('order_ids')
+        if isinstance(order_ids, str):
+            order_ids = [order_id for order_id in order_ids.split(',') if order_id]
+        if not order_ids:
+            order_index.ensure_built()
+            order_ids = [entry["order_id"] for entry in order_index.list_orders()
+                         if (entry.get("status") or "").lower() == status.lower()]
+        
+        CRMExport.sweep_checkpoints(CRM_EXPORT_DIR, CRM_EXPORT_KEEP_COMPLETED_HOURS * 3600,
+                                    CRM_EXPORT_KEEP_INTERRUPTED_HOURS * 3600)
+        export = CRMExport(results_store, order_ids, CRM_EXPORT_DIR, fmt=options.get('format', 'ndjson'),
+                           crm_dir=CRM_DIR, write_order_files=write_order_files,
+                           mark_ready=ready, workers=workers,
+                           status=None if options.get('order_ids') else status, on_packaged=on_packaged)
+        return crm_export_response(export)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/crm/exports/<export_id>', methods=['GET'])
+def get_crm_export(export_id):
+    """Progress of a bulk CRM export, from its checkpoint"""
+    checkpoint = CRMExport.load_checkpoint(CRM_EXPORT_DIR, export_id)
+    if checkpoint is None:
+        return jsonify({"error": f"Export not found: {export_id}"}), 404
+    checkpoint["remaining"] = len(checkpoint["order_ids"]) - len(checkpoint["done"])
+    if request.args.get('orders', '').lower() not in ('1', 'true', 'yes'):
+        checkpoint.pop("order_ids")
+        checkpoint.pop("done")
+    return jsonify(checkpoint)
+
 @app.route('/api/orders/<order_id>/select-provider', methods=['POST'])
 def select_provider(order_id):
     """Select a provider for an order"""
@@ -452,117 +1047,238 @@ def select_provider(order_id):
         if not provider_id:
             return jsonify({"error": "No provider ID provided"}), 400
             
-        result_path = OUTPUT_DIR / f"{order_id}_results.json"
-        
-        if not result_path.exists():
-            return jsonify({"error": f"Order results not found: {order_id}"}), 404
-        
-        # Read current results
-        with open(result_path, 'r', encoding='utf-8') as f:
-            results = json.load(f)
-        
-        # Add selected provider to results
-        results['selected_provider'] = provider_id
-        results['provider_selected_date'] = str(datetime.datetime.now())
+        def apply_selection(results):
+            # Add selected provider to results
+            results['selected_provider'] = provider_id
+            results['provider_selected_date'] = str(datetime.datetime.now())
         
-        # Save updated results
-        with open(result_path, 'w', encoding='utf-8') as f:
-            json.dump(results, f, indent=2)
+        _, etag = results_store.update(order_id, apply_selection,
+                                       expected_etag=normalize_etag(request.headers.get('If-Match')))
         
-        return jsonify({"message": f"Provider {provider_id} selected for order {order_id}"})
+        publish_order_event(PROVIDER_SELECTED, order_id, etag=etag, provider_id=provider_id)
+        return write_response({"message": f"Provider {provider_id} selected for order {order_id}"}, etag)
         
+    except OrderNotFoundError:
+        return jsonify({"error": f"Order results not found: {order_id}"}), 404
+    except VersionConflictError as e:
+        return jsonify({"error": str(e)}), 412
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @app.route('/api/orders/<order_id>/documents', methods=['GET'])
 def get_order_documents(order_id):
-    """Get list of documents for an order"""
+    """Get list of documents for an order (metadata only; OCR text comes from the ocr_url)"""
     try:
         order_folder = INPUT_DIR / order_id
         if not order_folder.exists() or not order_folder.is_dir():
             return jsonify({"error": f"Order folder not found: {order_id}"}), 404
             
         documents = []
-        for file_path in order_folder.glob("*"):
+        for file_path in sorted(order_folder.glob("*"), key=lambda p: p.name):
             if file_path.is_file():
-                # Get OCR text if available
-                ocr_path = OCR_DIR / f"{order_id}_{file_path.stem}.txt"
-                ocr_text = None
-                if ocr_path.exists():
-                    with open(ocr_path, 'r', encoding='utf-8') as f:
-                        ocr_text = f.read()
-                
+                ocr_available = ocr_texts.available(order_id, file_path)
                 documents.append({
                     "name": file_path.name,
                     "type": file_path.suffix.lower(),
                     "size": file_path.stat().st_size,
-                    "ocr_text": ocr_text
+                    "page_count": document_page_count(file_path, preview_renderer),
+                    "url": document_url(order_id, file_path),
+                    "pages_url": url_for('get_document_pages', order_id=order_id, filename=file_path.name)
+                                 if is_previewable(file_path) else None,
+                    "ocr_available": ocr_available,
+                    "ocr_url": url_for('get_document_ocr', order_id=order_id, filename=file_path.name)
+                               if ocr_available else None
                 })
         
         return jsonify(documents)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+OCR_TEXT_DEFAULT_CHARS = 20000
+OCR_TEXT_MAX_CHARS = 200000
+
+@app.route('/api/orders/<order_id>/documents/<filename>/ocr', methods=['GET'])
+def get_document_ocr(order_id, filename):
+    """OCR text of one document, a page (?page=N, 1-based) or a character range (?offset=&limit=) at a time
+
+    A page is capped at ``limit`` characters too; ``next_offset`` continues a long page.
+    """
+    try:
+        file_path = document_path(order_id, filename)
+        if file_path is None:
+            return jsonify({"error": f"Document not found: {filename}"}), 404
+        ocr = ocr_texts.get(order_id, file_path)
+        if ocr is None:
+            return jsonify({"error": f"No OCR text for document: {filename}"}), 404
+        
+        try:
+            page = int(request.args['page']) if request.args.get('page') else None
+            offset = max(0, int(request.args.get('offset', 0)))
+            limit = min(max(1, int(request.args.get('limit', OCR_TEXT_DEFAULT_CHARS))), OCR_TEXT_MAX_CHARS)
+        except ValueError:
+            return jsonify({"error": "page, offset and limit must be numbers"}), 400
+        
+        etag = json_digest([ocr.digest, page, offset, limit])[:32]
+        if request.if_none_match.contains_weak(etag):
+            response = Response(status=304)
+            response.set_etag(etag, weak=True)
+            return response
+        
+        payload = {
+            "name": filename,
+            "total_chars": len(ocr.text),
+            "page_count": ocr.page_count
+        }
+        if page is not None:
+            try:
+                text = ocr.page(page, offset, limit)
+                next_offset = offset + len(text)
+                payload.update({
+                    "page": page,
+                    "offset": offset,
+                    "limit": limit,
+                    "text": text,
+                    "next_offset": next_offset if next_offset < ocr.page_length(page) else None
+                })
+            except IndexError as e:
+                return jsonify({"error": str(e)}), 404
+            payload["next_page"] = page + 1 if page < ocr.page_count else None
+        else:
+            text = ocr.slice(offset, limit)
+            next_offset = offset + len(text)
+            payload.update({
+                "offset": offset,
+                "limit": limit,
+                "text": text,
+                "next_offset": next_offset if next_offset < len(ocr.text) else None
+            })
+        
+        response = jsonify(payload)
+        response.set_etag(etag, weak=True)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+# Versioned document URLs (?v=<content hash>) never change content, so browsers may keep them
+DOCUMENT_MAX_AGE = 365 * 24 * 3600
+
+def document_url(order_id, file_path):
+    """Preview URL for a document, versioned by its content hash"""
+    return url_for('get_document_file', order_id=order_id, filename=file_path.name, v=file_digest(file_path))
+
+def document_cache_headers(response, digest):
+    """Documents are patient data, so only the browser (private) may cache them.
+    Versioned URLs are cached for a year; anything else is revalidated with the ETag."""
+    if request.args.get('v') == digest:
+        response.headers['Cache-Control'] = f'private, max-age={DOCUMENT_MAX_AGE}, immutable'
+    else:
+        response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+def send_document(file_path, mimetype=None):
+    """Stream a document with a content-hash ETag, Last-Modified, 304s and Range support"""
+    digest = file_digest(file_path)
+    # conditional=True answers If-None-Match / If-Modified-Since and Range requests,
+    # and streams the file (or the requested byte range) in chunks
+    response = send_file(file_path, mimetype=mimetype, conditional=True, etag=digest,
+                         last_modified=file_path.stat().st_mtime)
+    return document_cache_headers(response, digest)
+
+def document_path(order_id, filename):
+    """Path of a document in an order folder, or None if it doesn't exist (or escapes the folder)"""
+    order_folder = safe_join(str(INPUT_DIR), order_id)
+    file_path = safe_join(order_folder, filename) if order_folder else None
+    if file_path is None or not os.path.isfile(file_path):
+        return None
+    return Path(file_path)
+
+@app.route('/api/orders/<order_id>/documents/<filename>/pages', methods=['GET'])
+def get_document_pages(order_id, filename):
+    """Page count and preview/thumbnail URLs for a TIFF or image document"""
+    try:
+        file_path = document_path(order_id, filename)
+        if file_path is None:
+            return jsonify({"error": f"Document not found: {filename}"}), 404
+        if not is_previewable(file_path):
+            return jsonify({"error": f"No page previews for file type: {file_path.suffix}"}), 400
+        
+        digest = file_digest(file_path)
+        pages = []
+        for index in range(preview_renderer.page_count(file_path)):
+            pages.append({
+                "index": index,
+                "url": url_for('get_document_page', order_id=order_id, filename=filename, index=index, v=digest),
+                "thumbnail_url": url_for('get_document_page', order_id=order_id, filename=filename, index=index,
+                                         size='thumb', v=digest)
+            })
+        return jsonify({"name": filename, "page_count": len(pages), "pages": pages})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/orders/<order_id>/documents/<filename>/pages/<int:index>', methods=['GET'])
+def get_document_page(order_id, filename, index):
+    """One page of a TIFF or image document as a downscaled WebP/PNG (?size=page|thumb, ?format=webp|png)"""
+    try:
+        file_path = document_path(order_id, filename)
+        if file_path is None:
+            return jsonify({"error": f"Document not found: {filename}"}), 404
+        if not is_previewable(file_path):
+            return jsonify({"error": f"No page previews for file type: {file_path.suffix}"}), 400
+        
+        try:
+            size = request.args.get('size', 'page')
+            fmt = preview_renderer.output_format(request.args.get('format'))
+            etag = preview_renderer.key_for(file_path, index, size, fmt)
+            if request.if_none_match.contains_weak(etag):
+                response = Response(status=304)
+            else:
+                with metrics.timed("render_preview"):
+                    data, mimetype, etag = preview_renderer.render(file_path, index, size, fmt)
+                response = Response(data, mimetype=mimetype)
+        except PageNotFoundError as e:
+            return jsonify({"error": str(e)}), 404
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        
+        response.set_etag(etag)
+        return document_cache_headers(response, file_digest(file_path))
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
 @app.route('/api/orders/<order_id>/documents/<filename>', methods=['GET'])
 def get_document_file(order_id, filename):
     """Serve a document file for preview"""
     try:
-        file_path = INPUT_DIR / order_id / filename
-        if not file_path.exists() or not file_path.is_file():
+        file_path = document_path(order_id, filename)
+        if file_path is None:
             return jsonify({"error": f"Document not found: {filename}"}), 404
             
         # For PDFs, serve directly
         if file_path.suffix.lower() == '.pdf':
-            return send_file(file_path, mimetype='application/pdf')
+            return send_document(file_path, mimetype='application/pdf')
             
         # For images, serve directly with proper mimetype
         if file_path.suffix.lower() in ['.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tif', '.tiff']:
             mimetype = 'image/tiff' if file_path.suffix.lower() in ['.tif', '.tiff'] else None
-            return send_file(file_path, mimetype=mimetype)
+            return send_document(file_path, mimetype=mimetype)
             
         # For text files, serve as plain text
         if file_path.suffix.lower() == '.txt':
-            return send_file(file_path, mimetype='text/plain')
+            return send_document(file_path, mimetype='text/plain')
             
-        # For email files, serve as text with formatting
+        # For email files, serve the parsed headers and body as text
         if file_path.suffix.lower() == '.eml':
-            import email
-            from email import policy
-            from email.parser import BytesParser
-            
-            with open(file_path, 'rb') as fp:
-                msg = BytesParser(policy=policy.default).parse(fp)
+            digest = file_digest(file_path)
+            if request.if_none_match.contains_weak(digest):
+                response = Response(status=304)
+                response.set_etag(digest)
+                return document_cache_headers(response, digest)
             
-            # Extract email content
-            email_content = f"""
-            From: {msg.get('from', '')}
-            To: {msg.get('to', '')}
-            Subject: {msg.get('subject', '')}
-            Date: {msg.get('date', '')}
-            
-            Body:
-            """
-            
-            if msg.is_multipart():
-                for part in msg.iter_parts():
-                    content_type = part.get_content_type()
-                    if content_type == "text/plain":
-                        email_content += part.get_content()
-                    elif content_type == "text/html":
-                        # Convert HTML to plain text
-                        from bs4 import BeautifulSoup
-                        soup = BeautifulSoup(part.get_content(), 'html.parser')
-                        email_content += soup.get_text()
-            else:
-                if msg.get_content_type() == "text/plain":
-                    email_content += msg.get_content()
-                elif msg.get_content_type() == "text/html":
-                    # Convert HTML to plain text
-                    from bs4 import BeautifulSoup
-                    soup = BeautifulSoup(msg.get_content(), 'html.parser')
-                    email_content += soup.get_text()
-            
-            return Response(email_content, mimetype='text/plain')
+            response = Response(format_email(email_cache.get(file_path)), mimetype='text/plain')
+            response.set_etag(digest)
+            response.last_modified = file_path.stat().st_mtime
+            return document_cache_headers(response, digest)
             
         # For other files, return error
         return jsonify({"error": f"Unsupported file type: {file_path.suffix}"}), 400
@@ -570,11 +1286,89 @@ def get_document_file(order_id, filename):
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/orders/<order_id>/documents/<filename>/attachments', methods=['GET'])
+def get_email_attachments(order_id, filename):
+    """Attachment manifest of an .eml document"""
+    try:
+        file_path = document_path(order_id, filename)
+        if file_path is None or file_path.suffix.lower() != '.eml':
+            return jsonify({"error": f"Email not found: {filename}"}), 404
+        
+        digest = file_digest(file_path)
+        attachments = []
+        for attachment in email_cache.get(file_path)["attachments"]:
+            attachments.append(dict(attachment, url=url_for('get_email_attachment', order_id=order_id,
+                                                            filename=filename, index=attachment["index"], v=digest)))
+        return jsonify({"name": filename, "attachments": attachments})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/orders/<order_id>/documents/<filename>/attachments/<int:index>', methods=['GET'])
+def get_email_attachment(order_id, filename, index):
+    """One attachment of an .eml document, served from the parsed-email cache"""
+    try:
+        file_path = document_path(order_id, filename)
+        if file_path is None or file_path.suffix.lower() != '.eml':
+            return jsonify({"error": f"Email not found: {filename}"}), 404
+        
+        digest = file_digest(file_path)
+        try:
+            attachment, data = email_cache.attachment(file_path, index)
+        except AttachmentNotFoundError as e:
+            return jsonify({"error": str(e)}), 404
+        
+        etag = attachment["sha256"][:32]
+        if request.if_none_match.contains_weak(etag):
+            response = Response(status=304)
+        else:
+            response = Response(data, mimetype=attachment["content_type"])
+            inline = attachment["content_type"] in INLINE_CONTENT_TYPES
+            response.headers.set('Content-Disposition', 'inline' if inline else 'attachment',
+                                 filename=attachment["filename"])
+            response.headers['X-Content-Type-Options'] = 'nosniff'
+        response.set_etag(etag)
+        return document_cache_headers(response, digest)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+def create_app():
+    """App factory for WSGI servers (see wsgi.py): load the order and provider indexes and return the app.
+
+    Run it before forking workers (gunicorn preload_app) so the indexes are
+    loaded once and shared copy-on-write. Threads don't survive a fork, so
+    each serving process then calls start_background_services().
+    """
+    with startup_timings.measure("order_index.build"):
+        order_index.build(start_refresh=False)
+    with startup_timings.measure("provider_index.reload"):
+        provider_index.reload()
+    return app
+
+def start_background_services(watch=WATCH_ORDERS):
+    """Start this process's background threads; returns the Document AI warm-up thread.
+
+    Only one process should watch INPUT_DIR, or every worker would queue the
+    same new order. The Document AI client is created here rather than in
+    create_app, since gRPC channels can't be shared across a fork.
+    """
+    order_index.start()
+    if watch:
+        order_watcher.start()
+    return documentai.warm_up_async()
+
 if __name__ == '__main__':
-    print("Testing provider database connection...")
-    if not test_database_connection():
-        print("WARNING: Provider database connection failed. Provider mapping features may not work correctly.")
+    # Development server; for production see wsgi.py and gunicorn.conf.py
+    create_app()
+    ready, checks = readiness()
+    if ready:
+        print("Ready: order index loaded, data folders and provider data reachable")
     else:
-        print("Provider database connection successful!")
+        failed = ", ".join(name for name, ok in checks.items() if not ok)
+        print(f"WARNING: not ready ({failed}). Provider mapping or the order list may not work correctly.")
+    
+    # With the debug reloader this block also runs in the parent process, which serves nothing
+    serving = os.environ.get('WERKZEUG_RUN_MAIN') == 'true'
+    start_background_services(watch=WATCH_ORDERS and serving).join()
+    startup_timings.report()
     
-    app.run(debug=True, port=5003)
\ No newline at end of file
+    app.run(debug=True, port=int(os.environ.get('PORT', 5003)))
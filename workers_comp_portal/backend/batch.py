@@ -0,0 +1,218 @@
+"""Batch processing of many orders, with separate OCR and LLM concurrency limits.
+
+Usable from the API (POST /api/batches) or from the command line:
+
+    python batch.py                      # every Pending order
+    python batch.py 1001 1002 --ocr-workers 4 --llm-workers 2 --output summary.json
+"""
+import argparse
+import datetime
+import json
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+
+DEFAULT_OCR_WORKERS = 4
+DEFAULT_LLM_WORKERS = 2
+
+
+def pending_order_ids(order_index):
+    """IDs of all orders that have no results yet"""
+    return [entry["order_id"] for entry in order_index.list_orders()
+            if entry["status"].lower() == "pending"]
+
+
+class BatchRun:
+    """Processes a list of orders through the pipeline and records a per-order summary.
+
+    Each order goes through ``pipeline.run``, so unchanged orders skip the
+    stages they don't need. At most ``ocr_workers`` orders are in the OCR
+    stage and at most ``llm_workers`` in the LLM stage at any time, so a slow
+    model doesn't starve OCR and vice versa. With a ``job_queue`` each order
+    runs as a job on it: an order that already has a queued or running job is
+    skipped, and the queue won't start a second one while the batch has it.
+    """
+
+    def __init__(self, pipeline, order_ids, ocr_workers=DEFAULT_OCR_WORKERS,
+                 llm_workers=DEFAULT_LLM_WORKERS, on_order_done=None, job_queue=None):
+        self.batch_id = uuid.uuid4().hex
+        self.pipeline = pipeline
+        self.order_ids = list(dict.fromkeys(order_ids))
+        self.ocr_workers = max(1, ocr_workers)
+        self.llm_workers = max(1, llm_workers)
+        self.on_order_done = on_order_done
+        self.job_queue = job_queue
+        self.status = "queued"
+        self.started_at = None
+        self.finished_at = None
+        self.elapsed_seconds = None
+        self.error = None
+        self.orders = {}
+        self._start_time = None
+        self._ocr_slots = threading.Semaphore(self.ocr_workers)
+        self._llm_slots = threading.Semaphore(self.llm_workers)
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _stage(self, summary, key, slots=None):
+        """Hold a stage slot (if any) and record how long the stage took in the order's summary"""
+        with slots if slots is not None else nullcontext():
+            stage_start = time.time()
+            try:
+                yield
+            finally:
+                summary[key] = round(time.time() - stage_start, 3)
+
+    def _process_one(self, order_id):
+        summary = {"order_id": order_id, "status": "running", "error": None, "job_id": None,
+                   "ocr_seconds": None, "llm_seconds": None, "save_seconds": None,
+                   "total_seconds": None}
+        with self._lock:
+            self.orders[order_id] = summary
+
+        def work():
+            return self.pipeline.run(order_id, slots={
+                "ocr": self._stage(summary, "ocr_seconds", self._ocr_slots),
+                "llm": self._stage(summary, "llm_seconds", self._llm_slots),
+                "save": self._stage(summary, "save_seconds"),
+            })
+
+        start = time.time()
+        try:
+            if self.job_queue is None:
+                work()
+                summary["status"] = "succeeded"
+            else:
+                job, ran = self.job_queue.run_here(order_id, work, source=f"batch:{self.batch_id}")
+                summary["job_id"] = job.job_id
+                if not ran:
+                    # Already queued or running elsewhere; that job will finish it
+                    summary["status"] = "skipped"
+                    return summary
+                summary["status"] = job.status
+                summary["error"] = job.error
+        except Exception as e:
+            print(f"Batch {self.batch_id}: order {order_id} failed: {str(e)}")
+            summary["status"] = "failed"
+            summary["error"] = str(e)
+        finally:
+            summary["total_seconds"] = round(time.time() - start, 3)
+
+        if self.on_order_done:
+            try:
+                self.on_order_done(order_id)
+            except Exception as e:
+                print(f"Batch {self.batch_id}: post-processing for {order_id} failed: {str(e)}")
+        return summary
+
+    def run(self):
+        """Process every order and return the summary"""
+        self.status = "running"
+        self.started_at = str(datetime.datetime.now())
+        self._start_time = start = time.time()
+        try:
+            if self.order_ids:
+                self.pipeline.prepare()
+                # Enough threads for both stages to be busy at the same time
+                with ThreadPoolExecutor(max_workers=self.ocr_workers + self.llm_workers) as executor:
+                    list(executor.map(self._process_one, self.order_ids))
+            self.status = "finished"
+        except Exception as e:
+            print(f"Batch {self.batch_id} failed: {str(e)}")
+            self.status = "failed"
+            self.error = str(e)
+        finally:
+            self.elapsed_seconds = round(time.time() - start, 3)
+            self.finished_at = str(datetime.datetime.now())
+        return self.summary()
+
+    def start(self):
+        """Run the batch on a background thread"""
+        thread = threading.Thread(target=self.run, name=f"batch-{self.batch_id[:8]}", daemon=True)
+        thread.start()
+        return thread
+
+    def summary(self):
+        with self._lock:
+            orders = [dict(self.orders[order_id]) for order_id in self.order_ids if order_id in self.orders]
+        succeeded = sum(1 for order in orders if order["status"] == "succeeded")
+        failed = sum(1 for order in orders if order["status"] == "failed")
+        skipped = sum(1 for order in orders if order["status"] == "skipped")
+        done = succeeded + failed
+
+        elapsed = self.elapsed_seconds
+        if elapsed is None and self._start_time is not None:
+            elapsed = round(time.time() - self._start_time, 3)
+
+        def average(key):
+            values = [order[key] for order in orders if order[key] is not None]
+            return round(sum(values) / len(values), 3) if values else None
+
+        return {
+            "batch_id": self.batch_id,
+            "status": self.status,
+            "error": self.error,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "ocr_workers": self.ocr_workers,
+            "llm_workers": self.llm_workers,
+            "throughput": {
+                "total_orders": len(self.order_ids),
+                "completed": done,
+                "succeeded": succeeded,
+                "failed": failed,
+                "skipped": skipped,
+                "elapsed_seconds": elapsed,
+                "orders_per_minute": round(done / elapsed * 60, 2) if elapsed else None,
+                "avg_ocr_seconds": average("ocr_seconds"),
+                "avg_llm_seconds": average("llm_seconds"),
+                "avg_total_seconds": average("total_seconds"),
+            },
+            "orders": orders,
+        }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Process a batch of referral orders")
+    parser.add_argument("order_ids", nargs="*", help="Orders to process (default: all Pending orders)")
+    parser.add_argument("--ocr-workers", type=int, default=DEFAULT_OCR_WORKERS,
+                        help="Maximum orders in the OCR stage at once")
+    parser.add_argument("--llm-workers", type=int, default=DEFAULT_LLM_WORKERS,
+                        help="Maximum orders in the LLM stage at once")
+    parser.add_argument("--output", help="Write the JSON summary to this file")
+    args = parser.parse_args(argv)
+
+    # Same pipeline, paths and job registry as the web app
+    from app import pipeline, order_index, job_queue
+
+    order_ids = args.order_ids or pending_order_ids(order_index)
+    print(f"Processing {len(order_ids)} orders "
+          f"(OCR workers: {args.ocr_workers}, LLM workers: {args.llm_workers})")
+
+    batch = BatchRun(pipeline, order_ids, ocr_workers=args.ocr_workers,
+                     llm_workers=args.llm_workers, job_queue=job_queue)
+    summary = batch.run()
+    order_index.mark_dirty()
+    order_index.flush()
+
+    for order in summary["orders"]:
+        line = f"{order['order_id']}: {order['status']} in {order['total_seconds']}s"
+        if order["error"]:
+            line += f" ({order['error']})"
+        print(line)
+    throughput = summary["throughput"]
+    print(f"Done: {throughput['succeeded']} succeeded, {throughput['failed']} failed, "
+          f"{throughput['skipped']} skipped in "
+          f"{throughput['elapsed_seconds']}s ({throughput['orders_per_minute']} orders/min)")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2)
+
+    return 0 if throughput["failed"] == 0 and summary["status"] == "finished" else 1
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,12 @@
+"""Benchmark stand-in for ``extract``: a Document AI "client" that takes BENCH_DOCUMENTAI_INIT_MS to create."""
+import os
+import time
+
+
+class FakeDocumentAIClient:
+    pass
+
+
+def initialize_documentai():
+    time.sleep(float(os.environ.get('BENCH_DOCUMENTAI_INIT_MS', 0)) / 1000)
+    return FakeDocumentAIClient()
@@ -0,0 +1,13 @@
+"""Benchmark stand-in for ``llm_client``: answers with a synthetic extraction after BENCH_LLM_LATENCY_MS."""
+import os
+import time
+
+import synthetic
+
+MODEL = "benchmark-fake"
+
+
+def call_llm_api(api_request):
+    time.sleep(float(os.environ.get('BENCH_LLM_LATENCY_MS', 0)) / 1000)
+    rng = synthetic.rng_for("llm", api_request.get("order_id"))
+    return {"extracted_data": synthetic.extraction(rng)}
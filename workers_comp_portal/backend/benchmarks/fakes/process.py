@@ -0,0 +1,51 @@
+"""Benchmark stand-in for the real ``process`` module: fake OCR, LLM request building and saving.
+
+OCR "reads" each document back as text (sleeping BENCH_OCR_LATENCY_MS per
+document to stand in for Document AI) and writes it to OCR_DIR like the real
+module. save_results writes OUTPUT_DIR/{order_id}_results.json.
+"""
+import datetime
+import json
+import os
+import time
+from pathlib import Path
+
+import synthetic
+
+
+def _latency(name):
+    return float(os.environ.get(name, 0)) / 1000
+
+
+def process_order_folder(order_folder):
+    order_folder = Path(order_folder)
+    ocr_dir = Path(os.environ['OCR_DIR'])
+    ocr_dir.mkdir(parents=True, exist_ok=True)
+    documents = []
+    for path in sorted(order_folder.glob("*"), key=lambda p: p.name):
+        if not path.is_file():
+            continue
+        time.sleep(_latency('BENCH_OCR_LATENCY_MS'))
+        text = path.read_bytes()[:4000].decode('utf-8', errors='replace')
+        with open(ocr_dir / f"{order_folder.name}_{path.stem}.txt", 'w', encoding='utf-8') as f:
+            f.write(text)
+        documents.append({"filename": path.name, "text": text})
+    return {"order_id": order_folder.name, "documents": documents}
+
+
+def format_llm_request(order_data):
+    return {
+        "order_id": order_data["order_id"],
+        "messages": [{"role": "user", "content": "\n\n".join(d["text"] for d in order_data["documents"])}],
+    }
+
+
+def save_results(order_id, order_data, api_request, llm_response):
+    rng = synthetic.rng_for("save", order_id)
+    results = synthetic.results_for(order_id, llm_response["extracted_data"], rng=rng,
+                                    processed_date=datetime.datetime.now())
+    output_dir = Path(os.environ['OUTPUT_DIR'])
+    output_dir.mkdir(parents=True, exist_ok=True)
+    with open(output_dir / f"{order_id}_results.json", 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    return results
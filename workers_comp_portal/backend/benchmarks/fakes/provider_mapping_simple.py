@@ -0,0 +1,51 @@
+"""Benchmark stand-in for the provider database: the generated BENCH_PROVIDERS_FILE, scanned in full per query.
+
+get_all_providers() lets the app build its provider index from the same
+table; with BENCH_PROVIDER_INDEX=0 it is hidden so every lookup goes to
+find_nearest_providers like it does against the real database.
+"""
+import json
+import math
+import os
+import time
+
+_providers = None
+
+
+def _load():
+    global _providers
+    if _providers is None:
+        with open(os.environ['BENCH_PROVIDERS_FILE'], 'r', encoding='utf-8') as f:
+            _providers = json.load(f)["providers"]
+    return _providers
+
+
+def _miles(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * 3958.8 * math.asin(min(1.0, math.sqrt(a)))
+
+
+def find_nearest_providers(latitude, longitude, proc_code=None, limit=5):
+    time.sleep(float(os.environ.get('BENCH_DB_LATENCY_MS', 0)) / 1000)
+    matches = []
+    for provider in _load():
+        if proc_code and proc_code not in provider["rates"]:
+            continue
+        record = {key: value for key, value in provider.items() if key != "rates"}
+        record["distance_miles"] = round(_miles(latitude, longitude, provider["latitude"], provider["longitude"]), 2)
+        if proc_code:
+            record["rate"] = provider["rates"][proc_code]
+        matches.append(record)
+    matches.sort(key=lambda record: record["distance_miles"])
+    return matches[:limit]
+
+
+def test_database_connection():
+    return os.path.exists(os.environ.get('BENCH_PROVIDERS_FILE', ''))
+
+
+def get_all_providers():
+    if os.environ.get('BENCH_PROVIDER_INDEX', '1') == '0':
+        raise RuntimeError("provider index disabled for this benchmark")
+    return _load()
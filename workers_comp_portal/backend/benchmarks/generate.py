@@ -0,0 +1,113 @@
+"""Generate a synthetic data set for the benchmarks:
+
+    <root>/orders/ORD-000001/...   referral documents (a PDF and a fax cover .txt)
+    <root>/results/                {order_id}_results.json for the processed orders
+    <root>/ocr/                    {order_id}_{stem}.txt OCR output for the processed orders
+    <root>/providers.json          provider table with locations and rates
+
+Generation is deterministic for a seed, and skipped when <root> already
+holds a data set generated with the same settings:
+
+    python benchmarks/generate.py --orders 10000 --providers 5000 --root /tmp/referral_bench_10000
+"""
+import argparse
+import datetime
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import synthetic
+
+MANIFEST = "manifest.json"
+
+
+def _write(path, data):
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+def generate(root, orders=1000, providers=5000, processed_fraction=0.8, seed=42, days=30, progress=True):
+    """Write the data set under root (unless an identical one is there); returns its manifest"""
+    root = Path(root)
+    settings = {"orders": orders, "providers": providers, "processed_fraction": processed_fraction,
+                "seed": seed, "days": days}
+    manifest_path = root / MANIFEST
+    if manifest_path.exists():
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest.get("settings") == settings:
+            return manifest
+
+    start = time.time()
+    for name in ("orders", "results", "ocr"):
+        (root / name).mkdir(parents=True, exist_ok=True)
+
+    rng = synthetic.rng_for(seed, "providers")
+    provider_records = [synthetic.provider(rng, number) for number in range(1, providers + 1)]
+    with open(root / "providers.json", 'w', encoding='utf-8') as f:
+        json.dump({"providers": provider_records}, f)
+
+    now = datetime.datetime.now()
+    processed, pending = [], []
+    for number in range(1, orders + 1):
+        order_id = synthetic.order_id_for(number)
+        rng = synthetic.rng_for(seed, order_id)
+        extracted = synthetic.extraction(rng)
+        text = synthetic.referral_text(order_id, extracted)
+
+        folder = root / "orders" / order_id
+        folder.mkdir(exist_ok=True)
+        _write(folder / "referral.pdf", synthetic.minimal_pdf(text, pages=rng.randint(1, 6)))
+        _write(folder / "fax_cover.txt", f"FAX COVER\nRe: {order_id}\n")
+
+        if rng.random() < processed_fraction:
+            processed_date = now - datetime.timedelta(days=rng.uniform(0, days))
+            status = rng.choices(synthetic.STATUSES, weights=(6, 3, 1))[0]
+            results = synthetic.results_for(order_id, extracted, provider_records[:3], rng, status, processed_date)
+            with open(root / "results" / f"{order_id}_results.json", 'w', encoding='utf-8') as f:
+                json.dump(results, f, indent=2)
+            _write(root / "ocr" / f"{order_id}_referral.txt", text)
+            _write(root / "ocr" / f"{order_id}_fax_cover.txt", f"FAX COVER\nRe: {order_id}\n")
+            processed.append(order_id)
+        else:
+            pending.append(order_id)
+
+        if progress and number % 10000 == 0:
+            print(f"  generated {number}/{orders} orders", file=sys.stderr)
+
+    manifest = {
+        "settings": settings,
+        "generated_at": str(now),
+        "generate_seconds": round(time.time() - start, 2),
+        "processed": processed,
+        "pending": pending,
+    }
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f)
+    return manifest
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate synthetic orders, results and providers")
+    parser.add_argument("--root", required=True, help="Folder to generate into")
+    parser.add_argument("--orders", type=int, default=1000)
+    parser.add_argument("--providers", type=int, default=5000)
+    parser.add_argument("--processed-fraction", type=float, default=0.8,
+                        help="Share of orders that already have results (the rest are Pending)")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args(argv)
+
+    manifest = generate(args.root, args.orders, args.providers, args.processed_fraction, args.seed)
+    print(f"{len(manifest['processed'])} processed and {len(manifest['pending'])} pending orders "
+          f"in {args.root} ({manifest['generate_seconds']}s)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
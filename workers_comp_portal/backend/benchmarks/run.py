@@ -0,0 +1,455 @@
+"""Load test for the portal API against a synthetic data set.
+
+Generates (or reuses) a data set of the requested size, starts the app on it
+with the external modules replaced by the fakes in benchmarks/fakes
+(process, llm_client, extract, provider_mapping_simple), then drives each
+scenario at each concurrency level and reports latency percentiles and
+throughput as JSON:
+
+    python benchmarks/run.py --orders 10000 --concurrency 1,8,32 --duration 10 --output bench.json
+    python benchmarks/run.py --orders 10000 --baseline bench.json --fail-on-regression
+
+By default requests go straight to the WSGI app in this process. --http
+serves it on a local threaded server first, and --url load-tests a server
+that is already running (the data set must be the one it was started on).
+The process scenario creates fresh order folders, runs them through the
+whole pipeline and removes them again.
+"""
+import argparse
+import contextlib
+import datetime
+import gzip
+import http.client
+import itertools
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+from collections import Counter
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+BACKEND_DIR = BENCH_DIR.parent
+sys.path.insert(0, str(BENCH_DIR))
+
+import synthetic
+from generate import generate
+
+SCENARIOS = ("dashboard", "orders", "orders_page", "order_detail", "providers", "documents", "process")
+
+
+# Clients
+
+class InProcessClient:
+    """Calls the WSGI app directly, one Flask test client per thread"""
+
+    def __init__(self, app):
+        self.app = app
+        self._local = threading.local()
+
+    def request(self, method, path, body=None):
+        client = getattr(self._local, "client", None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        response = client.open(path, method=method, json=body)
+        data = response.get_data()
+        return response.status_code, data
+
+
+class HTTPClient:
+    """Keep-alive HTTP connection per thread to a running server"""
+
+    def __init__(self, base_url):
+        parsed = urllib.parse.urlsplit(base_url)
+        self.host, self.port = parsed.hostname, parsed.port or 80
+        self._local = threading.local()
+
+    def request(self, method, path, body=None):
+        for attempt in (1, 2):
+            connection = getattr(self._local, "connection", None)
+            if connection is None:
+                connection = self._local.connection = http.client.HTTPConnection(self.host, self.port, timeout=120)
+            try:
+                headers = {"Accept-Encoding": "gzip"}
+                payload = None
+                if body is not None:
+                    payload = json.dumps(body).encode('utf-8')
+                    headers["Content-Type"] = "application/json"
+                connection.request(method, path, body=payload, headers=headers)
+                response = connection.getresponse()
+                data = response.read()
+                if response.getheader("Content-Encoding") == "gzip":
+                    data = gzip.decompress(data)
+                return response.status, data
+            except (http.client.HTTPException, OSError):
+                # The server closed an idle keep-alive connection; reconnect once
+                connection.close()
+                self._local.connection = None
+                if attempt == 2:
+                    raise
+
+
+def serve_in_background(app):
+    """Serve the app on a free local port with the threaded development server; returns its URL"""
+    from werkzeug.serving import make_server, WSGIRequestHandler
+
+    class QuietHandler(WSGIRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_request(self, *args, **kwargs):
+            pass
+
+    server = make_server("127.0.0.1", 0, app, threaded=True, request_handler=QuietHandler)
+    threading.Thread(target=server.serve_forever, name="bench-server", daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}"
+
+
+# Measurements
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[rank]
+
+
+def summarize(scenario, concurrency, latencies, statuses, elapsed, errors, response_bytes, extra=None):
+    latencies = sorted(latencies)
+    ms = lambda seconds: round(seconds * 1000, 3) if seconds is not None else None
+    summary = {
+        "scenario": scenario,
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": errors,
+        "status_counts": {str(status): count for status, count in sorted(statuses.items())},
+        "duration_seconds": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else None,
+        "mean_response_bytes": round(response_bytes / len(latencies)) if latencies else None,
+        "latency_ms": {
+            "min": ms(latencies[0]) if latencies else None,
+            "mean": ms(sum(latencies) / len(latencies)) if latencies else None,
+            "p50": ms(percentile(latencies, 50)),
+            "p90": ms(percentile(latencies, 90)),
+            "p95": ms(percentile(latencies, 95)),
+            "p99": ms(percentile(latencies, 99)),
+            "max": ms(latencies[-1]) if latencies else None,
+        },
+    }
+    summary.update(extra or {})
+    return summary
+
+
+def run_load(client, scenario, make_request, concurrency, duration, max_requests):
+    """Call make_request(rng) -> (method, path, body) from ``concurrency`` threads until time or requests run out"""
+    latencies, statuses = [], Counter()
+    counters = {"errors": 0, "bytes": 0}
+    issued = itertools.count()
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def worker(number):
+        rng = synthetic.rng_for("load", scenario, concurrency, number)
+        local_latencies, local_statuses, local_errors, local_bytes = [], Counter(), 0, 0
+        while time.perf_counter() < deadline and (max_requests is None or next(issued) < max_requests):
+            method, path, body = make_request(rng)
+            start = time.perf_counter()
+            try:
+                status, data = client.request(method, path, body)
+                local_bytes += len(data)
+            except Exception:
+                status = "exception"
+            local_latencies.append(time.perf_counter() - start)
+            local_statuses[status] += 1
+            if status == "exception" or status >= 400:
+                local_errors += 1
+        with lock:
+            latencies.extend(local_latencies)
+            statuses.update(local_statuses)
+            counters["errors"] += local_errors
+            counters["bytes"] += local_bytes
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(number,)) for number in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return summarize(scenario, concurrency, latencies, statuses, time.perf_counter() - start,
+                     counters["errors"], counters["bytes"])
+
+
+def run_process(client, root, concurrency, orders_per_worker, poll_seconds=0.01):
+    """Submit fresh orders through /process and time each one until its job finishes"""
+    run_id = datetime.datetime.now().strftime("%H%M%S%f")
+    order_ids = [f"BENCH-{run_id}-{number:05d}" for number in range(concurrency * orders_per_worker)]
+    for number, order_id in enumerate(order_ids):
+        rng = synthetic.rng_for("process", order_id)
+        extracted = synthetic.extraction(rng)
+        folder = root / "orders" / order_id
+        folder.mkdir(parents=True)
+        (folder / "referral.pdf").write_bytes(synthetic.minimal_pdf(synthetic.referral_text(order_id, extracted)))
+        (folder / "fax_cover.txt").write_text(f"FAX COVER\nRe: {order_id}\n", encoding='utf-8')
+
+    pending = iter(order_ids)
+    lock = threading.Lock()
+    latencies, submit_latencies, statuses = [], [], Counter()
+    counters = {"errors": 0}
+
+    def worker():
+        while True:
+            with lock:
+                order_id = next(pending, None)
+            if order_id is None:
+                return
+            start = time.perf_counter()
+            submitted = None
+            try:
+                status, data = client.request("POST", f"/api/orders/{order_id}/process")
+                submitted = time.perf_counter()
+                outcome = status
+                if status == 202:
+                    status_url = json.loads(data)["status_url"]
+                    while True:
+                        _, data = client.request("GET", status_url)
+                        job = json.loads(data)
+                        if job["status"] in ("succeeded", "failed"):
+                            outcome = job["status"]
+                            break
+                        time.sleep(poll_seconds)
+            except Exception:
+                outcome = "exception"
+            submitted = submitted or time.perf_counter()
+            with lock:
+                submit_latencies.append(submitted - start)
+                latencies.append(time.perf_counter() - start)
+                statuses[outcome] += 1
+                if outcome != "succeeded":
+                    counters["errors"] += 1
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    submit_sorted = sorted(submit_latencies)
+    summary = summarize("process", concurrency, latencies, statuses, elapsed, counters["errors"], 0, {
+        "submit_latency_ms": {"p50": round(percentile(submit_sorted, 50) * 1000, 3) if submit_sorted else None,
+                              "p95": round(percentile(submit_sorted, 95) * 1000, 3) if submit_sorted else None},
+    })
+    summary.pop("mean_response_bytes")
+
+    for order_id in order_ids:
+        shutil.rmtree(root / "orders" / order_id, ignore_errors=True)
+        for path in itertools.chain((root / "results").glob(f"{order_id}_*"), (root / "ocr").glob(f"{order_id}_*")):
+            path.unlink()
+    return summary
+
+
+def request_makers(manifest):
+    processed = manifest["processed"]
+    every = processed + manifest["pending"]
+    return {
+        "dashboard": lambda rng: ("GET", "/dashboard", None),
+        "orders": lambda rng: ("GET", "/api/orders", None),
+        "orders_page": lambda rng: ("GET", "/api/orders?limit=100&sort=processed_date&order=desc", None),
+        "order_detail": lambda rng: ("GET", f"/api/orders/{rng.choice(processed)}", None),
+        "providers": lambda rng: ("GET", f"/api/orders/{rng.choice(processed)}/providers"
+                                         f"?proc_code={rng.choice(synthetic.CPT_CODES)}", None),
+        "documents": lambda rng: ("GET", f"/api/orders/{rng.choice(every)}/documents", None),
+    }
+
+
+# Regression check
+
+def compare(results, baseline, tolerance):
+    """Scenarios whose p95 latency grew, or throughput fell, by more than ``tolerance`` (a fraction)"""
+    previous = {(r["scenario"], r["concurrency"]): r for r in baseline.get("results", [])}
+    regressions = []
+    for result in results:
+        before = previous.get((result["scenario"], result["concurrency"]))
+        if before is None:
+            continue
+        p95, before_p95 = result["latency_ms"]["p95"], before["latency_ms"]["p95"]
+        if p95 and before_p95 and p95 > before_p95 * (1 + tolerance):
+            regressions.append({"scenario": result["scenario"], "concurrency": result["concurrency"],
+                                "metric": "p95_ms", "baseline": before_p95, "current": p95})
+        rps, before_rps = result["throughput_rps"], before["throughput_rps"]
+        if rps and before_rps and rps < before_rps * (1 - tolerance):
+            regressions.append({"scenario": result["scenario"], "concurrency": result["concurrency"],
+                                "metric": "throughput_rps", "baseline": before_rps, "current": rps})
+    return regressions
+
+
+# Setup
+
+def configure_environment(args, root, manifest):
+    """Point the app at the data set and the fakes; must run before app is imported"""
+    os.environ.update({
+        "INPUT_DIR": str(root / "orders"),
+        "OUTPUT_DIR": str(root / "results"),
+        "OCR_DIR": str(root / "ocr"),
+        "REFERRALS_DIR": str(BENCH_DIR / "fakes"),
+        "RESULTS_BACKEND": args.backend,
+        "RESULTS_DB": str(root / "results.sqlite3"),
+        "BENCH_PROVIDERS_FILE": str(root / "providers.json"),
+        "BENCH_PROVIDER_INDEX": "0" if args.no_provider_index else "1",
+        "BENCH_OCR_LATENCY_MS": str(args.ocr_latency_ms),
+        "BENCH_LLM_LATENCY_MS": str(args.llm_latency_ms),
+        "BENCH_DB_LATENCY_MS": str(args.db_latency_ms),
+        # Caches live with the data set; background index refreshes would only add noise
+        "ORDER_INDEX_REFRESH_SECONDS": "0",
+        "LLM_CACHE_DIR": str(root / "cache" / "llm"),
+        "OCR_CACHE_DIR": str(root / "cache" / "ocr"),
+    })
+    sys.path.insert(0, str(BENCH_DIR / "fakes"))
+    sys.path.insert(0, str(BACKEND_DIR))
+
+
+def start_app(args, root):
+    """Import and load the app the way wsgi.py does; returns (module, cold start timings)"""
+    cold_start = {}
+    start = time.perf_counter()
+    import app as portal
+    cold_start["import_seconds"] = round(time.perf_counter() - start, 3)
+
+    if args.backend == "sqlite":
+        from results_store import JSONResultsStore, import_json_results
+        start = time.perf_counter()
+        import_json_results(JSONResultsStore(root / "results"), portal.results_store)
+        cold_start["sqlite_import_seconds"] = round(time.perf_counter() - start, 3)
+
+    portal.create_app()
+    cold_start["startup"] = portal.startup_timings.to_dict()
+    return portal, cold_start
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def print_table(results, stream=sys.stderr):
+    print(f"{'scenario':<14}{'conc':>5}{'reqs':>8}{'err':>6}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}",
+          file=stream)
+    for r in results:
+        latency = r["latency_ms"]
+        print(f"{r['scenario']:<14}{r['concurrency']:>5}{r['requests']:>8}{r['errors']:>6}"
+              f"{r['throughput_rps'] or 0:>10.1f}{latency['p50'] or 0:>10.2f}{latency['p95'] or 0:>10.2f}"
+              f"{latency['p99'] or 0:>10.2f}", file=stream)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the portal API on synthetic data")
+    parser.add_argument("--orders", type=int, default=1000, help="Orders in the data set (e.g. 1000, 10000, 100000)")
+    parser.add_argument("--providers", type=int, default=5000)
+    parser.add_argument("--data-dir", help="Where to generate the data set (default: a temp folder per size)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help=f"Comma-separated, from: {', '.join(SCENARIOS)}")
+    parser.add_argument("--concurrency", default="1,8,32", help="Comma-separated concurrency levels")
+    parser.add_argument("--duration", type=float, default=10, help="Seconds per scenario and concurrency level")
+    parser.add_argument("--requests", type=int, help="Stop each run after this many requests instead")
+    parser.add_argument("--process-orders", type=int, default=5, help="Orders per worker in the process scenario")
+    parser.add_argument("--backend", choices=("json", "sqlite"), default="json", help="Results store backend")
+    parser.add_argument("--no-provider-index", action="store_true",
+                        help="Don't load the provider index, so lookups hit the fake provider database")
+    parser.add_argument("--ocr-latency-ms", type=float, default=200, help="Fake Document AI time per document")
+    parser.add_argument("--llm-latency-ms", type=float, default=1500, help="Fake LLM call time")
+    parser.add_argument("--db-latency-ms", type=float, default=20, help="Fake provider database query time")
+    parser.add_argument("--http", action="store_true", help="Go through a local HTTP server instead of calling the app directly")
+    parser.add_argument("--url", help="Load-test an already running server instead")
+    parser.add_argument("--output", help="Write the JSON report here (default: stdout)")
+    parser.add_argument("--baseline", help="Earlier report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed slowdown against the baseline (0.2 = 20%%)")
+    parser.add_argument("--fail-on-regression", action="store_true", help="Exit with status 1 if anything regressed")
+    parser.add_argument("--verbose", action="store_true", help="Show the app's own output")
+    args = parser.parse_args(argv)
+
+    scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = [name for name in scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"Unknown scenarios: {', '.join(unknown)}")
+    levels = [int(level) for level in args.concurrency.split(",")]
+
+    root = Path(args.data_dir or Path(tempfile.gettempdir()) / f"referral_bench_{args.orders}_{args.seed}")
+    print(f"Preparing {args.orders} orders in {root}...", file=sys.stderr)
+    manifest = generate(root, args.orders, args.providers, seed=args.seed)
+    configure_environment(args, root, manifest)
+
+    quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(open(os.devnull, 'w'))
+    with quiet:
+        portal, cold_start = start_app(args, root)
+        if args.url:
+            client = HTTPClient(args.url)
+        elif args.http:
+            client = HTTPClient(serve_in_background(portal.app))
+        else:
+            client = InProcessClient(portal.app)
+
+        makers = request_makers(manifest)
+        results = []
+        for scenario in scenarios:
+            for concurrency in levels:
+                print(f"  {scenario} x{concurrency}...", file=sys.stderr)
+                if scenario == "process":
+                    results.append(run_process(client, root, concurrency, args.process_orders))
+                else:
+                    results.append(run_load(client, scenario, makers[scenario], concurrency,
+                                            args.duration, args.requests))
+
+    report = {
+        "meta": {
+            "timestamp": str(datetime.datetime.now()),
+            "git_commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "client": "url" if args.url else "http" if args.http else "in-process",
+        },
+        "settings": {key: value for key, value in vars(args).items() if key not in ("output", "baseline", "verbose")},
+        "data_set": {
+            "root": str(root),
+            "orders": args.orders,
+            "processed": len(manifest["processed"]),
+            "pending": len(manifest["pending"]),
+            "providers": args.providers,
+            "generate_seconds": manifest["generate_seconds"],
+        },
+        "cold_start": cold_start,
+        "results": results,
+    }
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        report["regressions"] = regressions
+
+    print_table(results)
+    for regression in regressions:
+        print(f"REGRESSION {regression['scenario']} x{regression['concurrency']} {regression['metric']}: "
+              f"{regression['baseline']} -> {regression['current']}", file=sys.stderr)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return 1 if regressions and args.fail_on_regression else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,128 @@
+"""Synthetic referrals, results and providers shaped like the real ones.
+
+Shared by the data generator and the fake ``process`` module, so orders
+processed during a benchmark look the same as the pre-generated ones.
+"""
+import datetime
+import random
+
+FIRST_NAMES = ("James", "Mary", "Robert", "Patricia", "John", "Jennifer", "Michael", "Linda", "David",
+               "Elizabeth", "William", "Barbara", "Richard", "Susan", "Joseph", "Jessica", "Thomas", "Sarah")
+LAST_NAMES = ("Smith", "Johnson", "Williams", "Brown", "Jones", "Garcia", "Miller", "Davis", "Rodriguez",
+              "Martinez", "Hernandez", "Lopez", "Gonzalez", "Wilson", "Anderson", "Thomas", "Taylor", "Moore")
+EMPLOYERS = ("Acme Logistics", "Keystone Foods", "Summit Builders", "Harbor Freight Lines", "Metro Transit")
+
+# Imaging and therapy codes that show up on workers' comp referrals
+CPT_CODES = ("73721", "73221", "72148", "72141", "73718", "97110", "97140", "97161", "95886", "20610")
+
+# (city, state, latitude, longitude) the patients and providers are scattered around
+CITIES = (
+    ("Philadelphia", "PA", 39.9526, -75.1652), ("Pittsburgh", "PA", 40.4406, -79.9959),
+    ("Newark", "NJ", 40.7357, -74.1724), ("Baltimore", "MD", 39.2904, -76.6122),
+    ("Columbus", "OH", 39.9612, -82.9988), ("Richmond", "VA", 37.5407, -77.4360),
+    ("Charlotte", "NC", 35.2271, -80.8431), ("Atlanta", "GA", 33.7490, -84.3880),
+    ("Chicago", "IL", 41.8781, -87.6298), ("Dallas", "TX", 32.7767, -96.7970),
+)
+
+STATUSES = ("Processed", "Approved", "Ready for CRM")
+
+
+def order_id_for(number):
+    return f"ORD-{number:06d}"
+
+
+def _field(value, confidence=0.95):
+    return {"value": value, "confidence": confidence}
+
+
+def _point(rng, spread=0.6):
+    city, state, lat, lon = rng.choice(CITIES)
+    return city, state, round(lat + rng.uniform(-spread, spread), 6), round(lon + rng.uniform(-spread, spread), 6)
+
+
+def extraction(rng):
+    """The extracted_data block the LLM step produces"""
+    name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+    city, state, lat, lon = _point(rng)
+    codes = rng.sample(CPT_CODES, rng.randint(1, 3))
+    return {
+        "patient_name": _field(name),
+        "patient_info": {
+            "patient_name": _field(name),
+            "date_of_birth": _field(f"19{rng.randint(50, 99)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"),
+            "address": _field(f"{rng.randint(1, 9999)} Main St, {city}, {state}"),
+            "phone": _field(f"555-{rng.randint(100, 999)}-{rng.randint(1000, 9999)}"),
+            "employer": _field(rng.choice(EMPLOYERS)),
+            "claim_number": _field(f"WC{rng.randint(10000000, 99999999)}"),
+        },
+        "procedures": [{"cpt_code": _field(code), "description": _field(f"Procedure {code}"),
+                        "body_part": _field(rng.choice(("knee", "shoulder", "lumbar spine", "cervical spine")))}
+                       for code in codes],
+        "_location": {"latitude": lat, "longitude": lon, "display_name": f"{city}, {state}"},
+    }
+
+
+def results_for(order_id, extracted, providers=None, rng=None, status="Processed", processed_date=None):
+    """A results dict as save_results writes it"""
+    extracted = dict(extracted)
+    location = extracted.pop("_location")
+    processed_date = processed_date or datetime.datetime.now()
+    results = {
+        "order_id": order_id,
+        "status": status,
+        "processed_date": str(processed_date),
+        "extracted_data": extracted,
+        "mapping_data": {"geocode_data": location},
+        "provider_mapping": {
+            "status": "success",
+            "procedures": [{"cpt_code": procedure["cpt_code"]["value"],
+                            "providers": list((providers or [])[:3])}
+                           for procedure in extracted["procedures"]],
+        },
+    }
+    if status != "Processed":
+        results["approved_date"] = str(processed_date + datetime.timedelta(hours=rng.randint(1, 48) if rng else 1))
+    if status == "Ready for CRM":
+        results["crm_ready_date"] = results["approved_date"]
+    return results
+
+
+def provider(rng, number):
+    city, state, lat, lon = _point(rng, spread=1.5)
+    codes = rng.sample(CPT_CODES, rng.randint(2, len(CPT_CODES)))
+    return {
+        "provider_id": f"PRV-{number:06d}",
+        "DBA Name Billing Name": f"{rng.choice(LAST_NAMES)} {rng.choice(('Imaging', 'Physical Therapy', 'Orthopedics', 'MRI Center'))}",
+        "City": city,
+        "State": state,
+        "Phone": f"555-{rng.randint(100, 999)}-{rng.randint(1000, 9999)}",
+        "Fax Number": f"555-{rng.randint(100, 999)}-{rng.randint(1000, 9999)}",
+        "Provider Network": rng.choice(("In Network", "Out of Network")),
+        "latitude": lat,
+        "longitude": lon,
+        "rates": {code: round(rng.uniform(80, 1800), 2) for code in codes},
+    }
+
+
+def referral_text(order_id, extracted):
+    """Plain text of a referral letter, which is what the fake OCR "reads" back"""
+    info = extracted["patient_info"]
+    lines = [f"WORKERS' COMPENSATION REFERRAL {order_id}",
+             f"Patient: {info['patient_name']['value']}",
+             f"DOB: {info['date_of_birth']['value']}",
+             f"Address: {info['address']['value']}",
+             f"Employer: {info['employer']['value']}",
+             f"Claim: {info['claim_number']['value']}"]
+    lines += [f"Requested: CPT {p['cpt_code']['value']} {p['body_part']['value']}" for p in extracted["procedures"]]
+    return "\n".join(lines) + "\n"
+
+
+def minimal_pdf(text, pages=1):
+    """A tiny (not really renderable) PDF with the given number of page objects"""
+    body = "".join(f"{i + 3} 0 obj << /Type /Page /Parent 2 0 R >> endobj\n" for i in range(pages))
+    return (f"%PDF-1.4\n1 0 obj << /Type /Catalog /Pages 2 0 R >> endobj\n"
+            f"2 0 obj << /Type /Pages /Count {pages} >> endobj\n{body}% {text}\n%%EOF\n").encode('utf-8')
+
+
+def rng_for(seed, *parts):
+    return random.Random(f"{seed}:{':'.join(str(part) for part in parts)}")
@@ -0,0 +1,208 @@
+"""Small cache building blocks shared by the OCR, LLM and preview caches."""
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+
+
+class DiskCache:
+    """Directory of cache entries, one file per key, with LRU eviction.
+
+    Entries are JSON values (or raw bytes with ``binary=True``). The cache is
+    bounded by total size (``max_bytes``) and/or entry count (``max_entries``);
+    the least recently used entries are deleted first. With ``ttl`` set,
+    entries older than that many seconds are treated as misses. Recency is
+    tracked in memory, so hits never write to the disk.
+    """
+
+    def __init__(self, directory, max_bytes=None, max_entries=None, ttl=None, binary=False):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.binary = binary
+        self.suffix = ".bin" if binary else ".json"
+        self._entries = OrderedDict()  # key -> (size, written_at), least recently used first
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+        self._loaded = False
+
+    def _ensure_loaded(self):
+        """Rebuild the in-memory index from whatever is already on disk (on first use, under the lock)"""
+        if self._loaded:
+            return
+        self._loaded = True
+        self.directory.mkdir(parents=True, exist_ok=True)
+        found = []
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.name.endswith(self.suffix) and entry.is_file():
+                    stat = entry.stat()
+                    found.append((stat.st_mtime, entry.name[:-len(self.suffix)], stat.st_size))
+        for written_at, key, size in sorted(found):
+            self._entries[key] = (size, written_at)
+            self._total_bytes += size
+        self._evict()
+
+    def _path(self, key):
+        return self.directory / f"{key}{self.suffix}"
+
+    def _expired(self, written_at):
+        return self.ttl is not None and time.time() - written_at > self.ttl
+
+    def _remove(self, key):
+        size, _ = self._entries.pop(key)
+        self._total_bytes -= size
+        try:
+            self._path(key).unlink()
+        except FileNotFoundError:
+            pass
+
+    def _evict(self):
+        while self._entries and (
+                (self.max_bytes is not None and self._total_bytes > self.max_bytes) or
+                (self.max_entries is not None and len(self._entries) > self.max_entries)):
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def get(self, key):
+        """Cached value for key, or None"""
+        with self._lock:
+            self._ensure_loaded()
+            entry = self._entries.get(key)
+            if entry is None or self._expired(entry[1]):
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+
+        try:
+            if self.binary:
+                value = self._path(key).read_bytes()
+            else:
+                with open(self._path(key), 'r', encoding='utf-8') as f:
+                    value = json.load(f)
+        except (OSError, ValueError):
+            with self._lock:
+                if key in self._entries:
+                    self._remove(key)
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        return value
+
+    def set(self, key, value):
+        """Store value under key, evicting old entries if the cache is over its bounds"""
+        data = value if self.binary else json.dumps(value).encode('utf-8')
+        with self._lock:
+            self._ensure_loaded()
+        path = self._path(key)
+        tmp_path = path.with_name(f"{path.name}.{uuid.uuid4().hex}.tmp")
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            if key in self._entries:
+                self._total_bytes -= self._entries.pop(key)[0]
+            self._entries[key] = (len(data), time.time())
+            self._total_bytes += len(data)
+            self.writes += 1
+            self._evict()
+
+    def delete(self, key):
+        with self._lock:
+            self._ensure_loaded()
+            if key in self._entries:
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._ensure_loaded()
+            for key in list(self._entries):
+                self._remove(key)
+
+    def __contains__(self, key):
+        with self._lock:
+            self._ensure_loaded()
+            entry = self._entries.get(key)
+            return entry is not None and not self._expired(entry[1])
+
+    def stats(self):
+        with self._lock:
+            self._ensure_loaded()
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+                "writes": self.writes,
+                "evictions": self.evictions,
+            }
+
+
+class TTLCache:
+    """Thread-safe in-memory LRU cache whose entries expire after ``ttl`` seconds"""
+
+    def __init__(self, max_entries=1024, ttl=300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires_at, value), least recently used first
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.time():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.time() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
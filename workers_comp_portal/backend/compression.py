@@ -0,0 +1,82 @@
+"""Response compression negotiated from Accept-Encoding: brotli when available, else gzip."""
+import gzip
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip works with every client
+    brotli = None
+
+# Text-like responses worth compressing; PDFs, images and zips are already compressed
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "application/javascript",
+                      "image/svg+xml", "application/xml")
+
+GZIP_LEVEL = 6
+# Brotli's higher qualities are far slower than gzip for little gain on JSON
+BROTLI_QUALITY = 5
+
+
+def _accepted(accept_encoding):
+    """Encodings the client accepts (q=0 means refused)"""
+    accepted = set()
+    for part in (accept_encoding or "").split(","):
+        name, *params = [item.strip() for item in part.split(";")]
+        quality = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if name and quality > 0:
+            accepted.add(name.lower())
+    return accepted
+
+
+def choose_encoding(accept_encoding):
+    """'br', 'gzip' or None for a request's Accept-Encoding header"""
+    accepted = _accepted(accept_encoding)
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted or "*" in accepted:
+        return "gzip"
+    return None
+
+
+def is_compressible(mimetype):
+    return bool(mimetype) and (mimetype.startswith("text/") or mimetype in COMPRESSIBLE_TYPES)
+
+
+def compress_response(response, accept_encoding, min_size=1024):
+    """Compress a Flask response in place if the client, content type and size allow it.
+
+    Streamed responses (event stream, CRM exports) and files sent with
+    send_file are left alone, as are responses that already have a
+    Content-Encoding.
+    """
+    response.vary.add("Accept-Encoding")
+    if (response.direct_passthrough or response.is_streamed
+            or response.status_code < 200 or response.status_code in (204, 206, 304)
+            or "Content-Encoding" in response.headers
+            or not is_compressible(response.mimetype)):
+        return response
+
+    encoding = choose_encoding(accept_encoding)
+    if encoding is None:
+        return response
+    data = response.get_data()
+    if len(data) < min_size:
+        return response
+
+    if encoding == "br":
+        compressed = brotli.compress(data, quality=BROTLI_QUALITY)
+    else:
+        compressed = gzip.compress(data, compresslevel=GZIP_LEVEL)
+    response.set_data(compressed)
+    response.headers["Content-Encoding"] = encoding
+    # The compressed body is a different representation of the same content. Conditional GETs
+    # compare If-None-Match weakly (contains_weak) and main.js strips the W/, so both forms match
+    etag = response.headers.get("ETag")
+    if etag and not etag.startswith("W/"):
+        response.headers["ETag"] = f"W/{etag}"
+    return response
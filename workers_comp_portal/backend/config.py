@@ -0,0 +1,14 @@
+"""Data folder locations, shared by the web app and the command-line tools (overridable, e.g. to point
+the benchmarks at synthetic data). Importing this has no side effects, unlike importing app."""
+import os
+from pathlib import Path
+
+INPUT_DIR = Path(os.environ.get('INPUT_DIR', r'C:\Users\ChristopherCato\OneDrive - clarity-dx.com\Intake AI Agent\data\orders'))
+OUTPUT_DIR = Path(os.environ.get('OUTPUT_DIR', r'C:\Users\ChristopherCato\OneDrive - clarity-dx.com\Intake AI Agent\data\results'))
+OCR_DIR = Path(os.environ.get('OCR_DIR', r'C:\Users\ChristopherCato\OneDrive - clarity-dx.com\Intake AI Agent\data\ocr'))
+CRM_DIR = Path(os.environ.get('CRM_DIR', r'C:\Users\ChristopherCato\OneDrive - clarity-dx.com\Intake AI Agent\data\crm_ready'))
+
+# RESULTS_BACKEND=json keeps one {order_id}_results.json per order in OUTPUT_DIR; sqlite uses an indexed
+# database at RESULTS_DB (default OUTPUT_DIR/results.sqlite3)
+RESULTS_BACKEND = os.environ.get('RESULTS_BACKEND', 'json')
+RESULTS_DB = Path(os.environ.get('RESULTS_DB') or OUTPUT_DIR / 'results.sqlite3')
@@ -0,0 +1,352 @@
+"""CRM payloads: one order at a time, or many streamed out as an NDJSON or zip bundle."""
+import datetime
+import io
+import json
+import os
+import threading
+import time
+import uuid
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+EXPORT_FORMATS = {
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "zip": ("application/zip", "zip"),
+}
+
+
+def _found(data):
+    return data['value'] and data['value'] != "not found" and data['value'] != "null"
+
+
+def build_crm_payload(order_id, results):
+    """CRM-ready format from an order's results"""
+    crm_data = {
+        "order_id": order_id,
+        "patient_info": {},
+        "procedures": [],
+        "provider_data": {}
+    }
+
+    # Extract patient information
+    for field, data in results['extracted_data']['patient_info'].items():
+        if _found(data):
+            crm_data['patient_info'][field] = data['value']
+
+    # Extract procedures
+    for procedure in results['extracted_data']['procedures']:
+        proc_data = {field: data['value'] for field, data in procedure.items() if _found(data)}
+        if proc_data:  # Only add if we have data
+            crm_data['procedures'].append(proc_data)
+
+    # Add provider information if available
+    if 'provider_mapping' in results and results['provider_mapping']['status'] == 'success':
+        for proc_mapping in results['provider_mapping']['procedures']:
+            if 'providers' in proc_mapping and proc_mapping['providers']:
+                # Just get the first provider for each procedure (closest one)
+                provider = proc_mapping['providers'][0]
+
+                # Match provider to procedure by CPT code if possible
+                cpt_code = proc_mapping.get('cpt_code')
+                crm_data['provider_data'].setdefault(cpt_code, []).append({
+                    "name": provider.get("DBA Name Billing Name"),
+                    "address": f"{provider.get('City')}, {provider.get('State')}",
+                    "phone": provider.get("Phone"),
+                    "fax": provider.get("Fax Number"),
+                    "network_status": provider.get("Provider Network"),
+                    "distance_miles": provider.get("distance_miles")
+                })
+
+    return crm_data
+
+
+def write_crm_file(crm_dir, order_id, crm_data):
+    """Save ``{crm_dir}/{order_id}/{order_id}_crm.json``; returns its path"""
+    order_crm_dir = crm_dir / order_id
+    order_crm_dir.mkdir(exist_ok=True, parents=True)
+    crm_json_path = order_crm_dir / f"{order_id}_crm.json"
+    with open(crm_json_path, 'w', encoding='utf-8') as f:
+        json.dump(crm_data, f, indent=2)
+    return crm_json_path
+
+
+def mark_ready(results):
+    """results_store.update mutation for a packaged order"""
+    results['status'] = 'Ready for CRM'
+    results['crm_ready_date'] = str(datetime.datetime.now())
+
+
+class _StreamBuffer(io.RawIOBase):
+    """Write-only file object whose contents are taken out as they are written (for streaming a zip)"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+class CRMExport:
+    """Packages many orders for the CRM in one streamed download.
+
+    Payloads are built on a small thread pool and streamed in the order of
+    ``order_ids``, as NDJSON (one payload per line) or a zip with one
+    ``{order_id}_crm.json`` per order and a ``manifest.json``. Optionally each
+    order's file is also written under ``crm_dir`` as the single-order route
+    does, and delivered orders are marked Ready for CRM.
+
+    Progress is saved to a checkpoint file every ``checkpoint_every`` delivered
+    orders or ``checkpoint_seconds`` seconds, whichever comes first, and when
+    the stream ends or is cut off. An export that was interrupted (client
+    gone, server restarted) is resumed by ``CRMExport.resume`` with the same
+    orders and options. A resumed NDJSON export only streams the orders that
+    weren't delivered yet (after a crash that may include the few delivered
+    since the last checkpoint). A resumed zip export is the full bundle again,
+    since a cut-off zip can't be opened; orders already delivered are not
+    marked ready a second time. ``sweep_checkpoints`` deletes old checkpoints.
+    """
+
+    def __init__(self, results_store, order_ids, checkpoint_dir, fmt="ndjson", crm_dir=None,
+                 write_order_files=False, mark_ready=True, workers=4, status=None, on_packaged=None,
+                 export_id=None, done=None, checkpoint_every=100, checkpoint_seconds=10):
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"Unsupported export format: {fmt}")
+        if write_order_files and crm_dir is None:
+            raise ValueError("write_order_files needs a crm_dir")
+        self.export_id = export_id or uuid.uuid4().hex
+        self.results_store = results_store
+        self.order_ids = list(order_ids)
+        self.checkpoint_dir = checkpoint_dir
+        self.format = fmt
+        self.crm_dir = crm_dir
+        self.write_order_files = write_order_files
+        self.mark_ready = mark_ready
+        self.workers = max(1, workers)
+        self.status = status
+        self.on_packaged = on_packaged
+        self.done = list(done or [])
+        self.failed = {}
+        self.state = "created"
+        self.created_at = str(datetime.datetime.now())
+        self.checkpoint_every = max(1, checkpoint_every)
+        self.checkpoint_seconds = checkpoint_seconds
+        self._unsaved = 0
+        self._saved_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    # Checkpoints
+
+    @property
+    def checkpoint_path(self):
+        return self.checkpoint_dir / f"{self.export_id}.json"
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                "export_id": self.export_id,
+                "state": self.state,
+                "format": self.format,
+                "status": self.status,
+                "write_order_files": self.write_order_files,
+                "mark_ready": self.mark_ready,
+                "created_at": self.created_at,
+                "updated_at": str(datetime.datetime.now()),
+                "total": len(self.order_ids),
+                "delivered": len(self.done),
+                "order_ids": self.order_ids,
+                "done": list(self.done),
+                "failed": dict(self.failed),
+            }
+
+    def save_checkpoint(self):
+        with self._lock:
+            self._unsaved = 0
+            self._saved_at = time.monotonic()
+        self.checkpoint_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.checkpoint_path.with_name(f"{self.checkpoint_path.name}.tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    @classmethod
+    def load_checkpoint(cls, checkpoint_dir, export_id):
+        """Checkpoint contents of an earlier export, or None"""
+        if not export_id.isalnum():
+            return None
+        path = checkpoint_dir / f"{export_id}.json"
+        if not path.exists():
+            return None
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    @classmethod
+    def sweep_checkpoints(cls, checkpoint_dir, completed_seconds, interrupted_seconds, now=None):
+        """Delete checkpoints of completed exports older than ``completed_seconds`` and of
+        any other export older than ``interrupted_seconds``; returns how many were deleted"""
+        now = now if now is not None else time.time()
+        removed = 0
+        if not checkpoint_dir.exists():
+            return removed
+        for path in checkpoint_dir.iterdir():
+            try:
+                age = now - path.stat().st_mtime
+                if age < min(completed_seconds, interrupted_seconds):
+                    continue
+                if path.suffix == ".json":
+                    with open(path, 'r', encoding='utf-8') as f:
+                        completed = json.load(f).get("state") == "completed"
+                    if age < (completed_seconds if completed else interrupted_seconds):
+                        continue
+                elif not path.name.endswith(".json.tmp"):
+                    continue
+                path.unlink()
+                removed += 1
+            except (OSError, ValueError) as e:
+                print(f"Error sweeping CRM export checkpoint {path.name}: {str(e)}")
+        return removed
+
+    @classmethod
+    def resume(cls, results_store, checkpoint_dir, export_id, crm_dir=None, workers=4, on_packaged=None,
+               **options):
+        """Pick an interrupted export back up where it stopped, or None if there's no such export"""
+        checkpoint = cls.load_checkpoint(checkpoint_dir, export_id)
+        if checkpoint is None:
+            return None
+        export = cls(results_store, checkpoint["order_ids"], checkpoint_dir, fmt=checkpoint["format"],
+                     crm_dir=crm_dir, write_order_files=checkpoint["write_order_files"],
+                     mark_ready=checkpoint["mark_ready"], workers=workers, status=checkpoint.get("status"),
+                     on_packaged=on_packaged, export_id=export_id, done=checkpoint["done"], **options)
+        export.created_at = checkpoint["created_at"]
+        return export
+
+    # Building
+
+    def remaining(self):
+        done = set(self.done)
+        return [order_id for order_id in self.order_ids if order_id not in done]
+
+    def to_send(self):
+        """Orders this stream carries: all of them for a zip, the undelivered ones for NDJSON"""
+        return list(self.order_ids) if self.format == "zip" else self.remaining()
+
+    def _build(self, order_id):
+        """(payload, etag) or (None, error message) for one order"""
+        try:
+            results, etag = self.results_store.read(order_id)
+            crm_data = build_crm_payload(order_id, results)
+            if self.write_order_files:
+                write_crm_file(self.crm_dir, order_id, crm_data)
+            return crm_data, etag
+        except Exception as e:
+            return None, f"{type(e).__name__}: {str(e)}"
+
+    def _built(self):
+        """(order_id, payload, etag or error) in order, keeping a bounded number of builds ahead"""
+        pending = deque()
+        order_ids = iter(self.to_send())
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="crm-export") as executor:
+            try:
+                for order_id in order_ids:
+                    pending.append((order_id, executor.submit(self._build, order_id)))
+                    if len(pending) >= self.workers * 2:
+                        order_id, future = pending.popleft()
+                        yield (order_id,) + future.result()
+                while pending:
+                    order_id, future = pending.popleft()
+                    yield (order_id,) + future.result()
+            finally:
+                for _, future in pending:
+                    future.cancel()
+
+    def _progress(self):
+        """Count one more finished order and checkpoint if enough orders or time went by"""
+        with self._lock:
+            self._unsaved += 1
+            due = (self._unsaved >= self.checkpoint_every or
+                   time.monotonic() - self._saved_at >= self.checkpoint_seconds)
+        if due:
+            self.save_checkpoint()
+
+    def _delivered(self, order_id, etag):
+        """Record an order the client has been sent: mark it ready and (now and then) checkpoint"""
+        if self.mark_ready:
+            try:
+                _, new_etag = self.results_store.update(order_id, mark_ready, expected_etag=etag)
+                if self.on_packaged is not None:
+                    self.on_packaged(order_id, new_etag)
+            except Exception as e:
+                # Someone changed the order while it was exported; it stays as it is
+                with self._lock:
+                    self.failed[order_id] = f"not marked ready: {str(e)}"
+        with self._lock:
+            self.done.append(order_id)
+        self._progress()
+
+    def _failed(self, order_id, error):
+        with self._lock:
+            self.failed[order_id] = error
+        self._progress()
+
+    # Streaming
+
+    def stream(self):
+        """The export body, chunk by chunk"""
+        with self._lock:
+            self.state = "running"
+        self.save_checkpoint()
+        try:
+            if self.format == "zip":
+                yield from self._stream_zip()
+            else:
+                yield from self._stream_ndjson()
+            with self._lock:
+                self.state = "completed"
+        except GeneratorExit:
+            with self._lock:
+                self.state = "interrupted"
+            raise
+        except Exception as e:
+            print(f"CRM export {self.export_id} failed: {str(e)}")
+            with self._lock:
+                self.state = "interrupted"
+            raise
+        finally:
+            self.save_checkpoint()
+
+    def _stream_ndjson(self):
+        for order_id, crm_data, detail in self._built():
+            if crm_data is None:
+                self._failed(order_id, detail)
+                yield (json.dumps({"order_id": order_id, "error": detail}) + "\n").encode('utf-8')
+                continue
+            yield (json.dumps(crm_data) + "\n").encode('utf-8')
+            self._delivered(order_id, detail)
+
+    def _stream_zip(self):
+        buffer = _StreamBuffer()
+        with self._lock:
+            delivered_before = set(self.done)
+        with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as bundle:
+            for order_id, crm_data, detail in self._built():
+                if crm_data is None:
+                    self._failed(order_id, detail)
+                    continue
+                bundle.writestr(f"{order_id}_crm.json", json.dumps(crm_data, indent=2))
+                yield buffer.drain()
+                # Sent again in a resumed bundle: already marked ready and counted
+                if order_id not in delivered_before:
+                    self._delivered(order_id, detail)
+            manifest = self.to_dict()
+            manifest["state"] = "completed"
+            bundle.writestr("manifest.json", json.dumps(manifest, indent=2))
+        yield buffer.drain()
@@ -0,0 +1,142 @@
+"""Process-wide cache around initialize_documentai() so requests don't rebuild the client."""
+import datetime
+import functools
+import threading
+import time
+
+# Substrings that show up in google-auth / gRPC errors when credentials are bad or expired
+AUTH_ERROR_MARKERS = (
+    "unauthenticated",
+    "invalid_grant",
+    "invalid authentication credentials",
+    "could not automatically determine credentials",
+    "refresherror",
+)
+
+
+def is_auth_error(exc):
+    """True if an exception looks like an expired or rejected credential"""
+    names = {cls.__name__.lower() for cls in type(exc).__mro__}
+    if names & {"refresherror", "defaultcredentialserror", "unauthenticated"}:
+        return True
+    message = f"{type(exc).__name__} {exc}".lower()
+    return any(marker in message for marker in AUTH_ERROR_MARKERS)
+
+
+def processor_health_check(processor_name, timeout=10):
+    """health_check for a DocumentProcessorServiceClient: fetch the processor's metadata, which
+    checks the credentials and that the processor exists without OCRing anything"""
+    def check(client):
+        client.get_processor(name=processor_name, timeout=timeout)
+        return True
+    return check
+
+
+class DocumentAIClientCache:
+    """Lazily creates the Document AI client once and shares it between threads.
+
+    ``initializer`` is ``extract.initialize_documentai``; whatever it returns is
+    kept as the client. ``health_check`` (optional) gets the client and should
+    return False or raise if it is no longer usable; ``healthy()`` runs it
+    (see /readyz). ``max_age`` forces a rebuild after that many seconds.
+    """
+
+    def __init__(self, initializer, health_check=None, max_age=None, timings=None):
+        self.initializer = initializer
+        self.health_check = health_check
+        self.max_age = max_age
+        self.timings = timings
+        self._client = None
+        self._initialized = False
+        self._created = None
+        self._lock = threading.Lock()
+        self.init_count = 0
+        self.reinit_count = 0
+        self.last_init_seconds = None
+        self.last_error = None
+
+    def _expired(self):
+        return self.max_age is not None and time.time() - self._created > self.max_age
+
+    def get(self):
+        """The shared client, created on first use"""
+        if self._initialized and not self._expired():
+            return self._client
+
+        with self._lock:
+            if self._initialized and not self._expired():
+                return self._client
+
+            start = time.perf_counter()
+            try:
+                self._client = self.initializer()
+            except Exception as e:
+                self.last_error = str(e)
+                raise
+            self.last_init_seconds = round(time.perf_counter() - start, 4)
+            self._created = time.time()
+            self._initialized = True
+            self.init_count += 1
+            self.last_error = None
+            if self.timings is not None and self.init_count == 1:
+                self.timings.record("initialize_documentai", self.last_init_seconds)
+            print(f"Document AI client initialized in {self.last_init_seconds:.3f}s")
+            return self._client
+
+    def invalidate(self, reason=None):
+        """Drop the cached client so the next get() rebuilds it"""
+        with self._lock:
+            if self._initialized:
+                print(f"Discarding Document AI client: {reason or 'invalidated'}")
+            self._initialized = False
+            self._client = None
+
+    def healthy(self):
+        """Run the health check against the cached client (initializing it if needed)"""
+        try:
+            client = self.get()
+            if self.health_check is not None and self.health_check(client) is False:
+                self.last_error = "health check failed"
+                return False
+            return True
+        except Exception as e:
+            self.last_error = str(e)
+            return False
+
+    def warm_up_async(self):
+        """Initialize the client on a background thread so the first request doesn't pay for it"""
+        def warm_up():
+            try:
+                self.get()
+            except Exception as e:
+                print(f"Document AI warm-up failed: {str(e)}")
+
+        thread = threading.Thread(target=warm_up, name="documentai-warmup", daemon=True)
+        thread.start()
+        return thread
+
+    def with_reauth(self, fn):
+        """Wrap a function that uses the client: on an auth failure, rebuild the client and retry once"""
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            self.get()
+            try:
+                return fn(*args, **kwargs)
+            except Exception as e:
+                if not is_auth_error(e):
+                    raise
+                self.invalidate(f"auth failure: {str(e)}")
+                self.reinit_count += 1
+                self.get()
+                return fn(*args, **kwargs)
+        return wrapper
+
+    def stats(self):
+        return {
+            "initialized": self._initialized,
+            "created": str(datetime.datetime.fromtimestamp(self._created)) if self._created else None,
+            "init_count": self.init_count,
+            "reinit_count": self.reinit_count,
+            "last_init_seconds": self.last_init_seconds,
+            "last_error": self.last_error,
+        }
@@ -0,0 +1,180 @@
+"""Document metadata and paged access to OCR text for the document panel."""
+import re
+import threading
+import zlib
+from collections import OrderedDict
+
+from fingerprints import file_digest
+from previews import is_previewable
+
+# Document AI separates pages with form feeds in the plain-text output
+PAGE_SEPARATOR = "\f"
+
+_PDF_PAGE = re.compile(rb"/Type\s*/Page(?![a-zA-Z])")
+# PDF 1.5+ can keep objects (page objects included) in compressed object streams
+_PDF_OBJECT_STREAM = re.compile(rb"/Type\s*/ObjStm(?![a-zA-Z])")
+_PDF_STREAM_START = re.compile(rb"stream\r?\n")
+_PDF_FILTER = re.compile(rb"/Filter\s*(\[[^\]]*\]|/\w+)")
+
+_page_count_memo = OrderedDict()
+_page_count_lock = threading.Lock()
+_PAGE_COUNT_MEMO_SIZE = 4096
+
+
+def _object_stream_pages(data):
+    """Page objects inside a PDF's compressed object streams, or None if one can't be decoded"""
+    count = 0
+    for match in _PDF_OBJECT_STREAM.finditer(data):
+        start = _PDF_STREAM_START.search(data, match.end())
+        end = data.find(b"endstream", start.end()) if start else -1
+        if end < 0:
+            return None
+        header = data[max(0, data.rfind(b"obj", 0, match.start())):start.start()]
+        filters = _PDF_FILTER.search(header)
+        if filters is None:
+            continue  # uncompressed: already counted with the rest of the file
+        if re.findall(rb"/(\w+)", filters.group(1)) != [b"FlateDecode"] or b"/Predictor" in header:
+            return None
+        try:
+            objects = zlib.decompressobj().decompress(data[start.end():end])
+        except zlib.error:
+            return None
+        count += len(_PDF_PAGE.findall(objects))
+    return count
+
+
+def pdf_page_count(path):
+    """Page count of a PDF, by counting its page objects (no PDF library needed), or None if unknown
+
+    Page objects kept in Flate-compressed object streams are counted too; a
+    PDF whose object streams use another filter is reported as unknown rather
+    than miscounted.
+    """
+    count = 0
+    object_streams = False
+    tail = b""
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(1024 * 1024)
+            data = tail + chunk
+            if not chunk:
+                count += len(_PDF_PAGE.findall(data))
+                object_streams = object_streams or _PDF_OBJECT_STREAM.search(data) is not None
+                break
+            # Markers starting in the last few bytes are counted with the next chunk,
+            # so one split across chunks is still found, and nothing is counted twice
+            keep = max(0, len(data) - 32)
+            count += sum(1 for match in _PDF_PAGE.finditer(data) if match.start() < keep)
+            object_streams = object_streams or _PDF_OBJECT_STREAM.search(data, 0, keep) is not None
+            tail = data[keep:]
+
+    if object_streams:
+        with open(path, 'rb') as f:
+            compressed = _object_stream_pages(f.read())
+        if compressed is None:
+            return None
+        count += compressed
+    return count or None
+
+
+def document_page_count(path, preview_renderer=None):
+    """Number of pages in a PDF or (multi-page) image, or None for other files; memoized by content"""
+    suffix = path.suffix.lower()
+    if suffix != '.pdf' and (preview_renderer is None or not is_previewable(path)):
+        return None
+
+    digest = file_digest(path)
+    with _page_count_lock:
+        if digest in _page_count_memo:
+            return _page_count_memo[digest]
+
+    try:
+        count = pdf_page_count(path) if suffix == '.pdf' else preview_renderer.page_count(path)
+    except Exception as e:
+        print(f"Error counting pages of {path.name}: {str(e)}")
+        return None
+
+    with _page_count_lock:
+        _page_count_memo[digest] = count
+        while len(_page_count_memo) > _PAGE_COUNT_MEMO_SIZE:
+            _page_count_memo.popitem(last=False)
+    return count
+
+
+class OCRText:
+    """The OCR text of one document, with the character offset where each page starts"""
+
+    def __init__(self, text, digest):
+        self.text = text
+        self.digest = digest
+        self.page_offsets = [0]
+        for match in re.finditer(PAGE_SEPARATOR, text):
+            self.page_offsets.append(match.end())
+
+    @property
+    def page_count(self):
+        return len(self.page_offsets)
+
+    def _page_bounds(self, number):
+        if number < 1 or number > self.page_count:
+            raise IndexError(f"No OCR page {number}")
+        start = self.page_offsets[number - 1]
+        end = self.page_offsets[number] - len(PAGE_SEPARATOR) if number < self.page_count else len(self.text)
+        return start, end
+
+    def page_length(self, number):
+        start, end = self._page_bounds(number)
+        return end - start
+
+    def page(self, number, offset=0, limit=None):
+        """Text of a 1-based page, or ``limit`` characters of it from ``offset`` (OCR without
+        form feeds is all one page)"""
+        start, end = self._page_bounds(number)
+        start = min(start + offset, end)
+        return self.text[start:end if limit is None else min(end, start + limit)]
+
+    def slice(self, offset, limit):
+        return self.text[offset:offset + limit]
+
+
+class OCRTextStore:
+    """Reads ``OCR_DIR/{order_id}_{stem}.txt`` files, keeping recently used ones in memory.
+
+    Paging through a long document re-reads nothing; an OCR file that changes
+    on disk (new size or mtime) is read again.
+    """
+
+    def __init__(self, ocr_dir, max_entries=32):
+        self.ocr_dir = ocr_dir
+        self.max_entries = max_entries
+        self._texts = OrderedDict()
+        self._lock = threading.Lock()
+
+    def path_for(self, order_id, document_path):
+        return self.ocr_dir / f"{order_id}_{document_path.stem}.txt"
+
+    def available(self, order_id, document_path):
+        return self.path_for(order_id, document_path).is_file()
+
+    def get(self, order_id, document_path):
+        """OCRText for a document, or None if it has no OCR output"""
+        path = self.path_for(order_id, document_path)
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            return None
+        key = (str(path), stat.st_size, stat.st_mtime_ns)
+
+        with self._lock:
+            text = self._texts.get(key)
+            if text is not None:
+                self._texts.move_to_end(key)
+                return text
+
+        with open(path, 'r', encoding='utf-8') as f:
+            text = OCRText(f.read(), file_digest(path))
+        with self._lock:
+            self._texts[key] = text
+            while len(self._texts) > self.max_entries:
+                self._texts.popitem(last=False)
+        return text
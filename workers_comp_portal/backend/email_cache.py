@@ -0,0 +1,169 @@
+"""Parsed .eml documents (headers, text body, attachments) cached by file content."""
+import hashlib
+import threading
+from email import policy
+from email.parser import BytesFeedParser
+
+from caches import DiskCache
+from fingerprints import file_digest, json_digest
+
+# Bump when the parsing changes so old cached parses are not served
+PARSE_VERSION = 1
+
+HEADER_NAMES = ("from", "to", "cc", "subject", "date")
+
+# Attachment types safe to show inline in the browser; anything else is served as a download
+INLINE_CONTENT_TYPES = ("application/pdf", "image/png", "image/jpeg", "image/gif", "image/bmp",
+                        "image/tiff", "text/plain")
+
+
+class AttachmentNotFoundError(Exception):
+    """Raised when asking for an attachment index an email doesn't have"""
+
+
+def _html_to_text(html):
+    from bs4 import BeautifulSoup
+    return BeautifulSoup(html, 'html.parser').get_text()
+
+
+def _part_text(part):
+    try:
+        content = part.get_content()
+    except (LookupError, ValueError):
+        # Unknown or broken charset: fall back to a lossy decode
+        content = (part.get_payload(decode=True) or b"").decode('utf-8', errors='replace')
+    if part.get_content_type() == "text/html":
+        return _html_to_text(content)
+    return content
+
+
+def parse_email(path, chunk_size=64 * 1024):
+    """(parsed summary, [attachment bytes]) for an .eml file
+
+    The message is fed to the parser in chunks rather than read in one go.
+    The summary is JSON-serializable: headers, plain-text body and an
+    attachment manifest (index, filename, content type, size, SHA-256).
+    """
+    parser = BytesFeedParser(policy=policy.default)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            parser.feed(chunk)
+    msg = parser.close()
+
+    body = msg.get_body(preferencelist=('plain', 'html'))
+    text = _part_text(body) if body is not None else ""
+
+    attachments, contents = [], []
+    for part in msg.walk():
+        if part.is_multipart() or part is body:
+            continue
+        filename = part.get_filename()
+        if not filename and part.get_content_disposition() != "attachment":
+            continue
+        data = part.get_payload(decode=True) or b""
+        attachments.append({
+            "index": len(attachments),
+            "filename": filename or f"attachment-{len(attachments) + 1}",
+            "content_type": part.get_content_type(),
+            "size": len(data),
+            "sha256": hashlib.sha256(data).hexdigest(),
+        })
+        contents.append(data)
+
+    parsed = {
+        "headers": {name: str(msg.get(name, '')) for name in HEADER_NAMES},
+        "text": text,
+        "attachments": attachments,
+    }
+    return parsed, contents
+
+
+def format_email(parsed):
+    """Plain-text rendering of a parsed email for the document preview"""
+    headers = parsed["headers"]
+    lines = [
+        f"From: {headers.get('from', '')}",
+        f"To: {headers.get('to', '')}",
+    ]
+    if headers.get("cc"):
+        lines.append(f"Cc: {headers['cc']}")
+    lines += [
+        f"Subject: {headers.get('subject', '')}",
+        f"Date: {headers.get('date', '')}",
+        "",
+        "Body:",
+        parsed["text"],
+    ]
+    if parsed["attachments"]:
+        lines += ["", "Attachments:"]
+        lines += [f"  {a['filename']} ({a['content_type']}, {a['size']} bytes)" for a in parsed["attachments"]]
+    return "\n".join(lines)
+
+
+class EmailCache:
+    """Parses each .eml document once and keeps the result on disk.
+
+    Parses are keyed by the file's content hash, so an unchanged email is
+    never parsed again and an edited one is. Attachment bytes are stored
+    separately (keyed by their own hash), so one attachment can be served
+    without touching the message; if it was evicted the message is parsed
+    again to restore it. Concurrent requests for the same email share one
+    parse.
+    """
+
+    def __init__(self, directory, max_bytes=256 * 1024 * 1024):
+        self.messages = DiskCache(directory / "messages", max_bytes=max_bytes // 4)
+        self.attachments = DiskCache(directory / "attachments", max_bytes=max_bytes, binary=True)
+        self._parse_locks = {}
+        self._lock = threading.Lock()
+        self.parses = 0
+
+    def key_for(self, path):
+        return json_digest({"document": file_digest(path), "version": PARSE_VERSION})
+
+    def get(self, path):
+        """Parsed summary of an .eml file (see ``parse_email``), parsing it if it isn't cached"""
+        key = self.key_for(path)
+        parsed = self.messages.get(key)
+        if parsed is not None:
+            return parsed
+
+        with self._lock:
+            parse_lock = self._parse_locks.setdefault(key, threading.Lock())
+        with parse_lock:
+            # Someone else may have parsed it while we waited
+            parsed = self.messages.get(key) if key in self.messages else None
+            if parsed is None:
+                parsed, _ = self._parse(path, key)
+        with self._lock:
+            self._parse_locks.pop(key, None)
+        return parsed
+
+    def _parse(self, path, key):
+        parsed, contents = parse_email(path)
+        for attachment, data in zip(parsed["attachments"], contents):
+            if attachment["sha256"] not in self.attachments:
+                self.attachments.set(attachment["sha256"], data)
+        self.messages.set(key, parsed)
+        with self._lock:
+            self.parses += 1
+        return parsed, contents
+
+    def attachment(self, path, index):
+        """(manifest entry, bytes) for one attachment of an .eml file"""
+        parsed = self.get(path)
+        if index < 0 or index >= len(parsed["attachments"]):
+            raise AttachmentNotFoundError(f"{path.name} has no attachment {index}")
+        attachment = parsed["attachments"][index]
+        data = self.attachments.get(attachment["sha256"])
+        if data is None:
+            _, contents = self._parse(path, self.key_for(path))
+            data = contents[index]
+        return attachment, data
+
+    def stats(self):
+        stats = self.messages.stats()
+        stats["attachments"] = self.attachments.stats()
+        with self._lock:
+            stats["parses"] = self.parses
+        return stats
@@ -0,0 +1,165 @@
+"""Order lifecycle events pushed to browsers over Server-Sent Events."""
+import datetime
+import json
+import queue
+import threading
+import time
+from collections import deque
+
+# Event types published by the app
+PROCESSING_QUEUED = "processing.queued"
+PROCESSING_STARTED = "processing.started"
+PROCESSING_FINISHED = "processing.finished"
+PROCESSING_FAILED = "processing.failed"
+ORDER_UPDATED = "order.updated"
+ORDER_APPROVED = "order.approved"
+ORDER_PACKAGED = "order.packaged"
+PROVIDER_SELECTED = "order.provider_selected"
+
+# Sent instead of events a client missed; it should reload what it shows
+RESYNC = "resync"
+
+
+class TooManySubscribersError(Exception):
+    """Raised when the broker already has its maximum number of open streams"""
+
+
+class Subscription:
+    """One open stream: a bounded queue of events waiting to be sent"""
+
+    def __init__(self, max_pending):
+        self.events = queue.Queue(maxsize=max_pending)
+        self.overflowed = False
+
+
+class EventBroker:
+    """Fans events out to every open stream.
+
+    Each stream has a bounded queue. A client that falls behind (full queue)
+    doesn't hold anything up: its backlog is dropped and it gets a single
+    ``resync`` event instead. The last ``history`` events are kept so a
+    reconnecting client (``Last-Event-ID``) is sent what it missed, or a
+    ``resync`` if that is too far back. Streams send a comment line every
+    ``heartbeat`` seconds so proxies keep them open, and end after
+    ``max_stream_seconds`` so worker threads are recycled; browsers reconnect
+    automatically.
+
+    With a threaded server every open stream occupies a thread for its whole
+    life, so ``max_subscribers`` must stay below the server's thread count
+    (app.py derives it from WEB_THREADS); past it ``subscribe`` raises
+    TooManySubscribersError.
+    """
+
+    def __init__(self, history=1000, max_pending=200, max_subscribers=200, heartbeat=15,
+                 max_stream_seconds=1800, retry_ms=3000):
+        self.max_pending = max_pending
+        self.max_subscribers = max_subscribers
+        self.heartbeat = heartbeat
+        self.max_stream_seconds = max_stream_seconds
+        self.retry_ms = retry_ms
+        self._history = deque(maxlen=history)
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._last_id = 0
+        self.published = 0
+        self.overflows = 0
+
+    def publish(self, event_type, order_id=None, **data):
+        """Send an event to every open stream; returns the event"""
+        with self._lock:
+            self._last_id += 1
+            event = {
+                "id": self._last_id,
+                "type": event_type,
+                "order_id": order_id,
+                "time": str(datetime.datetime.now()),
+            }
+            event.update(data)
+            self._history.append(event)
+            self.published += 1
+            subscribers = list(self._subscribers)
+
+        for subscription in subscribers:
+            self._deliver(subscription, event)
+        return event
+
+    def _deliver(self, subscription, event):
+        if subscription.overflowed:
+            return
+        try:
+            subscription.events.put_nowait(event)
+        except queue.Full:
+            # Slow client: drop its backlog and tell it to reload instead
+            subscription.overflowed = True
+            with self._lock:
+                self.overflows += 1
+            while True:
+                try:
+                    subscription.events.get_nowait()
+                except queue.Empty:
+                    break
+
+    def subscribe(self, last_event_id=None):
+        """Open a stream, queueing any events missed since ``last_event_id``"""
+        subscription = Subscription(self.max_pending)
+        with self._lock:
+            if len(self._subscribers) >= self.max_subscribers:
+                raise TooManySubscribersError("Too many open event streams")
+            self._subscribers.add(subscription)
+            if last_event_id is not None:
+                missed = [event for event in self._history if event["id"] > last_event_id]
+                oldest = self._history[0]["id"] if self._history else self._last_id + 1
+                if last_event_id < oldest - 1 or len(missed) > self.max_pending:
+                    subscription.overflowed = True
+                else:
+                    for event in missed:
+                        subscription.events.put_nowait(event)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def stream(self, subscription, clock=None):
+        """SSE-formatted chunks for one subscription, until the client goes away or the stream times out"""
+        clock = clock or time.monotonic
+        deadline = clock() + self.max_stream_seconds
+        try:
+            yield f"retry: {self.retry_ms}\n\n"
+            while clock() < deadline:
+                if subscription.overflowed:
+                    subscription.overflowed = False
+                    with self._lock:
+                        last_id = self._last_id
+                    yield format_event({"id": last_id, "type": RESYNC})
+                    continue
+                try:
+                    event = subscription.events.get(timeout=self.heartbeat)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+                    continue
+                yield format_event(event)
+        finally:
+            self.unsubscribe(subscription)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "subscribers": len(self._subscribers),
+                "published": self.published,
+                "last_event_id": self._last_id,
+                "overflows": self.overflows,
+            }
+
+
+def format_event(event):
+    """One event in SSE wire format"""
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+
+def parse_last_event_id(value):
+    """Last-Event-ID header (or query value) as an int, or None"""
+    try:
+        return int(value) if value not in (None, "") else None
+    except ValueError:
+        return None
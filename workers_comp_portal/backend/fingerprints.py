@@ -0,0 +1,58 @@
+"""Content hashes for files and JSON payloads."""
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+CHUNK_SIZE = 1024 * 1024
+
+_digest_memo = OrderedDict()
+_digest_memo_lock = threading.Lock()
+_DIGEST_MEMO_SIZE = 4096
+
+# Partial uploads and editor/sync temp files
+PARTIAL_FILE_SUFFIXES = ('.tmp', '.part', '.crdownload')
+
+
+def is_document_name(name):
+    """Whether a file in an order folder is a document, not a hidden, sync or half-uploaded file"""
+    return not name.startswith('.') and not name.endswith(PARTIAL_FILE_SUFFIXES)
+
+
+def order_documents(order_folder):
+    """The document files in an order folder, in name order; what gets OCR'd and fingerprinted"""
+    return sorted((path for path in order_folder.glob("*") if path.is_file() and is_document_name(path.name)),
+                  key=lambda p: p.name)
+
+
+def file_digest(path):
+    """SHA-256 of a file's contents.
+
+    Results are remembered by (path, size, mtime) so a file that hasn't changed
+    is only read once per process.
+    """
+    stat = path.stat()
+    memo_key = (str(path), stat.st_size, stat.st_mtime_ns)
+    with _digest_memo_lock:
+        digest = _digest_memo.get(memo_key)
+        if digest is not None:
+            _digest_memo.move_to_end(memo_key)
+            return digest
+
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            sha.update(chunk)
+    digest = sha.hexdigest()
+
+    with _digest_memo_lock:
+        _digest_memo[memo_key] = digest
+        while len(_digest_memo) > _DIGEST_MEMO_SIZE:
+            _digest_memo.popitem(last=False)
+    return digest
+
+
+def json_digest(value):
+    """SHA-256 of a JSON-serializable value, independent of key order and whitespace"""
+    payload = json.dumps(value, sort_keys=True, separators=(',', ':'), ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
@@ -0,0 +1,63 @@
+"""gunicorn settings: gunicorn -c gunicorn.conf.py wsgi:application
+
+The app is loaded once in the master (preload_app) and workers are forked
+from it, so the order index, provider index and provider data are shared
+copy-on-write instead of being loaded again in every worker. Each worker
+then starts its own background threads (see post_worker_init).
+
+Processing jobs, batch runs and the event stream live in the worker that
+started them. With more than one worker, put a load balancer with sticky
+sessions in front, or keep WEB_CONCURRENCY=1 and scale with WEB_THREADS (raising
+WEB_THREADS also raises the event stream limit, see app.py).
+"""
+import gc
+import os
+
+bind = os.environ.get('WEB_BIND', f"{os.environ.get('WEB_HOST', '127.0.0.1')}:{os.environ.get('PORT', 5003)}")
+workers = int(os.environ.get('WEB_CONCURRENCY', 1))
+# Threads per worker. Every open /api/events stream holds one, so app.py caps streams at
+# EVENT_STREAM_MAX_CLIENTS (default WEB_THREADS // 2); keep the same default (32) as app.py
+worker_class = 'gthread'
+threads = int(os.environ.get('WEB_THREADS', 32))
+timeout = int(os.environ.get('WEB_TIMEOUT', 120))
+graceful_timeout = 30
+keepalive = 5
+# Recycle workers after this many requests (0 = never); forks from the preloaded master are cheap
+max_requests = int(os.environ.get('WEB_MAX_REQUESTS', 0))
+max_requests_jitter = max_requests // 10
+preload_app = True
+
+accesslog = os.environ.get('WEB_ACCESS_LOG', '-')
+errorlog = '-'
+
+
+def when_ready(server):
+    # Move everything loaded so far out of the collector's reach: otherwise the first
+    # collection in each worker touches every object and un-shares the pages
+    gc.collect()
+    gc.freeze()
+
+
+def _acquire_watcher_lock(path):
+    """Try to become the worker that watches INPUT_DIR; the lock is held until the process exits"""
+    import fcntl
+    path.parent.mkdir(parents=True, exist_ok=True)
+    handle = open(path, 'a')
+    try:
+        fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        handle.close()
+        return None
+    return handle
+
+
+def post_worker_init(worker):
+    import app as portal
+
+    watch = False
+    if portal.WATCH_ORDERS:
+        # A replacement for a worker that died takes the lock over when it starts
+        worker.watcher_lock = _acquire_watcher_lock(portal.OUTPUT_DIR / '.watcher.lock')
+        watch = worker.watcher_lock is not None
+    portal.start_background_services(watch=watch)
+    worker.log.info("Worker %s ready%s", worker.pid, " (watching for new orders)" if watch else "")
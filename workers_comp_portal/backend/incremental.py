@@ -0,0 +1,99 @@
+"""Stage fingerprints and edit-preserving merges for reprocessing an order."""
+import copy
+import datetime
+
+# Pipeline stages in order. The first four have a fingerprint (a hash of the stage's output) saved with
+# the results; a reprocess compares llm_request and llm_response to stop early, and the documents and ocr
+# fingerprints only record what the request was built from. save_results (extraction, geocoding and
+# provider mapping, all in the process module) runs as one step whenever the model's answer changed.
+STAGES = ("documents", "ocr", "llm_request", "llm_response", "save_results")
+
+# Statuses a reviewer set; they only survive a reprocess that leaves the extracted data as it was
+REVIEWED_STATUSES = ("Approved", "Ready for CRM")
+
+# Results fields written by the review workflow rather than by save_results
+REVIEW_FIELDS = ("status", "approved_date", "crm_ready_date")
+
+
+def pipeline_info(results):
+    """The ``pipeline`` block saved with an order's results ({} for results saved before it existed)"""
+    return (results or {}).get("pipeline") or {}
+
+
+def merge_fields(base, ours, theirs, path=""):
+    """Three-way merge of extracted data: ``base`` is what the model extracted last time,
+    ``ours`` the stored (possibly hand-edited) data and ``theirs`` the new extraction.
+
+    A field someone edited (ours differs from base) keeps the edit; any other
+    field takes the new value. Dicts are merged key by key; anything else
+    (values, lists such as procedures) is compared as a whole. Returns
+    (merged, [paths where both the edit and the new extraction changed]).
+    """
+    if isinstance(base, dict) and isinstance(ours, dict) and isinstance(theirs, dict):
+        merged, conflicts = {}, []
+        for key in list(theirs) + [key for key in ours if key not in theirs]:
+            value, key_conflicts = merge_fields(base.get(key), ours.get(key), theirs.get(key),
+                                                f"{path}.{key}" if path else key)
+            if value is not None or key in theirs:
+                merged[key] = value
+            conflicts.extend(key_conflicts)
+        return merged, conflicts
+
+    if ours == base:
+        return copy.deepcopy(theirs), []
+    # Edited by hand: the edit wins, even if the model now says something else
+    conflicts = [path] if theirs != base and theirs != ours else []
+    return copy.deepcopy(ours), conflicts
+
+
+def merge_reprocessed(previous, results):
+    """Fold an order's previous results into freshly saved ones, keeping manual work.
+
+    - Edited extracted fields are kept (three-way merge against the last
+      extraction, see ``merge_fields``). Results saved before extractions
+      were recorded keep all their edits if they have any.
+    - Fields save_results doesn't write (selected provider, edit and review
+      dates, ...) are carried over.
+    - A reviewed status (Approved, Ready for CRM) is kept only if the
+      extracted data came out unchanged; otherwise the order goes back for
+      review and the old status is noted in ``pipeline.review_reset``.
+
+    Returns (merged results, conflicts). ``results`` itself is not modified.
+    """
+    merged = copy.deepcopy(results)
+    info = dict(pipeline_info(results))
+    new_extracted = results.get("extracted_data")
+    info["extracted_baseline"] = copy.deepcopy(new_extracted)
+    conflicts = []
+
+    if previous is not None:
+        previous_info = pipeline_info(previous)
+        old_extracted = previous.get("extracted_data")
+        if previous.get("last_edited") and old_extracted is not None:
+            baseline = previous_info.get("extracted_baseline")
+            if baseline is None:
+                merged["extracted_data"] = copy.deepcopy(old_extracted)
+            else:
+                merged["extracted_data"], conflicts = merge_fields(baseline, old_extracted, new_extracted)
+
+        for key, value in previous.items():
+            if key not in results and key != "pipeline":
+                merged[key] = copy.deepcopy(value)
+
+        if previous.get("status") in REVIEWED_STATUSES:
+            if merged.get("extracted_data") == old_extracted:
+                for key in REVIEW_FIELDS:
+                    if key in previous:
+                        merged[key] = previous[key]
+            else:
+                info["review_reset"] = {"previous_status": previous["status"],
+                                        "date": str(datetime.datetime.now())}
+                # Set explicitly: results saved without a status would otherwise have carried the old one over
+                status = results.get("status")
+                merged["status"] = status if status and status not in REVIEWED_STATUSES else "Processed"
+                for key in REVIEW_FIELDS[1:]:
+                    merged.pop(key, None)
+
+    info["merge_conflicts"] = conflicts
+    merged["pipeline"] = info
+    return merged, conflicts
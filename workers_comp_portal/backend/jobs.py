@@ -0,0 +1,214 @@
+"""Background job queue for order processing."""
+import datetime
+import itertools
+import queue
+import threading
+import uuid
+from collections import OrderedDict
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+ACTIVE_STATES = (QUEUED, RUNNING)
+
+# Lower runs first; jobs with the same priority run in submission order
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 10
+PRIORITY_LOW = 20
+
+
+class QueueFullError(Exception):
+    """Raised when the job queue has no room for another submission"""
+
+
+class Job:
+    """One processing request for one order"""
+
+    def __init__(self, order_id, options=None, priority=PRIORITY_NORMAL, source=None):
+        self.job_id = uuid.uuid4().hex
+        self.order_id = order_id
+        self.options = options or {}
+        self.priority = priority
+        self.source = source
+        self.status = QUEUED
+        self.submitted_at = str(datetime.datetime.now())
+        self.started_at = None
+        self.finished_at = None
+        self.error = None
+        self.result = None
+        self.timings = None
+        self.done = threading.Event()
+
+    def to_dict(self, include_result=False):
+        data = {
+            "job_id": self.job_id,
+            "order_id": self.order_id,
+            "status": self.status,
+            "priority": self.priority,
+            "source": self.source,
+            "submitted_at": self.submitted_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "error": self.error,
+        }
+        if self.timings is not None:
+            data["timings_ms"] = self.timings
+        if include_result:
+            data["result"] = self.result
+        return data
+
+
+class JobQueue:
+    """Bounded pool of worker threads that run ``runner(order_id, **options)``.
+
+    Queued jobs run lowest ``priority`` first, oldest first within a priority.
+    Submitting an order that already has a queued or running job returns that
+    job instead of creating a second one (moving a queued job up if the new
+    submission is more urgent). Work run elsewhere (a batch) is registered
+    with ``run_here`` so the same order is never processed twice at once.
+    Finished jobs are kept (up to ``keep_finished``) so clients can poll for
+    the outcome. With a ``profiler`` (a context manager factory yielding an
+    object with ``to_dict()``, e.g. ``Metrics.profile``), each job records its
+    stage timings.
+    """
+
+    def __init__(self, runner, max_workers=2, max_queued=200, keep_finished=500, profiler=None):
+        self.runner = runner
+        self.profiler = profiler
+        self.max_workers = max(1, max_workers)
+        self.keep_finished = keep_finished
+        self.max_queued = max_queued
+        self._queue = queue.PriorityQueue()
+        self._sequence = itertools.count()
+        self._queued = 0
+        self._jobs = OrderedDict()
+        self._active_by_order = {}
+        self._lock = threading.Lock()
+        self._workers = []
+
+    def _ensure_workers(self):
+        # Threads don't survive a fork, so a forked process starts its own
+        self._workers = [worker for worker in self._workers if worker.is_alive()]
+        for i in range(len(self._workers), self.max_workers):
+            worker = threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def submit(self, order_id, priority=PRIORITY_NORMAL, source=None, **options):
+        """Queue an order for processing; returns (job, created)"""
+        with self._lock:
+            active = self._active_by_order.get(order_id)
+            if active is not None:
+                if active.status == QUEUED and priority < active.priority:
+                    # Queue it again at the new priority; the stale entry is skipped when it comes up
+                    active.priority = priority
+                    self._queue.put((priority, next(self._sequence), active))
+                return active, False
+
+            if self._queued >= self.max_queued:
+                raise QueueFullError("Processing queue is full, try again later")
+
+            job = Job(order_id, options, priority=priority, source=source)
+            self._queue.put((priority, next(self._sequence), job))
+            self._queued += 1
+            self._jobs[job.job_id] = job
+            self._active_by_order[order_id] = job
+            self._trim()
+            self._ensure_workers()
+            return job, True
+
+    def run_here(self, order_id, work, source=None):
+        """Run ``work()`` for an order on the calling thread as a running job; returns (job, ran)
+
+        If the order already has a queued or running job, nothing runs and
+        that job is returned. While ``work`` runs, submitting the order
+        returns this job instead of queueing another.
+        """
+        with self._lock:
+            active = self._active_by_order.get(order_id)
+            if active is not None:
+                return active, False
+            job = Job(order_id, source=source)
+            job.status = RUNNING
+            self._jobs[job.job_id] = job
+            self._active_by_order[order_id] = job
+            self._trim()
+        self._run(job, work)
+        return job, True
+
+    def _trim(self):
+        """Forget the oldest finished jobs once we hold more than keep_finished"""
+        finished = [job_id for job_id, job in self._jobs.items() if job.status not in ACTIVE_STATES]
+        for job_id in finished[:max(0, len(finished) - self.keep_finished)]:
+            del self._jobs[job_id]
+
+    def _work(self):
+        while True:
+            priority, _, job = self._queue.get()
+            try:
+                with self._lock:
+                    if job.status != QUEUED or priority != job.priority:
+                        continue
+                    job.status = RUNNING
+                    self._queued -= 1
+                self._run(job)
+            finally:
+                self._queue.task_done()
+
+    def _run(self, job, work=None):
+        job.started_at = str(datetime.datetime.now())
+        if work is None:
+            def work():
+                return self.runner(job.order_id, **job.options)
+        try:
+            if self.profiler is None:
+                job.result = work()
+            else:
+                with self.profiler() as profile:
+                    try:
+                        job.result = work()
+                    finally:
+                        job.timings = profile.to_dict()
+            job.status = SUCCEEDED
+        except Exception as e:
+            print(f"Job {job.job_id} for order {job.order_id} failed: {str(e)}")
+            job.error = str(e)
+            job.status = FAILED
+        finally:
+            job.finished_at = str(datetime.datetime.now())
+            with self._lock:
+                if self._active_by_order.get(job.order_id) is job:
+                    del self._active_by_order[job.order_id]
+            job.done.set()
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def is_active(self, order_id):
+        """True if the order has a queued or running job"""
+        with self._lock:
+            return order_id in self._active_by_order
+
+    def latest_for_order(self, order_id):
+        """Most recently submitted job for an order, if we still remember one"""
+        with self._lock:
+            for job in reversed(self._jobs.values()):
+                if job.order_id == order_id:
+                    return job
+        return None
+
+    def list_jobs(self):
+        with self._lock:
+            return list(self._jobs.values())
+
+    def stats(self):
+        with self._lock:
+            counts = {QUEUED: 0, RUNNING: 0, SUCCEEDED: 0, FAILED: 0}
+            for job in self._jobs.values():
+                counts[job.status] += 1
+        counts["workers"] = self.max_workers
+        counts["max_queued"] = self.max_queued
+        return counts
@@ -0,0 +1,103 @@
+"""Persistent cache and in-flight deduplication for LLM extraction calls."""
+import threading
+
+from caches import DiskCache
+from fingerprints import json_digest
+
+# llm_client attributes that change what the model returns for the same request
+MODEL_SETTING_NAMES = ("MODEL", "MODEL_NAME", "LLM_MODEL", "TEMPERATURE", "MAX_TOKENS", "SYSTEM_PROMPT")
+
+
+def model_settings_from(module, extra=None):
+    """Collect the model settings a cached response depends on"""
+    settings = {name: getattr(module, name) for name in MODEL_SETTING_NAMES if hasattr(module, name)}
+    settings.update(extra or {})
+    return settings
+
+
+class _InFlight:
+    """A call that other threads with the same request can wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.response = None
+        self.error = None
+
+
+class LLMCache:
+    """Caches ``call_llm_api`` responses keyed by a normalized hash of request + model settings.
+
+    Identical requests made while one is already running wait for that call
+    instead of sending their own. ``bypass=True`` skips the cache lookup (the
+    fresh response still replaces the cached one).
+    """
+
+    def __init__(self, directory, ttl=7 * 24 * 3600, max_entries=5000, model_settings=None):
+        self.store = DiskCache(directory, max_entries=max_entries, ttl=ttl)
+        self.model_settings = model_settings or {}
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.upstream_calls = 0
+        self.coalesced = 0
+        self.bypassed = 0
+
+    def key_for(self, api_request):
+        return json_digest({"request": api_request, "model": self.model_settings})
+
+    def call(self, call_llm_api, api_request, bypass=False):
+        """Return the response for api_request, calling the model only when needed"""
+        key = self.key_for(api_request)
+
+        if bypass:
+            with self._lock:
+                self.bypassed += 1
+        else:
+            cached = self.store.get(key)
+            if cached is not None:
+                return cached["response"]
+
+        with self._lock:
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _InFlight()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.response
+
+        try:
+            # Another caller may have finished the same request between our lookup and now
+            cached = self.store.get(key) if not bypass and key in self.store else None
+            if cached is not None:
+                flight.response = cached["response"]
+                return flight.response
+
+            with self._lock:
+                self.upstream_calls += 1
+            flight.response = call_llm_api(api_request)
+            try:
+                self.store.set(key, {"response": flight.response})
+            except (TypeError, ValueError) as e:
+                print(f"LLM response not cacheable: {str(e)}")
+            return flight.response
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+            flight.done.set()
+
+    def stats(self):
+        stats = self.store.stats()
+        with self._lock:
+            stats["upstream_calls"] = self.upstream_calls
+            stats["coalesced"] = self.coalesced
+            stats["bypassed"] = self.bypassed
+            stats["in_flight"] = len(self._inflight)
+        return stats
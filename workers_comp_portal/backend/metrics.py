@@ -0,0 +1,248 @@
+"""In-process metrics (Prometheus text format) and per-request stage-timing profiles."""
+import functools
+import threading
+import time
+from contextlib import contextmanager
+
+# Seconds; covers fast cache hits through multi-minute OCR runs
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs.extend(f'{name}="{_escape(value)}"' for name, value in extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        with self._lock:
+            values = dict(self._values)
+        return self.header() + [f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}"
+                                for key, value in sorted(values.items())]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["counts"][i] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def render(self):
+        with self._lock:
+            values = {key: {"counts": list(series["counts"]), "sum": series["sum"], "count": series["count"]}
+                      for key, series in self._values.items()}
+        lines = self.header()
+        for key, series in sorted(values.items()):
+            for bound, count in zip(self.buckets, series["counts"]):
+                labels = _format_labels(self.label_names, key, [("le", _format_value(float(bound)))])
+                lines.append(f"{self.name}_bucket{labels} {count}")
+            labels = _format_labels(self.label_names, key, [("le", "+Inf")])
+            lines.append(f"{self.name}_bucket{labels} {series['count']}")
+            labels = _format_labels(self.label_names, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(round(series['sum'], 6))}")
+            lines.append(f"{self.name}_count{labels} {series['count']}")
+        return lines
+
+
+class Profile:
+    """Stage timings collected while one request or job runs"""
+
+    def __init__(self):
+        self.started = time.time()
+        self.timings = []
+
+    def add(self, name, seconds):
+        self.timings.append((name, seconds))
+
+    def total_seconds(self):
+        return time.time() - self.started
+
+    def to_dict(self):
+        """Total milliseconds per stage, in first-seen order, plus the overall time"""
+        totals = {}
+        for name, seconds in self.timings:
+            totals[name] = totals.get(name, 0.0) + seconds
+        result = {name: round(seconds * 1000, 2) for name, seconds in totals.items()}
+        result["total"] = round(self.total_seconds() * 1000, 2)
+        return result
+
+    def server_timing(self):
+        """Value for a Server-Timing response header (shows up in browser dev tools)"""
+        return ", ".join(f"{name};dur={ms}" for name, ms in self.to_dict().items())
+
+
+class Metrics:
+    """The app's metrics registry.
+
+    ``instrument``/``timed`` record a stage into the stage histogram, the
+    error counter and the in-flight gauge, and into the current thread's
+    profile if one is active (see ``profile``). Components that already keep
+    their own counters (caches, job queue, ...) are read at scrape time
+    through ``add_collector``.
+    """
+
+    def __init__(self, prefix="referral"):
+        self.prefix = prefix
+        self._metrics = []
+        self._collectors = []
+        self._local = threading.local()
+
+        self.stage_seconds = self.histogram("stage_duration_seconds", "Time spent in each processing stage", ["stage"])
+        self.stage_errors = self.counter("stage_errors_total", "Processing stage calls that raised", ["stage"])
+        self.stage_in_flight = self.gauge("stage_in_flight", "Processing stage calls currently running", ["stage"])
+        self.request_seconds = self.histogram("http_request_duration_seconds", "HTTP request latency",
+                                              ["method", "route", "status"])
+        self.requests_in_flight = self.gauge("http_requests_in_flight", "HTTP requests currently being handled")
+
+    def _add(self, metric):
+        metric.name = f"{self.prefix}_{metric.name}"
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text, labels=()):
+        return self._add(Counter(name, help_text, labels))
+
+    def gauge(self, name, help_text, labels=()):
+        return self._add(Gauge(name, help_text, labels))
+
+    def histogram(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._add(Histogram(name, help_text, labels, buckets))
+
+    def add_collector(self, collect):
+        """``collect()`` returns (name, kind, help, {labels tuple: value}) tuples at scrape time"""
+        self._collectors.append(collect)
+
+    # Timing
+
+    @contextmanager
+    def timed(self, stage):
+        self.stage_in_flight.inc(stage=stage)
+        start = time.time()
+        try:
+            yield
+        except Exception:
+            self.stage_errors.inc(stage=stage)
+            raise
+        finally:
+            seconds = time.time() - start
+            self.stage_in_flight.dec(stage=stage)
+            self.stage_seconds.observe(seconds, stage=stage)
+            profile = getattr(self._local, "profile", None)
+            if profile is not None:
+                profile.add(stage, seconds)
+
+    def instrument(self, stage, fn):
+        """Wrap a function so every call is timed as ``stage``"""
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with self.timed(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+
+    # Profiles
+
+    def start_profile(self):
+        profile = self._local.profile = Profile()
+        return profile
+
+    def end_profile(self):
+        profile = getattr(self._local, "profile", None)
+        self._local.profile = None
+        return profile
+
+    @contextmanager
+    def profile(self):
+        """Collect the stage timings of everything this thread runs inside the block"""
+        profile = self.start_profile()
+        try:
+            yield profile
+        finally:
+            self.end_profile()
+
+    # Exposition
+
+    def render(self):
+        """All metrics in Prometheus text exposition format"""
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collect in self._collectors:
+            try:
+                samples = collect()
+            except Exception as e:
+                print(f"Error collecting metrics: {str(e)}")
+                continue
+            for name, kind, help_text, values in samples:
+                name = f"{self.prefix}_{name}"
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in values.items():
+                    if value is None:
+                        continue
+                    label_text = "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}" if labels else ""
+                    lines.append(f"{name}{label_text} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
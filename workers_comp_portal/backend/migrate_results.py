@@ -0,0 +1,39 @@
+"""Import existing {order_id}_results.json files into the SQLite results store.
+
+Run once before switching RESULTS_BACKEND to sqlite, and again at any time to
+pick up results written since (orders already imported unchanged are skipped):
+
+    python migrate_results.py --results-dir <OUTPUT_DIR> --database <RESULTS_DB>
+"""
+import argparse
+import time
+from pathlib import Path
+
+from config import OUTPUT_DIR, RESULTS_DB
+from results_store import JSONResultsStore, SQLiteResultsStore, import_json_results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import JSON order results into SQLite")
+    parser.add_argument("--results-dir", help="Folder with {order_id}_results.json files (default: the app's OUTPUT_DIR)")
+    parser.add_argument("--database", help="SQLite file to import into (default: RESULTS_DB or OUTPUT_DIR/results.sqlite3)")
+    parser.add_argument("--overwrite", action="store_true",
+                        help="Replace orders already in the database whose results differ")
+    args = parser.parse_args(argv)
+
+    # Same paths as the web app
+    results_dir = Path(args.results_dir or OUTPUT_DIR)
+    database = Path(args.database or RESULTS_DB)
+
+    print(f"Importing results from {results_dir} into {database}")
+    start = time.time()
+    counts = import_json_results(JSONResultsStore(results_dir), SQLiteResultsStore(database),
+                                 overwrite=args.overwrite)
+    print(f"Done in {time.time() - start:.2f}s: {counts['imported']} imported, "
+          f"{counts['unchanged']} unchanged, {counts['skipped']} skipped (differ; use --overwrite), "
+          f"{counts['failed']} failed")
+    return 0 if counts["failed"] == 0 else 1
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
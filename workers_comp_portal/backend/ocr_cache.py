@@ -0,0 +1,79 @@
+"""Content-addressed cache of OCR output so unchanged documents are never OCR'd twice."""
+import threading
+
+from caches import DiskCache
+from fingerprints import file_digest, json_digest, order_documents
+
+
+def document_fingerprints(order_folder):
+    """(file name, SHA-256) for every document in an order folder, in name order"""
+    return [(path.name, file_digest(path)) for path in order_documents(order_folder)]
+
+
+class OCRCache:
+    """Caches the output of ``process_order_folder`` keyed by document content.
+
+    The key combines the order ID with the content hash of each document, so
+    the cached OCR output is reused exactly when every file in the folder is
+    byte-for-byte what was OCR'd before. Editing extracted fields or changing
+    the LLM prompt doesn't touch the documents, so reprocessing skips OCR.
+    """
+
+    def __init__(self, directory, max_bytes=1024 * 1024 * 1024):
+        self.store = DiskCache(directory, max_bytes=max_bytes)
+        self._lock = threading.Lock()
+        self.documents_skipped = 0
+        self.documents_ocred = 0
+
+    def key_for(self, order_id, order_folder):
+        """Cache key plus the per-document fingerprints it was built from"""
+        fingerprints = document_fingerprints(order_folder)
+        return json_digest({"order_id": order_id, "documents": fingerprints}), fingerprints
+
+    def get(self, key, fingerprints):
+        """Cached order data for key, or None"""
+        entry = self.store.get(key)
+        if entry is None:
+            return None
+        with self._lock:
+            self.documents_skipped += len(fingerprints)
+        return entry["order_data"]
+
+    def put(self, key, fingerprints, order_data):
+        try:
+            self.store.set(key, {"documents": fingerprints, "order_data": order_data})
+        except (TypeError, ValueError) as e:
+            print(f"OCR result not cacheable: {str(e)}")
+
+    def record_ocred(self, count):
+        """Count documents that were really sent to OCR (called by the OCR runner, see parallel_ocr.py),
+        as opposed to cache hits stored again with the order's output"""
+        with self._lock:
+            self.documents_ocred += count
+
+    # Per-document entries (see parallel_ocr.py), so one changed document doesn't re-OCR the rest
+
+    def document_key(self, order_id, path):
+        return json_digest({"order_id": order_id, "document": path.name, "sha256": file_digest(path)})
+
+    def get_document(self, order_id, path):
+        """Cached OCR output for a single document, or None"""
+        entry = self.store.get(self.document_key(order_id, path))
+        if entry is None:
+            return None
+        with self._lock:
+            self.documents_skipped += 1
+        return entry["order_data"]
+
+    def put_document(self, order_id, path, order_data):
+        try:
+            self.store.set(self.document_key(order_id, path), {"order_data": order_data})
+        except (TypeError, ValueError) as e:
+            print(f"OCR result for {path.name} not cacheable: {str(e)}")
+
+    def stats(self):
+        stats = self.store.stats()
+        with self._lock:
+            stats["documents_skipped"] = self.documents_skipped
+            stats["documents_ocred"] = self.documents_ocred
+        return stats
@@ -0,0 +1,415 @@
+"""In-memory index of orders so list views don't rescan INPUT_DIR on every request."""
+import base64
+import bisect
+import datetime
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+INDEX_FILENAME = ".order_index.json"
+INDEX_VERSION = 2
+
+# Entry fields list queries can sort on
+SORT_FIELDS = ("order_id", "processed_date", "approved_date")
+
+
+def extract_patient_name(result):
+    """Pull the patient name out of a results dict, or None if it isn't there"""
+    extracted = result.get("extracted_data") or {}
+    patient_data = extracted.get("patient_name")
+    if isinstance(patient_data, dict) and "value" in patient_data:
+        return patient_data["value"]
+    return None
+
+
+def extract_cpt_codes(result):
+    """CPT codes of an order's procedures, in order, without duplicates"""
+    codes = []
+    extracted = result.get("extracted_data") or {}
+    for procedure in extracted.get("procedures") or []:
+        cpt = procedure.get("cpt_code") if isinstance(procedure, dict) else None
+        value = cpt.get("value") if isinstance(cpt, dict) else cpt
+        if value and value not in ("not found", "null"):
+            codes.append(str(value).strip())
+
+    # Fall back to the codes the provider mapping step used
+    if not codes:
+        mapping = result.get("provider_mapping") or {}
+        for proc_mapping in mapping.get("procedures") or []:
+            if proc_mapping.get("cpt_code"):
+                codes.append(str(proc_mapping["cpt_code"]).strip())
+    return list(dict.fromkeys(codes))
+
+
+def extract_location(result):
+    """(latitude, longitude, display name) from the geocode step, or None"""
+    geocode_data = (result.get("mapping_data") or {}).get("geocode_data") or {}
+    latitude = geocode_data.get("latitude")
+    longitude = geocode_data.get("longitude")
+    if not latitude or not longitude:
+        return None
+    return latitude, longitude, geocode_data.get("display_name")
+
+
+def summarize_result(order_id, result, result_version):
+    """Build an index entry from a loaded results dict"""
+    return {
+        "order_id": order_id,
+        "status": result.get("status", "Processed"),
+        "patient_name": extract_patient_name(result),
+        "processed_date": result.get("processed_date"),
+        "approved_date": result.get("approved_date"),
+        "result_version": result_version,
+    }
+
+
+def pending_entry(order_id):
+    """Index entry for an order folder that has no results file yet"""
+    return {
+        "order_id": order_id,
+        "status": "Pending",
+        "patient_name": None,
+        "processed_date": None,
+        "approved_date": None,
+        "result_version": None,
+    }
+
+
+class OrderIndex:
+    """Keeps one summary entry per order folder, refreshed incrementally.
+
+    Results come from a results store (see results_store.py), which reports a
+    cheap version token per order. The index is persisted next to the results
+    so a restart only reloads orders whose version changed since the last run.
+    A background thread rescans every ``refresh_interval`` seconds; the store
+    calls ``refresh_order`` after each write so changes show up immediately.
+    An optional ``stats`` object (see stats.py) is told about every entry
+    change and saved in the same file.
+
+    Changes only mark the index dirty; the background thread writes it out at
+    most every ``persist_interval`` seconds (and ``flush()`` does so on
+    demand), so a burst of saves costs one write of the index, not one each.
+    Anything not yet written is picked up from the result versions on restart.
+    """
+
+    def __init__(self, input_dir, results_store, index_path, refresh_interval=30, stats=None,
+                 persist_interval=5):
+        self.input_dir = Path(input_dir)
+        self.results_store = results_store
+        self.index_path = Path(index_path)
+        self.stats = stats
+        self.refresh_interval = refresh_interval
+        self.persist_interval = persist_interval
+        self._dirty = False
+        self._persist_lock = threading.Lock()
+        self._orders = {}
+        self._sorted = {}
+        self._lock = threading.RLock()
+        self._built = False
+        self._refresher = None
+        self._stop = threading.Event()
+
+    # Loading and persistence
+
+    def _load_persisted(self):
+        if not self.index_path.exists():
+            return
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get("version") == INDEX_VERSION:
+                self._orders = data.get("orders", {})
+                if self.stats is not None:
+                    self.stats.load(data.get("stats"))
+                    if "stats" not in data:
+                        for entry in self._orders.values():
+                            self.stats.entry_changed(None, entry)
+        except Exception as e:
+            print(f"Error reading order index, rebuilding: {str(e)}")
+            self._orders = {}
+            if self.stats is not None:
+                self.stats.load(None)
+
+    def mark_dirty(self):
+        """Note a change to persist with the next flush (entries or the stats saved with them)"""
+        self._dirty = True
+
+    def flush(self):
+        """Write the index file if anything changed since the last write; returns True if it wrote"""
+        with self._persist_lock:
+            with self._lock:
+                if not self._dirty:
+                    return False
+                self._dirty = False
+                # Entries are replaced, never changed in place, so a shallow copy is a consistent snapshot
+                data = {"version": INDEX_VERSION, "orders": dict(self._orders)}
+                if self.stats is not None:
+                    data["stats"] = self.stats.to_dict()
+            try:
+                self.index_path.parent.mkdir(parents=True, exist_ok=True)
+                tmp_path = self.index_path.with_name(f"{self.index_path.name}.{os.getpid()}.tmp")
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(data, f)
+                os.replace(tmp_path, self.index_path)
+                return True
+            except Exception as e:
+                print(f"Error saving order index: {str(e)}")
+                self._dirty = True
+                return False
+
+    def _load_entry(self, order_id, result_version):
+        """Summarize one order's stored results"""
+        try:
+            entry = pending_entry(order_id)
+            entry.update(self.results_store.summary(order_id))
+            entry["result_version"] = result_version
+            return entry
+        except Exception as e:
+            print(f"Error reading result file: {str(e)}")
+            entry = pending_entry(order_id)
+            entry["status"] = "Processed"
+            entry["result_version"] = result_version
+            return entry
+
+    def _set_entry(self, order_id, entry):
+        """Replace (or with None, remove) an entry and update the stats; returns the old entry"""
+        if entry is None:
+            old = self._orders.pop(order_id, None)
+        else:
+            old = self._orders.get(order_id)
+            self._orders[order_id] = entry
+        if self.stats is not None and (old is not None or entry is not None):
+            received_on = self._received_day(order_id) if old is None and entry is not None else None
+            self.stats.entry_changed(old, entry, received_on=received_on)
+        return old
+
+    def _received_day(self, order_id):
+        """Day an order folder arrived, from its modification time (also for folders that came in
+        while the app was down)"""
+        try:
+            mtime = os.stat(self.input_dir / order_id).st_mtime
+        except OSError:
+            return None
+        return datetime.date.fromtimestamp(mtime).isoformat()
+
+    # Scanning
+
+    def _scan_folders(self):
+        """Names of all order folders under INPUT_DIR"""
+        if not self.input_dir.exists():
+            return set()
+        with os.scandir(self.input_dir) as entries:
+            return {entry.name for entry in entries if entry.is_dir()}
+
+    def refresh(self):
+        """Bring the index in line with the filesystem, reloading only changed results"""
+        folders = self._scan_folders()
+        result_versions = self.results_store.versions()
+        changed = False
+
+        with self._lock:
+            for order_id in list(self._orders):
+                if order_id not in folders:
+                    self._set_entry(order_id, None)
+                    changed = True
+
+            for order_id in folders:
+                current = self._orders.get(order_id)
+                version = result_versions.get(order_id)
+                if version is None:
+                    if current is None or current["result_version"] is not None:
+                        self._set_entry(order_id, pending_entry(order_id))
+                        changed = True
+                elif current is None or current["result_version"] != version:
+                    self._set_entry(order_id, self._load_entry(order_id, version))
+                    changed = True
+
+            if changed:
+                self._sorted = {}
+                self.mark_dirty()
+        return changed
+
+    def refresh_order(self, order_id):
+        """Re-read a single order after it was written"""
+        with self._lock:
+            if not (self.input_dir / order_id).is_dir():
+                if self._set_entry(order_id, None) is not None:
+                    self._sorted = {}
+                    self.mark_dirty()
+                return None
+
+            version = self.results_store.version(order_id)
+            current = self._orders.get(order_id)
+            if current is not None and version is not None and current["result_version"] == version:
+                return dict(current)
+            if version is not None:
+                entry = self._load_entry(order_id, version)
+            else:
+                entry = pending_entry(order_id)
+            if self._set_entry(order_id, entry) != entry:
+                self._sorted = {}
+                self.mark_dirty()
+            return dict(entry)
+
+    @property
+    def ready(self):
+        return self._built
+
+    def build(self, start_refresh=True):
+        """Load the persisted index, catch up with the filesystem and start refreshing"""
+        with self._lock:
+            if self._built:
+                return
+            start = time.time()
+            self._load_persisted()
+            self.refresh()
+            self._built = True
+            self.flush()
+            print(f"Order index ready: {len(self._orders)} orders in {time.time() - start:.2f}s")
+        if start_refresh:
+            self.start()
+
+    def ensure_built(self):
+        if not self._built:
+            self.build()
+
+    # Background refresh
+
+    def start(self):
+        """Start the refresh and persist thread (again, in a process forked after it was started)"""
+        if (self.refresh_interval <= 0 and self.persist_interval <= 0) or \
+                (self._refresher is not None and self._refresher.is_alive()):
+            return
+        self._refresher = threading.Thread(target=self._refresh_loop, name="order-index-refresh", daemon=True)
+        self._refresher.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _refresh_loop(self):
+        intervals = [interval for interval in (self.refresh_interval, self.persist_interval) if interval > 0]
+        next_refresh = time.monotonic() + self.refresh_interval
+        while not self._stop.wait(min(intervals)):
+            try:
+                if self.refresh_interval > 0 and time.monotonic() >= next_refresh:
+                    next_refresh = time.monotonic() + self.refresh_interval
+                    self.refresh()
+                self.flush()
+            except Exception as e:
+                print(f"Error refreshing order index: {str(e)}")
+        self.flush()
+
+    # Queries
+
+    def list_orders(self):
+        """Copies of all entries, ordered by order ID"""
+        self.ensure_built()
+        with self._lock:
+            return [dict(self._orders[order_id]) for order_id in sorted(self._orders)]
+
+    def get(self, order_id):
+        self.ensure_built()
+        with self._lock:
+            entry = self._orders.get(order_id)
+            return dict(entry) if entry else None
+
+    def _sort_keys(self, field):
+        """(value, order_id) pairs for entries that have ``field``, ascending, and the
+        IDs of those that don't. Rebuilt only after the index changes."""
+        keys = self._sorted.get(field)
+        if keys is None:
+            valued, missing = [], []
+            for order_id, entry in self._orders.items():
+                value = entry.get(field)
+                if value:
+                    valued.append((value, order_id))
+                else:
+                    missing.append(order_id)
+            keys = self._sorted[field] = (sorted(valued), sorted(missing))
+        return keys
+
+    def query(self, status=None, search=None, date_field="processed_date", date_from=None, date_to=None,
+              sort="order_id", descending=False, cursor=None, limit=None):
+        """One page of entries matching the filters, and a cursor for the next page (or None).
+
+        Entries are walked in (sort value, order_id) order from the cursor
+        position, so each page only looks at entries after the previous one.
+        Entries without a value for the sort field come last, by order ID.
+        ``date_to`` is inclusive: "2024-05-31" matches any time that day.
+        """
+        if sort not in SORT_FIELDS:
+            raise ValueError(f"Can't sort by {sort}")
+        if date_field not in SORT_FIELDS[1:]:
+            raise ValueError(f"Can't filter by {date_field}")
+        position = decode_cursor(cursor, sort, descending) if cursor else None
+        status = status.lower() if status else None
+        search = search.lower() if search else None
+
+        def matches(entry):
+            if status is not None and (entry.get("status") or "").lower() != status:
+                return False
+            if search is not None and search not in entry["order_id"].lower() and \
+                    search not in (entry.get("patient_name") or "").lower():
+                return False
+            if date_from or date_to:
+                value = entry.get(date_field)
+                if not value:
+                    return False
+                if date_from and value < date_from:
+                    return False
+                if date_to and value[:len(date_to)] > date_to:
+                    return False
+            return True
+
+        self.ensure_built()
+        with self._lock:
+            valued, missing = self._sort_keys(sort)
+
+            def walk():
+                # Entries with a sort value, from the cursor on, then the ones without
+                if position is None or position[0] is not None:
+                    if descending:
+                        end = bisect.bisect_left(valued, tuple(position)) if position else len(valued)
+                        candidates = (valued[i] for i in range(end - 1, -1, -1))
+                    else:
+                        start = bisect.bisect_right(valued, tuple(position)) if position else 0
+                        candidates = (valued[i] for i in range(start, len(valued)))
+                    for value, order_id in candidates:
+                        yield value, order_id
+                    start = 0
+                else:
+                    start = bisect.bisect_right(missing, position[1])
+                for i in range(start, len(missing)):
+                    yield None, missing[i]
+
+            page, next_cursor = [], None
+            for value, order_id in walk():
+                entry = self._orders[order_id]
+                if not matches(entry):
+                    continue
+                if limit is not None and len(page) == limit:
+                    last = page[-1]
+                    next_cursor = encode_cursor(last.get(sort) or None, last["order_id"], sort, descending)
+                    break
+                page.append(dict(entry))
+            return page, next_cursor
+
+
+def encode_cursor(value, order_id, sort, descending):
+    """Opaque cursor for the position after (value, order_id)"""
+    data = json.dumps([value, order_id, sort, bool(descending)], separators=(",", ":"))
+    return base64.urlsafe_b64encode(data.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor, sort, descending):
+    """(value, order_id) from a cursor; ValueError if it is malformed or for a different sort"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        value, order_id, cursor_sort, cursor_descending = json.loads(base64.urlsafe_b64decode(padded))
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if cursor_sort != sort or cursor_descending != bool(descending):
+        raise ValueError("Cursor was issued for a different sort order")
+    return value, order_id
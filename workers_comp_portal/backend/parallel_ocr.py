@@ -0,0 +1,240 @@
+"""Per-document OCR fan-out: one order's documents are OCR'd concurrently and merged back in order."""
+import os
+import random
+import re
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_EXCEPTION, wait
+from pathlib import Path
+
+from fingerprints import order_documents
+
+# Which OCR backend a document goes to; documents of other types are read locally and aren't rate limited
+PROVIDER_BY_SUFFIX = {
+    ".pdf": "documentai", ".tif": "documentai", ".tiff": "documentai", ".jpg": "documentai",
+    ".jpeg": "documentai", ".png": "documentai", ".gif": "documentai", ".bmp": "documentai",
+}
+
+# HTTP statuses and gRPC status codes worth retrying: throttling, timeouts, and server-side hiccups
+TRANSIENT_STATUS_CODES = {429, 500, 502, 503, 504}
+TRANSIENT_GRPC_CODES = {"RESOURCE_EXHAUSTED", "UNAVAILABLE", "DEADLINE_EXCEEDED", "INTERNAL", "ABORTED"}
+# Exception classes for the same (google.api_core, requests), by name so neither has to be installed
+TRANSIENT_EXCEPTION_NAMES = {
+    "toomanyrequests", "resourceexhausted", "internalservererror", "badgateway", "serviceunavailable",
+    "gatewaytimeout", "deadlineexceeded", "timeout", "connectionerror",
+}
+# A status at the start of the message, as in google.api_core's "503 The service is currently unavailable."
+TRANSIENT_STATUS = re.compile(r"^\s*(429|500|502|503|504)\b")
+TRANSIENT_ERROR_MARKERS = (
+    "too many requests", "resource exhausted", "rate limit exceeded", "quota exceeded",
+    "deadline exceeded", "timed out", "service unavailable", "temporarily unavailable",
+    "connection reset", "internal server error",
+)
+
+
+def _status_code(exc):
+    """HTTP status or gRPC status code an API exception carries, if any"""
+    code = getattr(exc, "code", None)
+    if callable(code):  # grpc.RpcError.code() returns a StatusCode
+        try:
+            code = code()
+        except Exception:
+            code = None
+    if code is None:
+        code = getattr(exc, "grpc_status_code", None)
+    if code is None:
+        code = getattr(getattr(exc, "response", None), "status_code", None)
+    return code
+
+
+def is_transient_error(exc):
+    """True if an exception looks like throttling or a temporary outage rather than a bad document
+
+    Decided by exception type and status code where the client library
+    provides them; a message only counts if it starts with a retryable status
+    or names the condition, so a "500" elsewhere in it (a page count, an
+    order number) doesn't make a bad document look transient.
+    """
+    if isinstance(exc, (TimeoutError, ConnectionError)):
+        return True
+    if {cls.__name__.lower() for cls in type(exc).__mro__} & TRANSIENT_EXCEPTION_NAMES:
+        return True
+    code = _status_code(exc)
+    if isinstance(code, int) and not isinstance(code, bool):
+        return code in TRANSIENT_STATUS_CODES
+    if getattr(code, "name", None) in TRANSIENT_GRPC_CODES:
+        return True
+    message = str(exc).lower()
+    return bool(TRANSIENT_STATUS.match(message)) or any(marker in message for marker in TRANSIENT_ERROR_MARKERS)
+
+
+class RateLimiter:
+    """Token bucket: at most ``rate`` calls per second on average, bursts of up to ``burst``"""
+
+    def __init__(self, rate, burst=None):
+        if float(rate) <= 0:
+            raise ValueError(f"Rate limit must be above 0 calls per second, got {rate}")
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else max(1, rate))
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self.waited_seconds = 0.0
+
+    def acquire(self):
+        """Block until a call is allowed"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                delay = (1 - self._tokens) / self.rate
+                self.waited_seconds += delay
+            time.sleep(delay)
+
+
+class ParallelOCR:
+    """Drop-in replacement for ``process_order_folder`` that OCRs an order's documents concurrently.
+
+    Each document is linked into a staging folder of its own (named like the
+    order, so OCR output keeps its usual file names) and ``process_order_folder``
+    runs on that, up to ``max_workers`` at a time. Calls to a rate-limited
+    provider (``rate_limiters``, keyed by the names in PROVIDER_BY_SUFFIX)
+    wait for their turn; transient failures are retried with exponential
+    backoff and jitter. The per-document results are merged in file-name
+    order, whatever order they finished in, so the output doesn't depend on
+    timing. With an ``ocr_cache``, unchanged documents reuse their earlier
+    output. With ``max_workers=1``, or a single document, the documents are
+    OCR'd one at a time on the calling thread, through the same cache.
+    """
+
+    def __init__(self, process_order_folder, max_workers=4, rate_limiters=None, attempts=3,
+                 base_delay=1.0, max_delay=30.0, staging_dir=None, ocr_cache=None):
+        self.process_order_folder = process_order_folder
+        self.max_workers = max(1, max_workers)
+        self.rate_limiters = rate_limiters or {}
+        self.attempts = max(1, attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.staging_dir = staging_dir
+        self.ocr_cache = ocr_cache
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="ocr")
+        self._lock = threading.Lock()
+        self.documents = 0
+        self.retries = 0
+        self.failures = 0
+        self.cached = 0
+
+    def __call__(self, order_folder):
+        order_folder = Path(order_folder)
+        # Same files the OCR cache fingerprints
+        paths = order_documents(order_folder)
+        if self.max_workers == 1 or len(paths) <= 1:
+            return merge_order_data([self._process_document(order_folder, path) for path in paths])
+
+        futures = [self._pool.submit(self._process_document, order_folder, path) for path in paths]
+        done, not_done = wait(futures, return_when=FIRST_EXCEPTION)
+        failed = [future for future in futures if future in done and future.exception() is not None]
+        if failed:
+            # One failed document fails the order; don't start the ones still waiting
+            for future in not_done:
+                future.cancel()
+            raise failed[0].exception()
+        # Results in document order, whatever order they finished in
+        return merge_order_data([future.result() for future in futures])
+
+    def _process_document(self, order_folder, path):
+        if self.ocr_cache is not None:
+            cached = self.ocr_cache.get_document(order_folder.name, path)
+            if cached is not None:
+                with self._lock:
+                    self.cached += 1
+                return cached
+
+        staging_root = Path(tempfile.mkdtemp(prefix="ocr-", dir=self.staging_dir))
+        try:
+            staged_folder = staging_root / order_folder.name
+            staged_folder.mkdir()
+            staged = staged_folder / path.name
+            try:
+                os.link(path, staged)
+            except OSError:
+                shutil.copy2(path, staged)
+            order_data = self._with_retries(lambda: self.process_order_folder(staged_folder), [path])
+            order_data = _replace_paths(order_data, str(staged_folder), str(order_folder))
+        finally:
+            shutil.rmtree(staging_root, ignore_errors=True)
+
+        if self.ocr_cache is not None:
+            self.ocr_cache.put_document(order_folder.name, path, order_data)
+        return order_data
+
+    def _with_retries(self, call, paths):
+        providers = {PROVIDER_BY_SUFFIX.get(path.suffix.lower()) for path in paths}
+        limiters = [self.rate_limiters[name] for name in sorted(filter(None, providers)) if name in self.rate_limiters]
+        names = ", ".join(path.name for path in paths) or "order folder"
+        for attempt in range(1, self.attempts + 1):
+            for limiter in limiters:
+                limiter.acquire()
+            try:
+                result = call()
+                with self._lock:
+                    self.documents += len(paths)
+                if self.ocr_cache is not None:
+                    self.ocr_cache.record_ocred(len(paths))
+                return result
+            except Exception as e:
+                if attempt == self.attempts or not is_transient_error(e):
+                    with self._lock:
+                        self.failures += 1
+                    raise
+                delay = min(self.max_delay, self.base_delay * 2 ** (attempt - 1)) * random.uniform(0.5, 1.0)
+                with self._lock:
+                    self.retries += 1
+                print(f"OCR of {names} failed ({str(e)}), retry {attempt} in {delay:.1f}s")
+                time.sleep(delay)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "workers": self.max_workers,
+                "documents": self.documents,
+                "cached_documents": self.cached,
+                "retries": self.retries,
+                "failures": self.failures,
+                "rate_limit_wait_seconds": {name: round(limiter.waited_seconds, 3)
+                                            for name, limiter in self.rate_limiters.items()},
+            }
+
+
+def _replace_paths(value, old, new):
+    """Point any path strings in OCR output at the real order folder instead of the staging copy"""
+    if isinstance(value, str):
+        return value.replace(old, new) if old in value else value
+    if isinstance(value, dict):
+        return {key: _replace_paths(item, old, new) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_replace_paths(item, old, new) for item in value]
+    return value
+
+
+def merge_order_data(results):
+    """Combine per-document ``process_order_folder`` outputs into one, documents in order
+
+    Other top-level fields describe the order and are the same for every
+    document, so the first document's are kept.
+    """
+    merged = {}
+    documents = []
+    for order_data in results:
+        for key, value in order_data.items():
+            if key != "documents":
+                merged.setdefault(key, value)
+        documents.extend(order_data.get("documents") or [])
+    merged["documents"] = documents
+    return merged
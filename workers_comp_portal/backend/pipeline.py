@@ -0,0 +1,219 @@
+"""The order processing pipeline: OCR -> LLM request -> LLM call -> save results."""
+import datetime
+import functools
+import time
+from contextlib import nullcontext
+from pathlib import Path
+
+from fingerprints import json_digest
+from incremental import STAGES, merge_reprocessed, pipeline_info
+from ocr_cache import document_fingerprints
+
+
+class PipelineError(Exception):
+    """Raised when an order can't be processed (missing folder, no documents, ...)"""
+
+
+def stage(name):
+    """Report a stage method's duration, or its failure, to the pipeline's stats"""
+    def decorate(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            start = time.time()
+            try:
+                result = method(self, *args, **kwargs)
+            except Exception:
+                if self.stats is not None:
+                    self.stats.record_error(name)
+                raise
+            if self.stats is not None:
+                self.stats.record_stage(name, time.time() - start)
+            return result
+        return wrapper
+    return decorate
+
+
+class OrderPipeline:
+    """Runs the processing steps for one order.
+
+    The stage functions are passed in rather than imported here so the pipeline
+    can be driven with stubs (tests, benchmarks) as well as the real
+    ``process``/``llm_client``/``extract`` modules. An optional ``stats``
+    object (see stats.py) is sent each stage's duration and failures.
+
+    With a results store, every run saves a fingerprint of each stage's input
+    with the results (``results["pipeline"]``). Reprocessing stops at the first
+    stage whose input is unchanged from the last run: same LLM request means
+    the saved results stand as they are; same LLM response means only the
+    fingerprints are updated. When results are saved again, reviewer edits
+    and choices from the previous results are merged in (see incremental.py).
+    """
+
+    def __init__(self, input_dir, initialize_documentai, process_order_folder,
+                 format_llm_request, call_llm_api, save_results, ocr_cache=None, llm_cache=None,
+                 results_store=None, stats=None):
+        self.input_dir = Path(input_dir)
+        self.stats = stats
+        self.ocr_cache = ocr_cache
+        self.llm_cache = llm_cache
+        self.results_store = results_store
+        self.initialize_documentai = initialize_documentai
+        self.process_order_folder = process_order_folder
+        self.format_llm_request = format_llm_request
+        self.call_llm_api = call_llm_api
+        self.save_results = save_results
+
+    def order_folder(self, order_id):
+        """Path of an order's input folder, or raise PipelineError if it doesn't exist"""
+        order_folder = self.input_dir / order_id
+        if not order_folder.exists() or not order_folder.is_dir():
+            raise PipelineError(f"Order folder not found: {order_id}")
+        return order_folder
+
+    def prepare(self):
+        """Get the OCR client ready before any documents are processed"""
+        self.initialize_documentai()
+
+    @stage("ocr")
+    def run_ocr(self, order_id):
+        """OCR stage: read and OCR every document in the order folder"""
+        order_folder = self.order_folder(order_id)
+
+        # Documents that haven't changed since the last run reuse their OCR output
+        if self.ocr_cache is not None:
+            cache_key, fingerprints = self.ocr_cache.key_for(order_id, order_folder)
+            order_data = self.ocr_cache.get(cache_key, fingerprints)
+            if order_data is not None:
+                return order_data
+
+        order_data = self.process_order_folder(order_folder)
+
+        if not order_data["documents"]:
+            raise PipelineError(f"No valid documents found in order folder: {order_id}")
+
+        # Stored for the next run; only the OCR runner counts documents as OCR'd, since some of
+        # these may have come from its per-document cache
+        if self.ocr_cache is not None:
+            self.ocr_cache.put(cache_key, fingerprints, order_data)
+        return order_data
+
+    @stage("llm")
+    def run_llm(self, order_data, refresh=False, api_request=None):
+        """LLM stage: build the extraction request (unless given) and call the model
+
+        With an LLM cache, an identical request reuses the earlier response
+        unless ``refresh`` is set.
+        """
+        if api_request is None:
+            api_request = self.format_llm_request(order_data)
+        if self.llm_cache is not None:
+            llm_response = self.llm_cache.call(self.call_llm_api, api_request, bypass=refresh)
+        else:
+            llm_response = self.call_llm_api(api_request)
+        return api_request, llm_response
+
+    @stage("save")
+    def save(self, order_id, order_data, api_request, llm_response, fingerprints=None):
+        """Save results using existing function, holding the order's write lock
+
+        ``save_results`` always writes the JSON results file, in place: it
+        lives in the external process module and picks the path itself, so it
+        can't be pointed at a temp file. JSONResultsStore.read retries a file
+        that doesn't parse to ride out that write. The previous results'
+        manual edits are then merged in and the stage fingerprints recorded,
+        and the merged results are written through the store (atomically).
+        """
+        if self.results_store is None:
+            return self.save_results(order_id, order_data, api_request, llm_response)
+        with self.results_store.lock(order_id):
+            previous = self.previous_results(order_id)
+            results = self.save_results(order_id, order_data, api_request, llm_response)
+            if not isinstance(results, dict):
+                if not self.results_store.writes_results_files:
+                    return results
+                results = self.previous_results(order_id)
+                if results is None:
+                    return None
+
+            if fingerprints is None:
+                fingerprints = self.input_fingerprints(order_id, order_data, api_request, llm_response)
+            results, conflicts = merge_reprocessed(previous, results)
+            if conflicts:
+                print(f"Order {order_id}: kept manual edits the new extraction disagrees with: {', '.join(conflicts)}")
+            self._record_run(results, fingerprints, STAGES)
+            self.results_store.write(order_id, results)
+            return results
+
+    # Incremental reprocessing
+
+    def previous_results(self, order_id):
+        """The order's stored results, or None"""
+        if self.results_store is None or self.results_store.version(order_id) is None:
+            return None
+        try:
+            return self.results_store.read(order_id)[0]
+        except Exception as e:
+            print(f"Error reading previous results for {order_id}: {str(e)}")
+            return None
+
+    def request_fingerprint(self, api_request):
+        """The LLM request plus the model settings that affect the response"""
+        settings = self.llm_cache.model_settings if self.llm_cache is not None else None
+        return json_digest({"request": api_request, "model": settings})
+
+    def input_fingerprints(self, order_id, order_data, api_request=None, llm_response=None):
+        fingerprints = {
+            "documents": json_digest(document_fingerprints(self.order_folder(order_id))),
+            "ocr": json_digest(order_data),
+        }
+        if api_request is not None:
+            fingerprints["llm_request"] = self.request_fingerprint(api_request)
+        if llm_response is not None:
+            fingerprints["llm_response"] = json_digest(llm_response)
+        return fingerprints
+
+    def _record_run(self, results, fingerprints, stages_run):
+        info = results.setdefault("pipeline", {})
+        info["fingerprints"] = fingerprints
+        info["stages_run"] = list(stages_run)
+        info["last_run"] = str(datetime.datetime.now())
+
+    def _record_skip(self, order_id, fingerprints, stages_run):
+        """Save new fingerprints for a run that left the results themselves unchanged"""
+        def apply(results):
+            self._record_run(results, dict(pipeline_info(results).get("fingerprints") or {}, **fingerprints),
+                             stages_run)
+        return self.results_store.update(order_id, apply)[0]
+
+    def run(self, order_id, refresh=False, slots=None):
+        """Process or reprocess an order and return the saved results
+
+        ``refresh`` reruns every stage after OCR, bypassing the LLM cache.
+        ``slots`` maps stage names ("ocr", "llm", "save") to context managers
+        held while that stage runs, e.g. semaphores that limit how many orders
+        of a batch are in each stage at once.
+        """
+        slots = slots or {}
+        self.prepare()
+        previous = None if refresh else self.previous_results(order_id)
+        recorded = pipeline_info(previous).get("fingerprints") or {}
+
+        with slots.get("ocr") or nullcontext():
+            order_data = self.run_ocr(order_id)
+        api_request = self.format_llm_request(order_data)
+        fingerprints = self.input_fingerprints(order_id, order_data, api_request)
+
+        if previous is not None and recorded.get("llm_request") == fingerprints["llm_request"]:
+            # Same documents, prompt and model: the saved results (and any edits to them) stand
+            with slots.get("save") or nullcontext():
+                return self._record_skip(order_id, fingerprints, STAGES[:3])
+
+        with slots.get("llm") or nullcontext():
+            api_request, llm_response = self.run_llm(order_data, refresh=refresh, api_request=api_request)
+        fingerprints["llm_response"] = json_digest(llm_response)
+
+        with slots.get("save") or nullcontext():
+            if previous is not None and recorded.get("llm_response") == fingerprints["llm_response"]:
+                # The model answered the same, so extraction, geocoding and provider mapping would too
+                return self._record_skip(order_id, fingerprints, STAGES[:4])
+            return self.save(order_id, order_data, api_request, llm_response, fingerprints=fingerprints)
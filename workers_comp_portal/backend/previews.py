@@ -0,0 +1,144 @@
+"""Downscaled WebP/PNG renders of image documents (multi-page TIFF faxes in particular)."""
+import io
+import threading
+import weakref
+
+from PIL import Image, features
+
+from caches import DiskCache
+from fingerprints import file_digest, json_digest
+
+# Bump when the rendering changes so old cached renders are not served
+RENDER_VERSION = 1
+
+# Longest edge in pixels for each preview size
+PREVIEW_SIZES = {"page": 1600, "thumb": 240}
+
+PREVIEWABLE_SUFFIXES = ('.tif', '.tiff', '.jpg', '.jpeg', '.png', '.gif', '.bmp')
+
+MIMETYPES = {"webp": "image/webp", "png": "image/png"}
+
+
+def is_previewable(path):
+    return path.suffix.lower() in PREVIEWABLE_SUFFIXES
+
+
+class PageNotFoundError(Exception):
+    """Raised when asking for a page past the end of a document"""
+
+
+class PreviewRenderer:
+    """Renders one page of an image document at a preview size, caching the result on disk.
+
+    Renders are keyed by the document's content hash, page, size and format,
+    so an edited document is re-rendered and an unchanged one never is.
+    The cache is bounded by ``max_bytes`` (least recently used renders go
+    first). Concurrent requests for the same render share one conversion.
+    """
+
+    def __init__(self, directory, max_bytes=512 * 1024 * 1024, default_format="webp"):
+        self.store = DiskCache(directory, max_bytes=max_bytes, binary=True)
+        self.default_format = default_format if features.check("webp") else "png"
+        self._page_counts = {}
+        # A key's lock lives while a request holds or waits on it, so every racing request shares it
+        self._render_locks = weakref.WeakValueDictionary()
+        self._lock = threading.Lock()
+        self.renders = 0
+
+    def output_format(self, requested=None):
+        fmt = (requested or self.default_format).lower()
+        if fmt not in MIMETYPES:
+            raise ValueError(f"Unsupported preview format: {fmt}")
+        if fmt == "webp" and not features.check("webp"):
+            fmt = "png"
+        return fmt
+
+    def page_count(self, path):
+        """Number of pages (frames) in an image document"""
+        digest = file_digest(path)
+        with self._lock:
+            count = self._page_counts.get(digest)
+        if count is None:
+            with Image.open(path) as image:
+                count = getattr(image, "n_frames", 1)
+            with self._lock:
+                if len(self._page_counts) >= 10000:
+                    self._page_counts.clear()
+                self._page_counts[digest] = count
+        return count
+
+    def key_for(self, path, page, size, fmt):
+        return json_digest({"document": file_digest(path), "page": page, "size": size,
+                            "format": fmt, "version": RENDER_VERSION})
+
+    def render(self, path, page=0, size="page", fmt=None):
+        """(image bytes, mimetype, cache key) for one page, rendering it if it isn't cached"""
+        if size not in PREVIEW_SIZES:
+            raise ValueError(f"Unknown preview size: {size}")
+        fmt = self.output_format(fmt)
+        if page < 0 or page >= self.page_count(path):
+            raise PageNotFoundError(f"{path.name} has no page {page + 1}")
+
+        key = self.key_for(path, page, size, fmt)
+        data = self.store.get(key)
+        if data is not None:
+            return data, MIMETYPES[fmt], key
+
+        with self._lock:
+            render_lock = self._render_locks.get(key)
+            if render_lock is None:
+                render_lock = self._render_locks[key] = threading.Lock()
+        with render_lock:
+            # Someone else may have rendered it while we waited: check the disk cache again before converting
+            data = self.store.get(key) if key in self.store else None
+            if data is None:
+                data = self._render(path, page, PREVIEW_SIZES[size], fmt)
+                self.store.set(key, data)
+                with self._lock:
+                    self.renders += 1
+        return data, MIMETYPES[fmt], key
+
+    def _render(self, path, page, max_edge, fmt):
+        with Image.open(path) as image:
+            image.seek(page)
+            frame = image.copy()
+
+        # Bilevel fax pages downscale much better as greyscale
+        if frame.mode in ("1", "L", "I;16", "I"):
+            frame = frame.convert("L")
+        elif frame.mode not in ("RGB", "RGBA"):
+            frame = frame.convert("RGBA" if "A" in frame.mode or "transparency" in frame.info else "RGB")
+        frame.thumbnail((max_edge, max_edge), Image.LANCZOS)
+
+        buffer = io.BytesIO()
+        if fmt == "webp":
+            frame.save(buffer, format="WEBP", quality=80, method=4)
+        else:
+            frame.save(buffer, format="PNG", optimize=True)
+        return buffer.getvalue()
+
+    def prerender(self, path, sizes=("thumb", "page")):
+        """Render every page of a document ahead of time; returns the number of pages"""
+        count = self.page_count(path)
+        for page in range(count):
+            for size in sizes:
+                self.render(path, page, size)
+        return count
+
+    def prerender_folder(self, folder):
+        """Pre-render every previewable document in an order folder"""
+        rendered = 0
+        for path in sorted(folder.glob("*"), key=lambda p: p.name):
+            if path.is_file() and is_previewable(path):
+                try:
+                    rendered += self.prerender(path)
+                except Exception as e:
+                    print(f"Error pre-rendering {path.name}: {str(e)}")
+        return rendered
+
+    def stats(self):
+        stats = self.store.stats()
+        with self._lock:
+            stats["renders"] = self.renders
+            stats["format"] = self.default_format
+        return stats
@@ -0,0 +1,282 @@
+"""In-process spatial index of provider locations for fast nearest-provider lookups."""
+import json
+import math
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+EARTH_RADIUS_MILES = 3958.8
+MILES_PER_DEGREE = 69.0
+DEFAULT_CELL_DEGREES = 0.5
+
+# Names provider_mapping_simple might expose for dumping the whole provider table
+PROVIDER_LOADER_NAMES = ("get_all_providers", "load_providers", "load_all_providers")
+
+
+def haversine_miles(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = (math.sin((lat2 - lat1) / 2) ** 2 +
+         math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_MILES * math.asin(min(1.0, math.sqrt(a)))
+
+
+def _coordinate(record, *names):
+    for name in names:
+        value = record.get(name)
+        if value not in (None, ""):
+            try:
+                return float(value)
+            except (TypeError, ValueError):
+                return None
+    return None
+
+
+class _Grid:
+    """Providers bucketed into fixed-size lat/lon cells"""
+
+    def __init__(self, cell_degrees):
+        self.cell_degrees = cell_degrees
+        self.cells = {}
+        self.bounds = None
+
+    def cell_of(self, lat, lon):
+        return (int(math.floor(lat / self.cell_degrees)), int(math.floor(lon / self.cell_degrees)))
+
+    def add(self, idx, lat, lon):
+        self.cells.setdefault(self.cell_of(lat, lon), []).append(idx)
+
+    def finish(self):
+        """Remember the occupied cell range so ring searches know when to stop"""
+        if self.cells:
+            rows = [cell[0] for cell in self.cells]
+            cols = [cell[1] for cell in self.cells]
+            self.bounds = (min(rows), max(rows), min(cols), max(cols))
+
+    def max_ring(self, center):
+        """Ring number beyond which there are no occupied cells"""
+        if self.bounds is None:
+            return -1
+        min_row, max_row, min_col, max_col = self.bounds
+        ci, cj = center
+        return max(abs(ci - min_row), abs(ci - max_row), abs(cj - min_col), abs(cj - max_col))
+
+    def ring(self, center, r):
+        """Indices of providers in the square ring of cells at distance r from center"""
+        ci, cj = center
+        if r == 0:
+            yield from self.cells.get(center, ())
+            return
+        for di in range(-r, r + 1):
+            for dj in (-r, r) if abs(di) != r else range(-r, r + 1):
+                yield from self.cells.get((ci + di, cj + dj), ())
+
+
+class _Snapshot:
+    """Immutable index over one load of the provider table"""
+
+    def __init__(self, records, cell_degrees):
+        self.providers = []
+        self.lats = []
+        self.lons = []
+        self.rates = []
+        self.grid = _Grid(cell_degrees)
+        self.grids_by_code = {}
+        self.skipped = 0
+
+        for record in records:
+            lat = _coordinate(record, "lat", "latitude", "Latitude")
+            lon = _coordinate(record, "lon", "longitude", "Longitude")
+            if lat is None or lon is None:
+                self.skipped += 1
+                continue
+            record = dict(record)
+            rates = record.pop("rates", None) or {}
+            idx = len(self.providers)
+            self.providers.append(record)
+            self.lats.append(lat)
+            self.lons.append(lon)
+            self.rates.append({str(code): rate for code, rate in rates.items()})
+            self.grid.add(idx, lat, lon)
+            for code in rates:
+                self.grids_by_code.setdefault(str(code), _Grid(cell_degrees)).add(idx, lat, lon)
+
+        self.grid.finish()
+        for grid in self.grids_by_code.values():
+            grid.finish()
+
+        # Column arrays for vectorized distance computations
+        self.lat_radians = np.radians(np.array(self.lats, dtype=np.float64))
+        self.lon_radians = np.radians(np.array(self.lons, dtype=np.float64))
+        self.cos_lat = np.cos(self.lat_radians)
+        self.members_by_code = {}
+        for idx, rates in enumerate(self.rates):
+            for code in rates:
+                self.members_by_code.setdefault(code, []).append(idx)
+        for code, members in self.members_by_code.items():
+            self.members_by_code[code] = np.array(members, dtype=np.int64)
+
+    def distances_from(self, lat, lon):
+        """Haversine distance in miles from one point to every provider, as one array"""
+        lat, lon = math.radians(lat), math.radians(lon)
+        a = (np.sin((self.lat_radians - lat) / 2) ** 2 +
+             math.cos(lat) * self.cos_lat * np.sin((self.lon_radians - lon) / 2) ** 2)
+        return 2 * EARTH_RADIUS_MILES * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+    def nearest(self, grid, lat, lon, limit, max_miles=None):
+        """(distance, idx) of the closest providers in grid, nearest first"""
+        center = grid.cell_of(lat, lon)
+        found = []
+        for r in range(grid.max_ring(center) + 1):
+            # Anything in ring r is at least (r - 1) cells away in every direction;
+            # measure the longitude side at the highest latitude it could be at
+            if len(found) >= limit and r > 0:
+                edge_lat = min(89.9, abs(lat) + (r + 1) * grid.cell_degrees)
+                bound = 0.99 * (r - 1) * grid.cell_degrees * MILES_PER_DEGREE * math.cos(math.radians(edge_lat))
+                if bound >= found[limit - 1][0]:
+                    break
+            for idx in grid.ring(center, r):
+                distance = haversine_miles(lat, lon, self.lats[idx], self.lons[idx])
+                if max_miles is None or distance <= max_miles:
+                    found.append((distance, idx))
+            found.sort()
+            del found[limit:]
+        return found
+
+
+class ProviderIndex:
+    """Nearest-provider lookups over an in-memory grid of provider coordinates.
+
+    ``loader`` returns an iterable of provider dicts (the same shape
+    ``find_nearest_providers`` returns, with ``lat``/``lon``) and an optional
+    ``rates`` mapping of procedure code -> rate. A secondary grid per procedure
+    code means a rate-filtered lookup only looks at providers with a rate for
+    that code. ``reload()`` builds a new snapshot and swaps it in, so the index
+    can be refreshed while requests are being served.
+    """
+
+    def __init__(self, loader, cell_degrees=DEFAULT_CELL_DEGREES):
+        self.loader = loader
+        self.cell_degrees = cell_degrees
+        self._snapshot = None
+        self._reload_lock = threading.Lock()
+        self.generation = 0
+        self.loaded_at = None
+        self.load_seconds = None
+        self.last_error = None
+
+    @property
+    def ready(self):
+        return self._snapshot is not None
+
+    def reload(self):
+        """Rebuild the index from the loader; keeps the old snapshot if loading fails"""
+        with self._reload_lock:
+            start = time.time()
+            try:
+                records = self.loader()
+                if records is None:
+                    self.last_error = "No provider source configured"
+                    return False
+                snapshot = _Snapshot(records, self.cell_degrees)
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"Error loading provider index: {str(e)}")
+                return False
+
+            self._snapshot = snapshot
+            self.generation += 1
+            self.loaded_at = time.time()
+            self.load_seconds = round(time.time() - start, 3)
+            self.last_error = None
+            print(f"Provider index loaded: {len(snapshot.providers)} providers, "
+                  f"{len(snapshot.grids_by_code)} procedure codes in {self.load_seconds}s")
+            return True
+
+    def nearest(self, latitude, longitude, proc_code=None, limit=5, max_miles=None):
+        """Closest providers to a point, with distance_miles (and rate when proc_code is given)"""
+        snapshot = self._snapshot
+        if snapshot is None:
+            raise RuntimeError("Provider index is not loaded")
+
+        latitude, longitude = float(latitude), float(longitude)
+        grid = snapshot.grid
+        if proc_code and str(proc_code) in snapshot.grids_by_code:
+            grid = snapshot.grids_by_code[str(proc_code)]
+
+        providers = []
+        for distance, idx in snapshot.nearest(grid, latitude, longitude, limit, max_miles):
+            provider = dict(snapshot.providers[idx])
+            provider["distance_miles"] = round(distance, 2)
+            if proc_code:
+                provider["rate"] = snapshot.rates[idx].get(str(proc_code))
+            providers.append(provider)
+        return providers
+
+    def match_procedures(self, latitude, longitude, cpt_codes, limit=5):
+        """Nearest providers with a rate for each CPT code, from a single distance pass.
+
+        Distances to every provider are computed once with NumPy; each code then
+        just selects its closest members. Codes no provider has a rate for get
+        the nearest providers overall with ``rate`` None.
+        """
+        snapshot = self._snapshot
+        if snapshot is None:
+            raise RuntimeError("Provider index is not loaded")
+
+        distances = snapshot.distances_from(float(latitude), float(longitude))
+        matches = {}
+        for code in dict.fromkeys(str(code) for code in cpt_codes if code):
+            members = snapshot.members_by_code.get(code)
+            if members is None:
+                members = np.arange(len(snapshot.providers))
+            candidate_distances = distances[members]
+            if len(members) > limit:
+                closest = np.argpartition(candidate_distances, limit)[:limit]
+            else:
+                closest = np.arange(len(members))
+            closest = closest[np.argsort(candidate_distances[closest], kind='stable')]
+
+            providers = []
+            for position in closest:
+                idx = int(members[position])
+                provider = dict(snapshot.providers[idx])
+                provider["distance_miles"] = round(float(candidate_distances[position]), 2)
+                provider["rate"] = snapshot.rates[idx].get(code)
+                providers.append(provider)
+            matches[code] = providers
+        return matches
+
+    def stats(self):
+        snapshot = self._snapshot
+        return {
+            "ready": snapshot is not None,
+            "generation": self.generation,
+            "providers": len(snapshot.providers) if snapshot else 0,
+            "skipped_without_coordinates": snapshot.skipped if snapshot else 0,
+            "procedure_codes": len(snapshot.grids_by_code) if snapshot else 0,
+            "cells": len(snapshot.grid.cells) if snapshot else 0,
+            "load_seconds": self.load_seconds,
+            "last_error": self.last_error,
+        }
+
+
+def provider_loader(provider_module, export_path=None):
+    """Loader for ProviderIndex: a JSON export if configured, else the provider module's table dump.
+
+    Returns a function that yields None when neither source exists, in which
+    case callers fall back to ``find_nearest_providers``.
+    """
+    def load():
+        if export_path and Path(export_path).exists():
+            with open(export_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            return data.get("providers", []) if isinstance(data, dict) else data
+
+        for name in PROVIDER_LOADER_NAMES:
+            loader = getattr(provider_module, name, None)
+            if callable(loader):
+                return list(loader())
+        return None
+    return load
@@ -0,0 +1,432 @@
+"""Storage backends for per-order results, with locking, atomic writes and ETags.
+
+Two interchangeable backends:
+
+- ``JSONResultsStore``: one ``OUTPUT_DIR/{order_id}_results.json`` file per order
+  (the original layout, and what the processing pipeline writes).
+- ``SQLiteResultsStore``: a single embedded database with indexed status,
+  dates, patient name and CPT codes.
+
+Pick one with ``create_results_store`` (RESULTS_BACKEND=json|sqlite).
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+import weakref
+from contextlib import contextmanager
+from pathlib import Path
+
+from order_index import extract_cpt_codes, extract_patient_name
+
+RESULTS_SUFFIX = "_results.json"
+
+
+class OrderNotFoundError(Exception):
+    """Raised when an order has no results yet"""
+
+
+class VersionConflictError(Exception):
+    """Raised when a write was based on an out-of-date version of the results"""
+
+    def __init__(self, order_id, expected, actual):
+        super().__init__(f"Order {order_id} was modified by someone else; reload and try again")
+        self.order_id = order_id
+        self.expected = expected
+        self.actual = actual
+
+
+def normalize_etag(value):
+    """Strip quotes and weak-validator prefix from an If-Match / ETag header value"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.startswith("W/"):
+        value = value[2:]
+    return value.strip('"')
+
+
+def _etag_of(data):
+    return hashlib.sha256(data).hexdigest()[:32]
+
+
+def _serialize(results):
+    return json.dumps(results, indent=2).encode('utf-8')
+
+
+class ResultsStore:
+    """Behaviour shared by the backends: per-order locks, read-modify-write and change callbacks.
+
+    Writers for the same order are serialized by a per-order lock; writers for
+    different orders never wait on each other. Every stored version has an
+    ETag (a hash of its serialized JSON, identical across backends); passing
+    ``expected_etag`` makes a write fail with VersionConflictError if the
+    results changed since the caller read them.
+
+    Backends implement ``read``, ``_store``, ``exists``, ``version``,
+    ``versions`` and ``query``.
+    """
+
+    # Whether this backend reads the {order_id}_results.json files save_results writes
+    writes_results_files = False
+
+    def __init__(self, on_change=None):
+        self.on_change = on_change
+        # Only orders someone holds or waits on keep a lock, so this doesn't grow with every order touched
+        self._locks = weakref.WeakValueDictionary()
+        self._locks_lock = threading.Lock()
+
+    @contextmanager
+    def lock(self, order_id):
+        """Hold the write lock for one order"""
+        with self._locks_lock:
+            lock = self._locks.get(order_id)
+            if lock is None:
+                lock = self._locks[order_id] = threading.RLock()
+        with lock:
+            yield
+
+    def _current_etag(self, order_id):
+        return self.read(order_id)[1]
+
+    def write(self, order_id, results, expected_etag=None):
+        """Replace an order's results; returns the new etag"""
+        with self.lock(order_id):
+            if expected_etag is not None:
+                current = self._current_etag(order_id)
+                if current != expected_etag:
+                    raise VersionConflictError(order_id, expected_etag, current)
+            etag = self._store(order_id, results)
+        self._changed(order_id)
+        return etag
+
+    def update(self, order_id, mutate, expected_etag=None):
+        """Locked read-modify-write: ``mutate(results)`` edits the dict in place.
+
+        Returns (results, new etag).
+        """
+        with self.lock(order_id):
+            results, current = self.read(order_id)
+            if expected_etag is not None and current != expected_etag:
+                raise VersionConflictError(order_id, expected_etag, current)
+            mutate(results)
+            etag = self._store(order_id, results)
+        self._changed(order_id)
+        return results, etag
+
+    def _changed(self, order_id):
+        if self.on_change is not None:
+            try:
+                self.on_change(order_id)
+            except Exception as e:
+                print(f"Error handling change to order {order_id}: {str(e)}")
+
+    def summary(self, order_id):
+        """Index fields for one order"""
+        results, _ = self.read(order_id)
+        return {
+            "status": results.get("status", "Processed"),
+            "patient_name": extract_patient_name(results),
+            "processed_date": results.get("processed_date"),
+            "approved_date": results.get("approved_date"),
+        }
+
+
+def _version_of(stat):
+    # A string, so it survives the order index's JSON round trip unchanged
+    return f"{stat.st_mtime_ns}:{stat.st_size}:{stat.st_ino}"
+
+
+class JSONResultsStore(ResultsStore):
+    """Stores each order's results as ``OUTPUT_DIR/{order_id}_results.json``.
+
+    Files are written to a temp file and renamed into place so readers never
+    see a half-written file. The external ``save_results`` still writes its
+    file in place (it picks the path itself), so a read that finds a file that
+    doesn't parse retries for a moment before giving up. The version token is
+    the file's mtime (ns), size and inode: every atomic write makes a new
+    inode, so two writes within one mtime tick still get different tokens.
+    """
+
+    writes_results_files = True
+
+    def __init__(self, output_dir, on_change=None):
+        super().__init__(on_change)
+        self.output_dir = Path(output_dir)
+        self.write_retries = 0
+        self.read_retries = 0
+
+    def path(self, order_id):
+        return self.output_dir / f"{order_id}{RESULTS_SUFFIX}"
+
+    def exists(self, order_id):
+        return self.path(order_id).exists()
+
+    def _read_bytes(self, order_id):
+        try:
+            return self.path(order_id).read_bytes()
+        except FileNotFoundError:
+            raise OrderNotFoundError(f"Order results not found: {order_id}")
+
+    def read(self, order_id):
+        """(results, etag) for an order"""
+        for attempt in range(5):
+            data = self._read_bytes(order_id)
+            try:
+                return json.loads(data.decode('utf-8')), _etag_of(data)
+            except ValueError:  # half-written by save_results (JSONDecodeError, UnicodeDecodeError)
+                if attempt == 4:
+                    raise
+                self.read_retries += 1
+                time.sleep(0.05 * (attempt + 1))
+
+    def _current_etag(self, order_id):
+        return _etag_of(self._read_bytes(order_id))
+
+    def _store(self, order_id, results):
+        data = _serialize(results)
+        path = self.path(order_id)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+
+        # On Windows the rename fails while another process (or the sync client) has the file open
+        for attempt in range(5):
+            try:
+                os.replace(tmp_path, path)
+                break
+            except PermissionError:
+                if attempt == 4:
+                    os.remove(tmp_path)
+                    raise
+                self.write_retries += 1
+                time.sleep(0.05 * (attempt + 1))
+        return _etag_of(data)
+
+    def version(self, order_id):
+        """Cheap change token for one order (None if it has no results)"""
+        try:
+            return _version_of(self.path(order_id).stat())
+        except FileNotFoundError:
+            return None
+
+    def versions(self):
+        """Map of order_id -> change token for every stored order, from one directory listing"""
+        versions = {}
+        if not self.output_dir.exists():
+            return versions
+        with os.scandir(self.output_dir) as entries:
+            for entry in entries:
+                if entry.name.endswith(RESULTS_SUFFIX) and entry.is_file():
+                    versions[entry.name[:-len(RESULTS_SUFFIX)]] = _version_of(entry.stat())
+        return versions
+
+    def order_ids(self):
+        return sorted(self.versions())
+
+    def query(self, status=None, cpt_code=None, patient_name=None):
+        """Order IDs matching the filters. Opens every results file, so it is slow on large trees."""
+        matches = []
+        for order_id in self.order_ids():
+            try:
+                results, _ = self.read(order_id)
+            except (OrderNotFoundError, ValueError):
+                continue
+            if status is not None and results.get("status", "Processed").lower() != status.lower():
+                continue
+            if cpt_code is not None and str(cpt_code) not in extract_cpt_codes(results):
+                continue
+            if patient_name is not None and patient_name.lower() not in (extract_patient_name(results) or "").lower():
+                continue
+            matches.append(order_id)
+        return matches
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS order_results (
+    order_id TEXT PRIMARY KEY,
+    status TEXT,
+    patient_name TEXT,
+    processed_date TEXT,
+    approved_date TEXT,
+    version INTEGER NOT NULL,
+    etag TEXT NOT NULL,
+    updated_at REAL NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_order_results_status ON order_results (status);
+CREATE INDEX IF NOT EXISTS idx_order_results_processed ON order_results (processed_date);
+CREATE INDEX IF NOT EXISTS idx_order_results_approved ON order_results (approved_date);
+CREATE INDEX IF NOT EXISTS idx_order_results_patient ON order_results (patient_name COLLATE NOCASE);
+CREATE TABLE IF NOT EXISTS order_cpt_codes (
+    order_id TEXT NOT NULL,
+    cpt_code TEXT NOT NULL,
+    PRIMARY KEY (order_id, cpt_code)
+);
+CREATE INDEX IF NOT EXISTS idx_order_cpt_codes_code ON order_cpt_codes (cpt_code);
+"""
+
+
+class SQLiteResultsStore(ResultsStore):
+    """Stores results in one SQLite database, one row per order.
+
+    The full results JSON is kept in ``data``; status, patient name, dates and
+    CPT codes are copied into indexed columns on every write so list and
+    filter queries never parse JSON. Each thread gets its own connection; the
+    database runs in WAL mode so readers don't block the writer.
+    """
+
+    def __init__(self, database_path, on_change=None):
+        super().__init__(on_change)
+        self.database_path = Path(database_path)
+        self._local = threading.local()
+        self._schema_ready = False
+        self._schema_lock = threading.Lock()
+        # A forked worker (gunicorn preload) must not reuse connections opened before the fork
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._forget_connections)
+
+    def _forget_connections(self):
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            self.database_path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.database_path), timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            with self._schema_lock:
+                if not self._schema_ready:
+                    conn.executescript(SCHEMA)
+                    self._schema_ready = True
+        return conn
+
+    def exists(self, order_id):
+        row = self._connection().execute(
+            "SELECT 1 FROM order_results WHERE order_id = ?", (order_id,)).fetchone()
+        return row is not None
+
+    def read(self, order_id):
+        row = self._connection().execute(
+            "SELECT data, etag FROM order_results WHERE order_id = ?", (order_id,)).fetchone()
+        if row is None:
+            raise OrderNotFoundError(f"Order results not found: {order_id}")
+        return json.loads(row["data"]), row["etag"]
+
+    def _current_etag(self, order_id):
+        row = self._connection().execute(
+            "SELECT etag FROM order_results WHERE order_id = ?", (order_id,)).fetchone()
+        if row is None:
+            raise OrderNotFoundError(f"Order results not found: {order_id}")
+        return row["etag"]
+
+    def _store(self, order_id, results):
+        data = _serialize(results)
+        etag = _etag_of(data)
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                """INSERT INTO order_results
+                       (order_id, status, patient_name, processed_date, approved_date,
+                        version, etag, updated_at, data)
+                   VALUES (?, ?, ?, ?, ?, 1, ?, ?, ?)
+                   ON CONFLICT(order_id) DO UPDATE SET
+                       status = excluded.status,
+                       patient_name = excluded.patient_name,
+                       processed_date = excluded.processed_date,
+                       approved_date = excluded.approved_date,
+                       version = order_results.version + 1,
+                       etag = excluded.etag,
+                       updated_at = excluded.updated_at,
+                       data = excluded.data""",
+                (order_id, results.get("status", "Processed"), extract_patient_name(results),
+                 results.get("processed_date"), results.get("approved_date"),
+                 etag, time.time(), data.decode('utf-8')))
+            conn.execute("DELETE FROM order_cpt_codes WHERE order_id = ?", (order_id,))
+            conn.executemany("INSERT INTO order_cpt_codes (order_id, cpt_code) VALUES (?, ?)",
+                             [(order_id, code) for code in extract_cpt_codes(results)])
+        return etag
+
+    def version(self, order_id):
+        row = self._connection().execute(
+            "SELECT version FROM order_results WHERE order_id = ?", (order_id,)).fetchone()
+        return row["version"] if row else None
+
+    def versions(self):
+        rows = self._connection().execute("SELECT order_id, version FROM order_results")
+        return {row["order_id"]: row["version"] for row in rows}
+
+    def order_ids(self):
+        rows = self._connection().execute("SELECT order_id FROM order_results ORDER BY order_id")
+        return [row["order_id"] for row in rows]
+
+    def summary(self, order_id):
+        row = self._connection().execute(
+            """SELECT status, patient_name, processed_date, approved_date
+               FROM order_results WHERE order_id = ?""", (order_id,)).fetchone()
+        if row is None:
+            raise OrderNotFoundError(f"Order results not found: {order_id}")
+        return dict(row)
+
+    def query(self, status=None, cpt_code=None, patient_name=None):
+        """Order IDs matching the filters, answered from the indexed columns"""
+        sql = "SELECT r.order_id FROM order_results r"
+        clauses, params = [], []
+        if cpt_code is not None:
+            sql += " JOIN order_cpt_codes c ON c.order_id = r.order_id AND c.cpt_code = ?"
+            params.append(str(cpt_code))
+        if status is not None:
+            clauses.append("r.status = ? COLLATE NOCASE")
+            params.append(status)
+        if patient_name is not None:
+            clauses.append("r.patient_name LIKE ? COLLATE NOCASE")
+            params.append(f"%{patient_name}%")
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY r.order_id"
+        return [row["order_id"] for row in self._connection().execute(sql, params)]
+
+
+def create_results_store(backend, output_dir, database_path=None, on_change=None):
+    """Build the configured results backend ('json' or 'sqlite')"""
+    backend = (backend or "json").lower()
+    if backend == "json":
+        return JSONResultsStore(output_dir, on_change=on_change)
+    if backend == "sqlite":
+        return SQLiteResultsStore(database_path or Path(output_dir) / "results.sqlite3", on_change=on_change)
+    raise ValueError(f"Unknown results backend: {backend}")
+
+
+def import_json_results(source, target, overwrite=False):
+    """Copy every order from a JSONResultsStore into another store.
+
+    Orders already in the target with identical content are skipped; with
+    ``overwrite`` False, orders that differ are left alone too. Returns counts.
+    """
+    counts = {"imported": 0, "unchanged": 0, "skipped": 0, "failed": 0}
+    for order_id in source.order_ids():
+        try:
+            results, etag = source.read(order_id)
+            if target.exists(order_id):
+                _, target_etag = target.read(order_id)
+                if target_etag == etag:
+                    counts["unchanged"] += 1
+                    continue
+                if not overwrite:
+                    counts["skipped"] += 1
+                    continue
+            target.write(order_id, results)
+            counts["imported"] += 1
+        except Exception as e:
+            print(f"Error importing {order_id}: {str(e)}")
+            counts["failed"] += 1
+    return counts
@@ -0,0 +1,41 @@
+"""Timing of the expensive steps a fresh worker goes through before it can serve."""
+import threading
+import time
+from contextlib import contextmanager
+
+
+class StartupTimings:
+    """Collects named durations (imports, client initialization, index builds)"""
+
+    def __init__(self):
+        self.started = time.time()
+        self._timings = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def measure(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def record(self, name, seconds):
+        with self._lock:
+            self._timings[name] = round(seconds, 4)
+
+    def to_dict(self):
+        with self._lock:
+            timings = dict(self._timings)
+        return {
+            "timings": timings,
+            "total_seconds": round(sum(timings.values()), 4),
+        }
+
+    def report(self):
+        """Print the timings, slowest first"""
+        data = self.to_dict()
+        print("Startup timings:")
+        for name, seconds in sorted(data["timings"].items(), key=lambda item: item[1], reverse=True):
+            print(f"  {name}: {seconds:.3f}s")
+        print(f"  total: {data['total_seconds']:.3f}s")
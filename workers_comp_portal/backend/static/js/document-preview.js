@@ -247,6 +247,11 @@ function formatFileSize(bytes) {
     return parseFloat((bytes / Math.pow(k, i)).toFixed(2)) + ' ' + sizes[i];
 }
 
+// Content-versioned URL from the document listing (cached by the browser), or the plain one
+function documentUrl(doc) {
+    return doc.url || `/api/orders/${currentOrderId}/documents/${encodeURIComponent(doc.name)}`;
+}
+
 // Preview document
 function previewDocument(doc) {
     const previewArea = document.getElementById('preview-area');
@@ -274,7 +279,11 @@ function previewDocument(doc) {
             previewArea.appendChild(container);
             
             // Create PDF viewer
-            const loadingTask = window.pdfjsLib.getDocument(`/api/orders/${currentOrderId}/documents/${doc.name}`);
+            // Range requests let PDF.js fetch only the parts of the file it needs
+            const loadingTask = window.pdfjsLib.getDocument({
+                url: documentUrl(doc),
+                disableAutoFetch: true
+            });
             loadingTask.promise.then(function(pdf) {
                 // Create a PDF viewer container
                 const viewer = document.createElement('div');
@@ -402,14 +411,52 @@ function previewDocument(doc) {
             // Fallback to iframe if PDF.js not available
             const iframe = document.createElement('iframe');
             iframe.className = 'w-full h-full border-0';
-            iframe.src = `/api/orders/${currentOrderId}/documents/${doc.name}`;
+            iframe.src = documentUrl(doc);
             previewArea.innerHTML = '';
             previewArea.appendChild(iframe);
         }
+    } else if (['.tif', '.tiff'].includes(doc.type) && doc.pages_url) {
+        // Browsers can't show TIFFs; show the server-rendered pages, loaded as they scroll into view
+        fetch(doc.pages_url)
+            .then(response => {
+                if (!response.ok) {
+                    throw new Error('Failed to load pages');
+                }
+                return response.json();
+            })
+            .then(data => {
+                const viewer = document.createElement('div');
+                viewer.className = 'h-full overflow-auto';
+                data.pages.forEach(page => {
+                    const pageInfo = document.createElement('div');
+                    pageInfo.className = 'text-center text-sm text-gray-500 my-2';
+                    pageInfo.textContent = `Page ${page.index + 1} of ${data.page_count}`;
+                    
+                    const img = document.createElement('img');
+                    img.className = 'max-w-full h-auto mx-auto';
+                    img.loading = 'lazy';
+                    img.src = page.url;
+                    img.alt = `${doc.name} page ${page.index + 1}`;
+                    
+                    viewer.appendChild(pageInfo);
+                    viewer.appendChild(img);
+                });
+                previewArea.innerHTML = '';
+                previewArea.appendChild(viewer);
+            })
+            .catch(error => {
+                console.error('Error loading TIFF pages:', error);
+                previewArea.innerHTML = `
+                    <div class="flex flex-col items-center justify-center h-full text-red-500">
+                        <p>Error loading document pages</p>
+                        <p class="text-sm mt-1">${error.message}</p>
+                    </div>
+                `;
+            });
     } else if (['.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tif', '.tiff'].includes(doc.type)) {
         const img = document.createElement('img');
         img.className = 'max-w-full h-auto mx-auto';
-        img.src = `/api/orders/${currentOrderId}/documents/${doc.name}`;
+        img.src = documentUrl(doc);
         img.alt = doc.name;
         
         // Error handling for images
@@ -432,12 +479,13 @@ function previewDocument(doc) {
         
         if (doc.type === '.eml') {
             // For email files, fetch the formatted content
-            fetch(`/api/orders/${currentOrderId}/documents/${doc.name}`)
+            fetch(documentUrl(doc))
                 .then(response => response.text())
                 .then(content => {
                     pre.textContent = content.trim() || 'Email content is empty or could not be extracted.';
                     previewArea.innerHTML = '';
                     previewArea.appendChild(pre);
+                    loadEmailAttachments(doc, pre);
                 })
                 .catch(error => {
                     console.error('Error loading email content:', error);
@@ -449,10 +497,14 @@ function previewDocument(doc) {
                     `;
                 });
         } else {
-            // For text files, use OCR text
-            pre.textContent = doc.ocr_text || 'No OCR text available';
+            // For text files, load the OCR text a chunk at a time
             previewArea.innerHTML = '';
             previewArea.appendChild(pre);
+            if (!doc.ocr_available || !doc.ocr_url) {
+                pre.textContent = 'No OCR text available';
+            } else {
+                loadOcrText(doc, pre, 0);
+            }
         }
     } else {
         previewArea.innerHTML = `
@@ -467,6 +519,68 @@ function previewDocument(doc) {
     }
 }
 
+// Add links to an email's attachments below its text
+function loadEmailAttachments(doc, pre) {
+    fetch(`${doc.url.split('?')[0]}/attachments`)
+        .then(response => response.ok ? response.json() : { attachments: [] })
+        .then(data => {
+            if (!data.attachments || data.attachments.length === 0) return;
+
+            const list = document.createElement('div');
+            list.className = 'email-attachments mt-4 pt-2 border-t border-gray-200';
+            const heading = document.createElement('p');
+            heading.className = 'font-semibold mb-1';
+            heading.textContent = 'Open attachment:';
+            list.appendChild(heading);
+
+            data.attachments.forEach(attachment => {
+                const link = document.createElement('a');
+                link.href = attachment.url;
+                link.target = '_blank';
+                link.rel = 'noopener';
+                link.className = 'block text-blue-600 hover:underline';
+                link.textContent = `${attachment.filename} (${Math.ceil(attachment.size / 1024)} KB)`;
+                list.appendChild(link);
+            });
+            pre.appendChild(list);
+        })
+        .catch(error => console.error('Error loading email attachments:', error));
+}
+
+// Append one chunk of a document's OCR text to pre, with a "Load more" button if there is more
+function loadOcrText(doc, pre, offset) {
+    const separator = doc.ocr_url.includes('?') ? '&' : '?';
+    fetch(`${doc.ocr_url}${separator}offset=${offset}`)
+        .then(response => {
+            if (!response.ok) {
+                throw new Error(`Failed to load OCR text (${response.status})`);
+            }
+            return response.json();
+        })
+        .then(data => {
+            const existing = pre.querySelector('.load-more-ocr');
+            if (existing) existing.remove();
+            pre.appendChild(document.createTextNode(data.text));
+
+            if (data.next_offset !== null && data.next_offset !== undefined) {
+                const more = document.createElement('button');
+                more.className = 'load-more-ocr block mt-2 px-3 py-1 text-xs bg-gray-100 hover:bg-gray-200 rounded';
+                more.textContent = `Load more (${data.next_offset.toLocaleString()} of ${data.total_chars.toLocaleString()} characters shown)`;
+                more.onclick = () => {
+                    more.disabled = true;
+                    loadOcrText(doc, pre, data.next_offset);
+                };
+                pre.appendChild(more);
+            }
+        })
+        .catch(error => {
+            console.error('Error loading OCR text:', error);
+            if (!pre.textContent) {
+                pre.textContent = 'No OCR text available';
+            }
+        });
+}
+
 // Function to show notifications
 function showNotification(type, title, message) {
     const notification = document.getElementById('notification');
@@ -1,11 +1,17 @@
 // Global variables
 let allOrders = [];
+let ordersNextCursor = null;
+let orderSearchTimer = null;
+let orderEvents = null;
+const ORDERS_PAGE_SIZE = 100;
 let selectedOrderId = null;
+let selectedOrderEtag = null;
 let isEditing = false;
 
 // Document ready handler
 document.addEventListener('DOMContentLoaded', function() {
     loadOrders();
+    connectOrderEvents();
     
     // Check for selected order from query params
     const urlParams = new URLSearchParams(window.location.search);
@@ -342,11 +348,15 @@ function saveChanges(orderId) {
         }
     }
     
+    // Send the version we loaded so the server rejects the save if someone else changed the order
+    const headers = { 'Content-Type': 'application/json' };
+    if (selectedOrderEtag) {
+        headers['If-Match'] = selectedOrderEtag;
+    }
+    
     fetch(`/api/orders/${orderId}/update`, {
         method: 'POST',
-        headers: {
-            'Content-Type': 'application/json'
-        },
+        headers: headers,
         body: JSON.stringify({
             extracted_data: extractedData
         })
@@ -421,13 +431,31 @@ function packageForCRM(orderId) {
     });
 }
 
-// Function to load orders
+// Build the order list URL for one page, using the current search text
+function ordersPageUrl(cursor) {
+    const params = new URLSearchParams({
+        limit: ORDERS_PAGE_SIZE,
+        fields: 'order_id,status,patient_name,processed_date'
+    });
+    const searchInput = document.getElementById('search-input');
+    const searchTerm = searchInput ? searchInput.value.trim() : '';
+    if (searchTerm) {
+        params.set('q', searchTerm);
+    }
+    if (cursor) {
+        params.set('cursor', cursor);
+    }
+    return `/api/orders?${params.toString()}`;
+}
+
+// Function to load orders (first page)
 function loadOrders() {
-    fetch('/api/orders')
+    fetch(ordersPageUrl())
         .then(response => response.json())
         .then(data => {
-            allOrders = data;
-            renderOrders(data);
+            allOrders = data.orders;
+            ordersNextCursor = data.next_cursor;
+            renderOrders(allOrders);
         })
         .catch(error => {
             console.error('Error loading orders:', error);
@@ -471,9 +499,94 @@ function renderOrders(orders) {
         `;
     });
     
+    if (ordersNextCursor) {
+        html += `
+            <button class="w-full py-2 text-sm text-blue-600 hover:underline" onclick="loadMoreOrders()">
+                Load more orders
+            </button>
+        `;
+    }
+    
     container.innerHTML = html;
 }
 
+// Function to append the next page of orders
+function loadMoreOrders() {
+    if (!ordersNextCursor) {
+        return;
+    }
+    fetch(ordersPageUrl(ordersNextCursor))
+        .then(response => response.json())
+        .then(data => {
+            allOrders = allOrders.concat(data.orders);
+            ordersNextCursor = data.next_cursor;
+            renderOrders(allOrders);
+        })
+        .catch(error => {
+            console.error('Error loading more orders:', error);
+            showNotification('error', 'Error', 'Failed to load more orders');
+        });
+}
+
+// Order events pushed by the server (the browser reconnects and resumes on its own)
+const ORDER_EVENT_TYPES = [
+    'processing.queued', 'processing.started', 'processing.finished', 'processing.failed',
+    'order.updated', 'order.approved', 'order.packaged', 'order.provider_selected'
+];
+
+function connectOrderEvents() {
+    if (!window.EventSource) {
+        return;
+    }
+    orderEvents = new EventSource('/api/events');
+    ORDER_EVENT_TYPES.forEach(type => {
+        orderEvents.addEventListener(type, e => handleOrderEvent(JSON.parse(e.data)));
+    });
+    
+    // The browser gives up on a refused stream (all stream slots taken, see EVENT_STREAM_MAX_CLIENTS);
+    // the page keeps working without live updates and tries again in a minute
+    orderEvents.addEventListener('error', () => {
+        if (orderEvents.readyState === EventSource.CLOSED) {
+            setTimeout(connectOrderEvents, 60000);
+        }
+    });
+    
+    // We missed events (slow connection or long disconnect); reload what's on screen
+    orderEvents.addEventListener('resync', () => {
+        loadOrders();
+        if (selectedOrderId && !isEditing) {
+            loadOrderDetails(selectedOrderId);
+        }
+    });
+}
+
+// Apply one order event to the sidebar and, if it's open, the order details
+function handleOrderEvent(event) {
+    if (event.order) {
+        const index = allOrders.findIndex(order => order.order_id === event.order_id);
+        if (index !== -1) {
+            allOrders[index] = Object.assign({}, allOrders[index], {
+                status: event.order.status,
+                patient_name: event.order.patient_name,
+                processed_date: event.order.processed_date
+            });
+            renderOrders(allOrders);
+        }
+    }
+    
+    if (event.order_id !== selectedOrderId || isEditing) {
+        return;
+    }
+    if (event.type === 'processing.queued' || event.type === 'processing.started') {
+        return;
+    }
+    // Skip the reload if we already show this version
+    if (event.etag && `"${event.etag}"` === selectedOrderEtag) {
+        return;
+    }
+    loadOrderDetails(selectedOrderId);
+}
+
 // Function to load order details
 function loadOrderDetails(orderId) {
     selectedOrderId = orderId;
@@ -507,7 +620,12 @@ function loadOrderDetails(orderId) {
     
     // Fetch order details
     fetch(`/api/orders/${orderId}`)
-        .then(response => response.json())
+        .then(response => {
+            // Compressed responses carry the weak form (W/"..."); keep the bare tag for If-Match and event checks
+            const etag = response.headers.get('ETag');
+            selectedOrderEtag = etag ? etag.replace(/^W\//, '') : null;
+            return response.json();
+        })
         .then(data => {
             renderOrderDetails(data);
         })
@@ -764,11 +882,7 @@ function renderExtractedData(order) {
 
 // Filter orders
 function filterOrders() {
-    const searchTerm = document.getElementById('search-input').value.toLowerCase();
-    const filteredOrders = allOrders.filter(order => 
-        order.order_id.toLowerCase().includes(searchTerm) ||
-        (order.patient_name && order.patient_name.toLowerCase().includes(searchTerm))
-    );
-    
-    renderOrders(filteredOrders);
+    // Search runs on the server; wait for the user to stop typing
+    clearTimeout(orderSearchTimer);
+    orderSearchTimer = setTimeout(loadOrders, 250);
 }
\ No newline at end of file
@@ -23,7 +23,8 @@ function processOrder(orderId) {
         }
         return response.json();
     })
-    .then(data => {
+    .then(data => waitForJob(data.status_url))
+    .then(job => {
         // Re-enable button
         if (processBtn) {
             processBtn.disabled = false;
@@ -34,8 +35,7 @@ function processOrder(orderId) {
             `;
         }
         
-        // Reload orders and details
-        loadOrders();
+        // The sidebar is updated by the order event stream
         loadOrderDetails(orderId);
         
         // Show success notification
@@ -59,6 +59,29 @@ function processOrder(orderId) {
     });
 }
 
+// Poll a processing job until it finishes; resolves with the job or rejects with its error
+function waitForJob(statusUrl, intervalMs = 2000) {
+    return new Promise((resolve, reject) => {
+        const poll = () => {
+            fetch(statusUrl)
+                .then(response => response.json())
+                .then(job => {
+                    if (job.status === 'succeeded') {
+                        resolve(job);
+                    } else if (job.status === 'failed') {
+                        reject(new Error(job.error || 'Failed to process order'));
+                    } else if (job.error) {
+                        reject(new Error(job.error));
+                    } else {
+                        setTimeout(poll, intervalMs);
+                    }
+                })
+                .catch(reject);
+        };
+        poll();
+    });
+}
+
 // Enhanced order approval
 function approveOrder(orderId) {
     // Show loading state
@@ -85,8 +108,7 @@ function approveOrder(orderId) {
         return response.json();
     })
     .then(data => {
-        // Reload orders and details
-        loadOrders();
+        // The sidebar is updated by the order event stream
         loadOrderDetails(orderId);
         
         // Show success notification
@@ -0,0 +1,163 @@
+"""Running dashboard statistics, updated as orders change instead of recomputed per request."""
+import datetime
+import threading
+
+# Days of per-day counters to keep
+DEFAULT_RETENTION_DAYS = 365
+
+
+def _day(value):
+    """'YYYY-MM-DD' from a stored date string, or None"""
+    if not value or len(value) < 10:
+        return None
+    return value[:10]
+
+
+def _empty_day():
+    return {"received": 0, "processed": 0, "approved": 0, "errors": 0}
+
+
+class OrderStats:
+    """Counters per status, per day and per pipeline stage.
+
+    The order index reports every entry change through ``entry_changed``:
+    the old entry's status and dates are subtracted and the new one's added,
+    so the counters always match the index without rescanning it. The
+    pipeline reports stage timings and failures. The counters are saved in
+    the order index file, so both are always restored (or rebuilt) together.
+    """
+
+    def __init__(self, retention_days=DEFAULT_RETENTION_DAYS):
+        self.retention_days = retention_days
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.by_status = {}
+        self.days = {}
+        self.stages = {}
+
+    # Persistence (called by OrderIndex)
+
+    def load(self, data):
+        with self._lock:
+            self._reset()
+            if data:
+                self.by_status = dict(data.get("by_status", {}))
+                self.days = {day: dict(_empty_day(), **counts) for day, counts in data.get("days", {}).items()}
+                self.stages = {stage: dict(timing) for stage, timing in data.get("stages", {}).items()}
+
+    def to_dict(self):
+        with self._lock:
+            self._prune()
+            return {
+                "by_status": dict(self.by_status),
+                "days": {day: dict(counts) for day, counts in self.days.items()},
+                "stages": {stage: dict(timing) for stage, timing in self.stages.items()},
+            }
+
+    def _prune(self):
+        cutoff = (datetime.date.today() - datetime.timedelta(days=self.retention_days)).isoformat()
+        for day in [day for day in self.days if day < cutoff]:
+            del self.days[day]
+
+    # Updates
+
+    def _add_day(self, day, counter, amount):
+        if day is None:
+            return
+        counts = self.days.get(day)
+        if counts is None:
+            if amount < 0:
+                return
+            counts = self.days[day] = _empty_day()
+        counts[counter] = max(0, counts[counter] + amount)
+
+    def _apply(self, entry, sign):
+        status = entry.get("status") or "Pending"
+        count = self.by_status.get(status, 0) + sign
+        if count > 0:
+            self.by_status[status] = count
+        else:
+            self.by_status.pop(status, None)
+        self._add_day(_day(entry.get("processed_date")), "processed", sign)
+        self._add_day(_day(entry.get("approved_date")), "approved", sign)
+
+    def entry_changed(self, old, new, received_on=None):
+        """Move counts from an order's old index entry to its new one (either may be None).
+
+        ``received_on`` ('YYYY-MM-DD') is the day a newly seen order folder arrived.
+        """
+        with self._lock:
+            if old is not None:
+                self._apply(old, -1)
+            if new is not None:
+                self._apply(new, 1)
+            if received_on and old is None and new is not None:
+                self._add_day(received_on, "received", 1)
+
+    def record_stage(self, stage, seconds):
+        with self._lock:
+            timing = self.stages.setdefault(stage, {"count": 0, "total_seconds": 0.0})
+            timing["count"] += 1
+            timing["total_seconds"] += seconds
+
+    def record_error(self, stage):
+        with self._lock:
+            self._add_day(datetime.date.today().isoformat(), "errors", 1)
+            timing = self.stages.setdefault(stage, {"count": 0, "total_seconds": 0.0})
+            timing["errors"] = timing.get("errors", 0) + 1
+
+    # Queries
+
+    def status_count(self, predicate):
+        """Orders whose (lower-cased) status satisfies predicate"""
+        with self._lock:
+            return sum(count for status, count in self.by_status.items() if predicate(status.lower()))
+
+    def total(self):
+        with self._lock:
+            return sum(self.by_status.values())
+
+    def timeline(self, days=7, today=None):
+        """(labels, processed, approved, errors) for the last ``days`` days, oldest first"""
+        today = today or datetime.date.today()
+        labels, processed, approved, errors = [], [], [], []
+        with self._lock:
+            for offset in range(days - 1, -1, -1):
+                day = today - datetime.timedelta(days=offset)
+                counts = self.days.get(day.isoformat()) or _empty_day()
+                labels.append(day.strftime('%b %d'))
+                processed.append(counts["processed"])
+                approved.append(counts["approved"])
+                errors.append(counts["errors"])
+        return labels, processed, approved, errors
+
+    def received_on(self, day=None):
+        day = (day or datetime.date.today()).isoformat()
+        with self._lock:
+            return (self.days.get(day) or _empty_day())["received"]
+
+    def stage_averages(self):
+        """Average seconds per pipeline stage, with run and error counts"""
+        with self._lock:
+            return {
+                stage: {
+                    "runs": timing["count"],
+                    "errors": timing.get("errors", 0),
+                    "average_seconds": round(timing["total_seconds"] / timing["count"], 3) if timing["count"] else None,
+                }
+                for stage, timing in self.stages.items()
+            }
+
+    def summary(self, days=7):
+        labels, processed, approved, errors = self.timeline(days)
+        with self._lock:
+            by_status = dict(self.by_status)
+        return {
+            "total_orders": sum(by_status.values()),
+            "by_status": by_status,
+            "new_orders_today": self.received_on(),
+            "timeline": {"labels": labels, "processed": processed, "approved": approved, "errors": errors},
+            "stages": self.stage_averages(),
+        }
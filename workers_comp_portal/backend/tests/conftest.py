@@ -0,0 +1,32 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+# The backend modules, and the benchmark fakes standing in for process/llm_client/extract
+for path in (BACKEND_DIR, BACKEND_DIR / "benchmarks", BACKEND_DIR / "benchmarks" / "fakes"):
+    sys.path.insert(0, str(path))
+
+import synthetic
+
+
+@pytest.fixture
+def data_dirs(tmp_path, monkeypatch):
+    """Empty orders/results/ocr folders, with the fakes pointed at them"""
+    dirs = {name: tmp_path / name for name in ("orders", "results", "ocr")}
+    for path in dirs.values():
+        path.mkdir()
+    monkeypatch.setenv("OUTPUT_DIR", str(dirs["results"]))
+    monkeypatch.setenv("OCR_DIR", str(dirs["ocr"]))
+    return dirs
+
+
+def make_order(orders_dir, order_id, text=None):
+    """An order folder with a referral PDF and a fax cover, like the synthetic data set"""
+    extracted = synthetic.extraction(synthetic.rng_for("test", order_id))
+    folder = orders_dir / order_id
+    folder.mkdir()
+    (folder / "referral.pdf").write_bytes(synthetic.minimal_pdf(text or synthetic.referral_text(order_id, extracted)))
+    (folder / "fax_cover.txt").write_text(f"FAX COVER\nRe: {order_id}\n", encoding='utf-8')
+    return folder
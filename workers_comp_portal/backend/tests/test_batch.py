@@ -0,0 +1,93 @@
+import threading
+
+import llm_client
+import process
+import pytest
+
+from batch import BatchRun
+from conftest import make_order
+from jobs import JobQueue
+from pipeline import OrderPipeline
+from results_store import JSONResultsStore
+
+ORDER_IDS = [f"ORD-{n}" for n in range(1, 7)]
+
+
+class Concurrency:
+    """Wraps a stage function, counting calls and the most calls running at once"""
+
+    def __init__(self, fn):
+        self.fn = fn
+        self.calls = self.running = self.peak = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, *args, **kwargs):
+        with self.lock:
+            self.calls += 1
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+        try:
+            return self.fn(*args, **kwargs)
+        finally:
+            with self.lock:
+                self.running -= 1
+
+
+@pytest.fixture
+def pipeline(data_dirs):
+    for order_id in ORDER_IDS:
+        make_order(data_dirs["orders"], order_id)
+    return OrderPipeline(data_dirs["orders"],
+                         initialize_documentai=lambda: None,
+                         process_order_folder=Concurrency(process.process_order_folder),
+                         format_llm_request=process.format_llm_request,
+                         call_llm_api=Concurrency(llm_client.call_llm_api),
+                         save_results=process.save_results,
+                         results_store=JSONResultsStore(data_dirs["results"]))
+
+
+def test_batch_limits_stages_and_skips_unchanged_orders(pipeline):
+    summary = BatchRun(pipeline, ORDER_IDS, ocr_workers=1, llm_workers=2).run()
+    assert summary["throughput"]["succeeded"] == len(ORDER_IDS)
+    assert pipeline.process_order_folder.peak == 1
+    assert pipeline.call_llm_api.peak <= 2
+    assert all(order["llm_seconds"] is not None for order in summary["orders"])
+
+    # Same documents: the fingerprints stop each order before the LLM
+    summary = BatchRun(pipeline, ORDER_IDS).run()
+    assert summary["throughput"]["succeeded"] == len(ORDER_IDS)
+    assert pipeline.call_llm_api.calls == len(ORDER_IDS)
+    assert all(order["llm_seconds"] is None for order in summary["orders"])
+
+
+def test_batch_runs_orders_as_jobs_and_skips_active_ones(pipeline):
+    release = threading.Event()
+    jobs = JobQueue(lambda order_id: release.wait(5), max_workers=1)
+    queued, _ = jobs.submit("ORD-1")
+
+    batch = BatchRun(pipeline, ORDER_IDS, job_queue=jobs)
+    summary = batch.run()
+    release.set()
+    orders = {order["order_id"]: order for order in summary["orders"]}
+    assert orders["ORD-1"]["status"] == "skipped"
+    assert orders["ORD-1"]["job_id"] == queued.job_id
+    assert summary["throughput"]["skipped"] == 1
+    assert summary["throughput"]["succeeded"] == len(ORDER_IDS) - 1
+    batch_jobs = [job for job in jobs.list_jobs() if job.source == f"batch:{batch.batch_id}"]
+    assert len(batch_jobs) == len(ORDER_IDS) - 1
+
+
+def test_order_in_a_batch_is_not_queued_again(pipeline):
+    jobs = JobQueue(lambda order_id: None)
+    seen = {}
+    run = pipeline.run
+
+    def run_and_resubmit(order_id, **options):
+        seen[order_id] = jobs.submit(order_id)
+        return run(order_id, **options)
+    pipeline.run = run_and_resubmit
+
+    summary = BatchRun(pipeline, ["ORD-1"], job_queue=jobs).run()
+    job, created = seen["ORD-1"]
+    assert not created
+    assert job.job_id == summary["orders"][0]["job_id"]
@@ -0,0 +1,64 @@
+import gzip
+
+import pytest
+from flask import Flask, Response, request
+
+from compression import choose_encoding, compress_response
+
+BODY = "From: someone@example.com\n\n" + "Lorem ipsum dolor sit amet. " * 200
+
+
+@pytest.fixture
+def client():
+    app = Flask(__name__)
+
+    @app.route("/email")
+    def email():
+        # Like the .eml route: strong content-hash ETag, 304 on a (weak) match
+        if request.if_none_match.contains_weak("abc123"):
+            response = Response(status=304)
+        else:
+            response = Response(BODY, mimetype="text/plain")
+        response.set_etag("abc123")
+        return response
+
+    @app.route("/small")
+    def small():
+        return {"ok": True}
+
+    @app.after_request
+    def compress(response):
+        return compress_response(response, request.headers.get("Accept-Encoding"))
+
+    return app.test_client()
+
+
+def test_accept_encoding_negotiation():
+    assert choose_encoding("gzip, deflate") == "gzip"
+    assert choose_encoding("gzip;q=0, identity") is None
+    assert choose_encoding("*") == "gzip"
+    assert choose_encoding(None) is None
+
+
+def test_large_text_is_gzipped_with_weak_etag(client):
+    response = client.get("/email", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert response.headers["ETag"] == 'W/"abc123"'
+    assert "Accept-Encoding" in response.headers["Vary"]
+    assert gzip.decompress(response.data).decode() == BODY
+
+
+def test_weak_etag_from_compressed_response_revalidates(client):
+    etag = client.get("/email", headers={"Accept-Encoding": "gzip"}).headers["ETag"]
+    response = client.get("/email", headers={"Accept-Encoding": "gzip", "If-None-Match": etag})
+    assert response.status_code == 304
+    # And the strong form from an uncompressed response
+    response = client.get("/email", headers={"If-None-Match": '"abc123"'})
+    assert response.status_code == 304
+
+
+def test_small_or_unaccepted_responses_are_left_alone(client):
+    assert "Content-Encoding" not in client.get("/small", headers={"Accept-Encoding": "gzip"}).headers
+    response = client.get("/email")
+    assert "Content-Encoding" not in response.headers
+    assert response.headers["ETag"] == '"abc123"'
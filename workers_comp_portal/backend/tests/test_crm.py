@@ -0,0 +1,118 @@
+import io
+import json
+import time
+import zipfile
+
+import pytest
+
+import synthetic
+from crm import CRMExport, build_crm_payload
+from results_store import JSONResultsStore
+
+ORDER_IDS = [f"ORD-{n}" for n in range(1, 8)]
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = JSONResultsStore(tmp_path / "results")
+    for order_id in ORDER_IDS:
+        rng = synthetic.rng_for("crm", order_id)
+        store.write(order_id, synthetic.results_for(order_id, synthetic.extraction(rng), rng=rng, status="Approved"))
+    return store
+
+
+def test_payload_drops_missing_values():
+    results = {"extracted_data": {
+        "patient_info": {"patient_name": {"value": "Jane"}, "phone": {"value": "not found"}},
+        "procedures": [{"cpt_code": {"value": "73721"}, "body_part": {"value": None}}],
+    }}
+    payload = build_crm_payload("ORD-1", results)
+    assert payload["patient_info"] == {"patient_name": "Jane"}
+    assert payload["procedures"] == [{"cpt_code": "73721"}]
+
+
+def test_ndjson_export_marks_orders_ready(store, tmp_path):
+    export = CRMExport(store, ORDER_IDS, tmp_path / "exports", workers=3)
+    lines = b"".join(export.stream()).decode('utf-8').splitlines()
+    assert [json.loads(line)["order_id"] for line in lines] == ORDER_IDS
+    assert export.state == "completed"
+    assert all(store.read(order_id)[0]["status"] == "Ready for CRM" for order_id in ORDER_IDS)
+
+
+def test_zip_export_has_a_file_per_order(store, tmp_path):
+    export = CRMExport(store, ORDER_IDS, tmp_path / "exports", fmt="zip", mark_ready=False)
+    bundle = zipfile.ZipFile(io.BytesIO(b"".join(export.stream())))
+    assert sorted(bundle.namelist()) == sorted([f"{o}_crm.json" for o in ORDER_IDS] + ["manifest.json"])
+    assert json.loads(bundle.read("manifest.json"))["delivered"] == len(ORDER_IDS)
+    assert store.read(ORDER_IDS[0])[0]["status"] == "Approved"
+
+
+def test_interrupted_export_resumes_with_remaining_orders(store, tmp_path):
+    checkpoint_dir = tmp_path / "exports"
+    export = CRMExport(store, ORDER_IDS, checkpoint_dir, workers=2)
+    stream = export.stream()
+    delivered = [json.loads(next(stream))["order_id"] for _ in range(3)]
+    stream.close()  # client went away
+    assert CRMExport.load_checkpoint(checkpoint_dir, export.export_id)["state"] == "interrupted"
+
+    resumed = CRMExport.resume(store, checkpoint_dir, export.export_id)
+    rest = [json.loads(line)["order_id"] for line in b"".join(resumed.stream()).decode('utf-8').splitlines()]
+    # The order sent when the client left may or may not have been recorded; nothing is lost
+    assert set(delivered) | set(rest) == set(ORDER_IDS)
+    assert rest[-1] == ORDER_IDS[-1]
+    assert CRMExport.load_checkpoint(checkpoint_dir, export.export_id)["state"] == "completed"
+
+
+def test_resume_unknown_export(store, tmp_path):
+    assert CRMExport.resume(store, tmp_path, "doesnotexist") is None
+    assert CRMExport.resume(store, tmp_path, "../etc") is None
+
+
+def test_checkpoint_is_saved_every_few_orders(store, tmp_path):
+    export = CRMExport(store, ORDER_IDS, tmp_path / "exports", mark_ready=False,
+                       checkpoint_every=3, checkpoint_seconds=3600)
+    saves = []
+    save_checkpoint = export.save_checkpoint
+    export.save_checkpoint = lambda: (saves.append(len(export.done)), save_checkpoint())
+    b"".join(export.stream())
+    # At the start, after orders 3 and 6, and at the end
+    assert saves == [0, 3, 6, 7]
+    assert sorted(CRMExport.load_checkpoint(tmp_path / "exports", export.export_id)["done"]) == sorted(ORDER_IDS)
+
+
+def test_resumed_zip_export_is_the_full_bundle(store, tmp_path):
+    checkpoint_dir = tmp_path / "exports"
+    export = CRMExport(store, ORDER_IDS, checkpoint_dir, fmt="zip", workers=2)
+    stream = export.stream()
+    for _ in range(3):
+        next(stream)
+    stream.close()
+    delivered = CRMExport.load_checkpoint(checkpoint_dir, export.export_id)["done"]
+    assert delivered
+
+    marked = []
+    resumed = CRMExport.resume(store, checkpoint_dir, export.export_id,
+                               on_packaged=lambda order_id, etag: marked.append(order_id))
+    bundle = zipfile.ZipFile(io.BytesIO(b"".join(resumed.stream())))
+    assert sorted(bundle.namelist()) == sorted([f"{o}_crm.json" for o in ORDER_IDS] + ["manifest.json"])
+    # Orders delivered before the interruption aren't marked ready twice
+    assert sorted(marked + delivered) == sorted(ORDER_IDS)
+    assert json.loads(bundle.read("manifest.json"))["delivered"] == len(ORDER_IDS)
+
+
+def test_sweep_deletes_old_checkpoints(store, tmp_path):
+    checkpoint_dir = tmp_path / "exports"
+    completed = CRMExport(store, ORDER_IDS, checkpoint_dir, mark_ready=False)
+    b"".join(completed.stream())
+    interrupted = CRMExport(store, ORDER_IDS, checkpoint_dir, mark_ready=False)
+    stream = interrupted.stream()
+    next(stream)
+    stream.close()
+    now = time.time() + 2 * 3600
+
+    assert CRMExport.sweep_checkpoints(checkpoint_dir, 3 * 3600, 3 * 3600, now=now) == 0
+    assert CRMExport.sweep_checkpoints(checkpoint_dir, 3600, 3 * 3600, now=now) == 1
+    assert CRMExport.load_checkpoint(checkpoint_dir, completed.export_id) is None
+    assert CRMExport.load_checkpoint(checkpoint_dir, interrupted.export_id) is not None
+    assert CRMExport.sweep_checkpoints(checkpoint_dir, 3600, 3600, now=now) == 1
+    assert CRMExport.sweep_checkpoints(tmp_path / "missing", 0, 0) == 0
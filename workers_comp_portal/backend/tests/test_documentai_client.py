@@ -0,0 +1,33 @@
+from documentai_client import DocumentAIClientCache, processor_health_check
+
+
+class Client:
+    def __init__(self, error=None):
+        self.error = error
+        self.fetched = []
+
+    def get_processor(self, name, timeout=None):
+        self.fetched.append(name)
+        if self.error:
+            raise self.error
+
+
+def test_healthy_fetches_the_processor():
+    client = Client()
+    cache = DocumentAIClientCache(lambda: client, health_check=processor_health_check("projects/p/processors/ocr"))
+    assert cache.healthy()
+    assert client.fetched == ["projects/p/processors/ocr"]
+
+
+def test_unreachable_processor_is_unhealthy():
+    cache = DocumentAIClientCache(lambda: Client(PermissionError("403 Permission denied on processor")),
+                                  health_check=processor_health_check("projects/p/processors/ocr"))
+    assert not cache.healthy()
+    assert "Permission denied" in cache.stats()["last_error"]
+
+
+def test_without_a_check_healthy_means_the_client_builds():
+    def fail():
+        raise RuntimeError("Could not automatically determine credentials")
+    assert DocumentAIClientCache(lambda: Client()).healthy()
+    assert not DocumentAIClientCache(fail).healthy()
@@ -0,0 +1,38 @@
+import zlib
+
+import synthetic
+from documents import OCRText, pdf_page_count
+
+
+def object_stream_pdf(pages, filters=b"/FlateDecode"):
+    """A PDF 1.5 file whose page objects are all inside one compressed object stream"""
+    objects = b" ".join(b"<< /Type /Page /Parent 2 0 R >>" for _ in range(pages))
+    data = zlib.compress(objects) if filters == b"/FlateDecode" else objects
+    return (b"%%PDF-1.5\n1 0 obj << /Type /Catalog /Pages 2 0 R >> endobj\n"
+            b"2 0 obj << /Type /Pages /Count %d >> endobj\n"
+            b"5 0 obj << /Type /ObjStm /N %d /First 0 /Filter %s /Length %d >>\nstream\n%s\nendstream\nendobj\n%%%%EOF\n"
+            % (pages, pages, filters, len(data), data))
+
+
+def test_pdf_page_count(tmp_path):
+    path = tmp_path / "plain.pdf"
+    path.write_bytes(synthetic.minimal_pdf("text", pages=3))
+    assert pdf_page_count(path) == 3
+
+    path.write_bytes(object_stream_pdf(4))
+    assert pdf_page_count(path) == 4
+
+    # An object stream we can't decode: unknown, not a wrong count
+    path.write_bytes(object_stream_pdf(4, filters=b"/LZWDecode"))
+    assert pdf_page_count(path) is None
+
+
+def test_ocr_page_is_capped_with_a_continuation_offset():
+    ocr = OCRText("a" * 250 + "\f" + "second page", "digest")
+    assert ocr.page_count == 2
+    assert ocr.page(1) == "a" * 250
+    assert ocr.page(1, 0, 100) == "a" * 100
+    assert ocr.page(1, 200, 100) == "a" * 50
+    assert ocr.page(1, 300, 100) == ""
+    assert ocr.page(2, 0, 100) == "second page"
+    assert ocr.page_length(1) == 250
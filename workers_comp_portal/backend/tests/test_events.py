@@ -0,0 +1,40 @@
+import pytest
+
+from events import EventBroker, TooManySubscribersError, RESYNC
+
+
+def test_subscriber_limit_frees_slots_on_unsubscribe():
+    broker = EventBroker(max_subscribers=2)
+    first = broker.subscribe()
+    broker.subscribe()
+    with pytest.raises(TooManySubscribersError):
+        broker.subscribe()
+    broker.unsubscribe(first)
+    broker.subscribe()
+
+
+def test_stream_ends_and_releases_its_slot():
+    now = [0.0]
+    broker = EventBroker(max_subscribers=1, heartbeat=0.01, max_stream_seconds=10)
+    subscription = broker.subscribe()
+    broker.publish("order.updated", "ORD-1")
+    stream = broker.stream(subscription, clock=lambda: now[0])
+    assert next(stream).startswith("retry:")
+    assert "event: order.updated" in next(stream)
+    now[0] = 11.0
+    assert list(stream) == []
+    assert broker.stats()["subscribers"] == 0
+
+
+def test_reconnect_gets_missed_events_or_resync():
+    broker = EventBroker(history=3)
+    for n in range(5):
+        broker.publish("order.updated", f"ORD-{n}")
+    subscription = broker.subscribe(last_event_id=3)
+    assert [subscription.events.get_nowait()["id"] for _ in range(2)] == [4, 5]
+
+    too_old = broker.subscribe(last_event_id=0)
+    assert too_old.overflowed
+    stream = broker.stream(too_old)
+    next(stream)
+    assert f"event: {RESYNC}" in next(stream)
@@ -0,0 +1,95 @@
+import copy
+
+from incremental import merge_fields, merge_reprocessed
+
+
+def field(value):
+    return {"value": value, "confidence": 0.9}
+
+
+def extraction(name="Jane Doe", claim="WC1", code="73721"):
+    return {
+        "patient_info": {"patient_name": field(name), "claim_number": field(claim)},
+        "procedures": [{"cpt_code": field(code)}],
+    }
+
+
+def saved(extracted, **fields):
+    """Results as save_results writes them"""
+    results = {"order_id": "ORD-1", "status": "Processed", "processed_date": "2024-05-01",
+               "extracted_data": copy.deepcopy(extracted)}
+    results.update(fields)
+    return results
+
+
+def reprocessed(previous, extracted, **fields):
+    """Previous results after a reprocess that extracted ``extracted``"""
+    return merge_reprocessed(previous, saved(extracted, **fields))
+
+
+def test_merge_fields_keeps_edits_and_takes_new_values():
+    base = {"a": 1, "b": 2, "c": 3}
+    ours = {"a": 10, "b": 2, "c": 3}      # a edited by hand
+    theirs = {"a": 1, "b": 20, "c": 30}   # model changed b and c
+    merged, conflicts = merge_fields(base, ours, theirs)
+    assert merged == {"a": 10, "b": 20, "c": 30}
+    assert conflicts == []
+
+
+def test_merge_fields_reports_conflicts():
+    merged, conflicts = merge_fields({"a": {"x": 1}}, {"a": {"x": 2}}, {"a": {"x": 3}})
+    assert merged == {"a": {"x": 2}}
+    assert conflicts == ["a.x"]
+
+
+def test_first_run_records_baseline():
+    merged, conflicts = merge_reprocessed(None, saved(extraction()))
+    assert merged["pipeline"]["extracted_baseline"] == extraction()
+    assert conflicts == []
+
+
+def test_edits_survive_reprocessing():
+    first, _ = merge_reprocessed(None, saved(extraction()))
+    first["extracted_data"]["patient_info"]["patient_name"] = field("Jane Q. Doe")
+    first["last_edited"] = "2024-05-02"
+    first["selected_provider"] = {"provider_id": "PRV-1"}
+
+    merged, conflicts = reprocessed(first, extraction(claim="WC2"))
+    info = merged["extracted_data"]["patient_info"]
+    assert info["patient_name"]["value"] == "Jane Q. Doe"
+    assert info["claim_number"]["value"] == "WC2"
+    assert merged["selected_provider"] == {"provider_id": "PRV-1"}
+    assert conflicts == []
+
+
+def test_reviewed_status_kept_when_extraction_unchanged():
+    first, _ = merge_reprocessed(None, saved(extraction()))
+    first.update(status="Approved", approved_date="2024-05-02")
+
+    merged, _ = reprocessed(first, extraction())
+    assert merged["status"] == "Approved"
+    assert merged["approved_date"] == "2024-05-02"
+    assert "review_reset" not in merged["pipeline"]
+
+
+def test_reviewed_status_reset_when_extraction_changes():
+    first, _ = merge_reprocessed(None, saved(extraction()))
+    first.update(status="Ready for CRM", approved_date="2024-05-02", crm_ready_date="2024-05-03")
+
+    merged, _ = reprocessed(first, extraction(code="72148"))
+    assert merged["status"] == "Processed"
+    assert "approved_date" not in merged
+    assert "crm_ready_date" not in merged
+    assert merged["pipeline"]["review_reset"]["previous_status"] == "Ready for CRM"
+
+
+def test_reviewed_status_reset_when_new_results_have_no_status():
+    first, _ = merge_reprocessed(None, saved(extraction()))
+    first.update(status="Approved", approved_date="2024-05-02")
+
+    new = saved(extraction(name="John Roe"))
+    del new["status"]
+    merged, _ = merge_reprocessed(first, new)
+    assert merged["status"] == "Processed"
+    assert "approved_date" not in merged
+    assert merged["pipeline"]["review_reset"]["previous_status"] == "Approved"
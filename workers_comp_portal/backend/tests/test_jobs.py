@@ -0,0 +1,81 @@
+import threading
+
+import pytest
+
+from jobs import JobQueue, QueueFullError, PRIORITY_HIGH, PRIORITY_LOW, SUCCEEDED, FAILED
+
+
+class BlockingRunner:
+    """Runner that records the orders it ran and holds the first one until released"""
+
+    def __init__(self):
+        self.ran = []
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def __call__(self, order_id, **options):
+        self.ran.append(order_id)
+        self.started.set()
+        self.release.wait(5)
+        return {"order_id": order_id, **options}
+
+
+def test_duplicate_submission_returns_active_job():
+    runner = BlockingRunner()
+    jobs = JobQueue(runner, max_workers=1)
+    first, created = jobs.submit("ORD-1")
+    second, created_again = jobs.submit("ORD-1")
+    assert created and not created_again
+    assert second is first
+
+    runner.release.set()
+    assert first.done.wait(5)
+    assert first.status == SUCCEEDED
+    assert runner.ran == ["ORD-1"]
+
+    # Once finished, the order can be queued again
+    third, created = jobs.submit("ORD-1")
+    assert created and third is not first
+    assert third.done.wait(5)
+
+
+def test_jobs_run_by_priority_then_submission_order():
+    runner = BlockingRunner()
+    jobs = JobQueue(runner, max_workers=1)
+    blocker, _ = jobs.submit("ORD-0")
+    assert runner.started.wait(5)
+
+    low, _ = jobs.submit("ORD-LOW", priority=PRIORITY_LOW)
+    normal_a, _ = jobs.submit("ORD-A")
+    normal_b, _ = jobs.submit("ORD-B")
+    # Resubmitting a queued order more urgently moves it up
+    moved, created = jobs.submit("ORD-B", priority=PRIORITY_HIGH)
+    assert moved is normal_b and not created
+
+    runner.release.set()
+    for job in (blocker, low, normal_a, normal_b):
+        assert job.done.wait(5)
+    assert runner.ran == ["ORD-0", "ORD-B", "ORD-A", "ORD-LOW"]
+
+
+def test_queue_is_bounded():
+    runner = BlockingRunner()
+    jobs = JobQueue(runner, max_workers=1, max_queued=1)
+    jobs.submit("ORD-1")
+    assert runner.started.wait(5)
+    jobs.submit("ORD-2")
+    with pytest.raises(QueueFullError):
+        jobs.submit("ORD-3")
+    runner.release.set()
+
+
+def test_failed_job_records_error():
+    def runner(order_id):
+        raise RuntimeError("OCR failed")
+
+    jobs = JobQueue(runner, max_workers=1)
+    job, _ = jobs.submit("ORD-1")
+    assert job.done.wait(5)
+    assert job.status == FAILED
+    assert job.error == "OCR failed"
+    assert not jobs.is_active("ORD-1")
@@ -0,0 +1,126 @@
+import pytest
+
+from order_index import OrderIndex
+from results_store import JSONResultsStore
+
+ORDERS = 57
+
+
+@pytest.fixture
+def index(tmp_path):
+    orders_dir, results_dir = tmp_path / "orders", tmp_path / "results"
+    orders_dir.mkdir()
+    store = JSONResultsStore(results_dir)
+    for number in range(ORDERS):
+        order_id = f"ORD-{number:03d}"
+        (orders_dir / order_id).mkdir()
+        if number % 5 == 4:
+            continue  # Pending: no results yet
+        # Few distinct dates, so many orders share a sort value
+        store.write(order_id, {
+            "order_id": order_id,
+            "status": "Approved" if number % 3 == 0 else "Processed",
+            "processed_date": f"2024-05-{number % 7 + 1:02d} 10:00:00",
+            "extracted_data": {"patient_name": {"value": f"Patient {number}"}},
+        })
+    index = OrderIndex(orders_dir, store, results_dir / ".order_index.json", refresh_interval=0, persist_interval=0)
+    index.build()
+    return index
+
+
+def all_pages(index, limit, **filters):
+    orders, cursor, pages = [], None, 0
+    while True:
+        page, cursor = index.query(cursor=cursor, limit=limit, **filters)
+        orders.extend(entry["order_id"] for entry in page)
+        pages += 1
+        if cursor is None:
+            return orders, pages
+
+
+@pytest.mark.parametrize("sort", ["order_id", "processed_date"])
+@pytest.mark.parametrize("descending", [False, True])
+@pytest.mark.parametrize("limit", [1, 7, 100])
+def test_cursor_pages_match_unpaged_query(index, sort, descending, limit):
+    expected = [entry["order_id"] for entry in index.query(sort=sort, descending=descending)[0]]
+    paged, pages = all_pages(index, limit, sort=sort, descending=descending)
+    assert paged == expected
+    assert len(set(paged)) == ORDERS
+    assert pages == max(1, -(-ORDERS // limit))
+
+
+def test_entries_without_sort_value_come_last(index):
+    orders = [entry for entry in index.query(sort="processed_date", descending=True)[0]]
+    statuses = [entry["status"] for entry in orders]
+    first_pending = statuses.index("Pending")
+    assert set(statuses[first_pending:]) == {"Pending"}
+    dates = [entry["processed_date"] for entry in orders[:first_pending]]
+    assert dates == sorted(dates, reverse=True)
+
+
+def test_filters_apply_across_pages(index):
+    approved, _ = all_pages(index, 4, status="approved", sort="processed_date")
+    expected = [f"ORD-{n:03d}" for n in range(ORDERS) if n % 5 != 4 and n % 3 == 0]
+    assert sorted(approved) == expected
+
+    dated, _ = all_pages(index, 3, date_from="2024-05-02", date_to="2024-05-03", sort="processed_date")
+    assert sorted(dated) == [f"ORD-{n:03d}" for n in range(ORDERS) if n % 5 != 4 and n % 7 in (1, 2)]
+
+
+def test_cursor_for_another_sort_is_rejected(index):
+    _, cursor = index.query(sort="order_id", limit=5)
+    with pytest.raises(ValueError):
+        index.query(sort="processed_date", cursor=cursor, limit=5)
+    with pytest.raises(ValueError):
+        index.query(cursor="not-a-cursor", limit=5)
+
+
+def test_writes_are_persisted_in_one_flush(index, tmp_path):
+    path = tmp_path / "results" / ".order_index.json"
+    written = path.stat().st_mtime_ns
+    for number in (0, 1, 2):
+        order_id = f"ORD-{number:03d}"
+        index.results_store.update(order_id, lambda results: results.update(status="Ready for CRM"))
+        index.refresh_order(order_id)
+    assert path.stat().st_mtime_ns == written
+    assert index.get("ORD-001")["status"] == "Ready for CRM"
+
+    assert index.flush()
+    assert not index.flush()
+    reloaded = OrderIndex(index.input_dir, index.results_store, path, refresh_interval=0)
+    reloaded._load_persisted()
+    assert reloaded._orders["ORD-002"]["status"] == "Ready for CRM"
+
+
+def test_refresh_order_without_a_new_version_changes_nothing(index):
+    index.flush()
+    index.refresh_order("ORD-000")
+    assert not index.flush()
+
+
+def test_received_counts_folders_by_arrival_day(tmp_path):
+    import datetime
+    import os
+
+    from stats import OrderStats
+
+    orders_dir = tmp_path / "orders"
+    orders_dir.mkdir()
+    three_days_ago = datetime.datetime.now() - datetime.timedelta(days=3)
+    for order_id in ("ORD-NEW-1", "ORD-NEW-2", "ORD-OLD"):
+        (orders_dir / order_id).mkdir()
+    os.utime(orders_dir / "ORD-OLD", (three_days_ago.timestamp(),) * 2)
+
+    # Folders that arrived while the app was down count on the day they arrived
+    stats = OrderStats()
+    index = OrderIndex(orders_dir, JSONResultsStore(tmp_path / "results"), tmp_path / "index.json",
+                       refresh_interval=0, persist_interval=0, stats=stats)
+    index.build()
+    assert stats.received_on() == 2
+    assert stats.received_on(three_days_ago.date()) == 1
+
+    (orders_dir / "ORD-NEW-3").mkdir()
+    index.refresh()
+    assert stats.received_on() == 3
+    index.refresh()
+    assert stats.received_on() == 3
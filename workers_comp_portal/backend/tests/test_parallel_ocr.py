@@ -0,0 +1,94 @@
+import enum
+
+import process
+import pytest
+
+from conftest import make_order
+from ocr_cache import OCRCache
+from parallel_ocr import ParallelOCR, RateLimiter, is_transient_error
+from pipeline import OrderPipeline
+
+
+class ServiceUnavailable(Exception):
+    """Named like google.api_core.exceptions.ServiceUnavailable"""
+    code = 503
+
+
+class StatusCode(enum.Enum):
+    UNAVAILABLE = 14
+    INVALID_ARGUMENT = 3
+
+
+class RpcError(Exception):
+    def __init__(self, status):
+        super().__init__(status.name)
+        self.status = status
+
+    def code(self):
+        return self.status
+
+
+class HTTPError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.response = type("Response", (), {"status_code": status_code})()
+
+
+def test_transient_errors_by_type_code_or_leading_status():
+    assert is_transient_error(TimeoutError())
+    assert is_transient_error(ServiceUnavailable("The service is currently unavailable."))
+    assert is_transient_error(RpcError(StatusCode.UNAVAILABLE))
+    assert is_transient_error(HTTPError(429))
+    assert is_transient_error(RuntimeError("503 Service Unavailable"))
+    assert is_transient_error(RuntimeError("Deadline exceeded while reading"))
+
+
+def test_numbers_inside_a_message_are_not_transient():
+    assert not is_transient_error(ValueError("Page 500 of referral_503.pdf is unreadable"))
+    assert not is_transient_error(ValueError("Invalid document: order 1002 has 429 pages"))
+    assert not is_transient_error(RpcError(StatusCode.INVALID_ARGUMENT))
+    assert not is_transient_error(HTTPError(400))
+
+
+def test_only_real_ocr_calls_count_as_ocred(data_dirs):
+    folder = make_order(data_dirs["orders"], "ORD-1")
+    cache = OCRCache(data_dirs["ocr"] / ".cache")
+    runner = ParallelOCR(process.process_order_folder, max_workers=2, ocr_cache=cache)
+    pipeline = OrderPipeline(data_dirs["orders"], lambda: None, runner, process.format_llm_request,
+                             None, process.save_results, ocr_cache=cache)
+
+    pipeline.run_ocr("ORD-1")
+    assert cache.stats()["documents_ocred"] == 2
+
+    # One new document: the other two come from the per-document cache
+    (folder / "addendum.txt").write_text("ADDENDUM\n", encoding='utf-8')
+    pipeline.run_ocr("ORD-1")
+    stats = cache.stats()
+    assert stats["documents_ocred"] == 3
+    assert stats["documents_skipped"] == 2
+    runner._pool.shutdown()
+
+
+def test_one_worker_uses_the_per_document_cache_and_skips_hidden_files(data_dirs):
+    folder = make_order(data_dirs["orders"], "ORD-1")
+    cache = OCRCache(data_dirs["ocr"] / ".cache")
+    runner = ParallelOCR(process.process_order_folder, max_workers=1, ocr_cache=cache)
+    pipeline = OrderPipeline(data_dirs["orders"], lambda: None, runner, process.format_llm_request,
+                             None, process.save_results, ocr_cache=cache)
+    first = pipeline.run_ocr("ORD-1")
+    assert cache.stats()["documents_ocred"] == 2
+
+    # A sync client's hidden file is neither OCR'd nor part of the order's cache key
+    (folder / ".DS_Store").write_bytes(b"\0\0\0\1Bud1")
+    assert pipeline.run_ocr("ORD-1") == first
+    assert cache.stats()["documents_ocred"] == 2
+
+    (folder / "addendum.txt").write_text("ADDENDUM\n", encoding='utf-8')
+    pipeline.run_ocr("ORD-1")
+    assert cache.stats()["documents_ocred"] == 3
+    runner._pool.shutdown()
+
+
+def test_rate_limit_must_be_positive():
+    with pytest.raises(ValueError):
+        RateLimiter(0)
@@ -0,0 +1,81 @@
+import llm_client
+import process
+import pytest
+
+from conftest import make_order
+from incremental import STAGES
+from pipeline import OrderPipeline, PipelineError
+from results_store import JSONResultsStore
+
+
+class Counting:
+    def __init__(self, fn):
+        self.fn = fn
+        self.calls = 0
+
+    def __call__(self, *args, **kwargs):
+        self.calls += 1
+        return self.fn(*args, **kwargs)
+
+
+@pytest.fixture
+def pipeline(data_dirs):
+    store = JSONResultsStore(data_dirs["results"])
+    return OrderPipeline(data_dirs["orders"],
+                         initialize_documentai=lambda: None,
+                         process_order_folder=Counting(process.process_order_folder),
+                         format_llm_request=process.format_llm_request,
+                         call_llm_api=Counting(llm_client.call_llm_api),
+                         save_results=process.save_results,
+                         results_store=store)
+
+
+def test_run_saves_results_with_fingerprints(pipeline, data_dirs):
+    make_order(data_dirs["orders"], "ORD-1")
+    results = pipeline.run("ORD-1")
+    stored, _ = pipeline.results_store.read("ORD-1")
+    assert stored == results
+    assert results["status"] == "Processed"
+    info = results["pipeline"]
+    assert set(info["fingerprints"]) == set(STAGES[:4])
+    assert info["stages_run"] == list(STAGES)
+    assert info["extracted_baseline"] == results["extracted_data"]
+
+
+def test_unchanged_order_skips_llm(pipeline, data_dirs):
+    make_order(data_dirs["orders"], "ORD-1")
+    pipeline.run("ORD-1")
+    results = pipeline.run("ORD-1")
+    assert pipeline.call_llm_api.calls == 1
+    assert results["pipeline"]["stages_run"] == ["documents", "ocr", "llm_request"]
+
+
+def test_changed_document_with_same_answer_keeps_results(pipeline, data_dirs):
+    folder = make_order(data_dirs["orders"], "ORD-1")
+    first = pipeline.run("ORD-1")
+    (folder / "fax_cover.txt").write_text("FAX COVER (resent)\n", encoding='utf-8')
+    results = pipeline.run("ORD-1")
+    assert pipeline.call_llm_api.calls == 2
+    assert results["pipeline"]["stages_run"] == ["documents", "ocr", "llm_request", "llm_response"]
+    assert results["extracted_data"] == first["extracted_data"]
+
+
+def test_refresh_keeps_reviewer_edits(pipeline, data_dirs):
+    make_order(data_dirs["orders"], "ORD-1")
+    pipeline.run("ORD-1")
+
+    def edit(results):
+        results["extracted_data"]["patient_info"]["employer"]["value"] = "Corrected Employer"
+        results["last_edited"] = "2024-05-02"
+        results["selected_provider"] = {"provider_id": "PRV-000001"}
+    pipeline.results_store.update("ORD-1", edit)
+
+    results = pipeline.run("ORD-1", refresh=True)
+    assert pipeline.call_llm_api.calls == 2
+    assert results["extracted_data"]["patient_info"]["employer"]["value"] == "Corrected Employer"
+    assert results["selected_provider"] == {"provider_id": "PRV-000001"}
+
+
+def test_missing_order_folder(pipeline):
+    with pytest.raises(PipelineError):
+        pipeline.run("ORD-MISSING")
@@ -0,0 +1,45 @@
+import threading
+import time
+
+from PIL import Image
+
+from previews import PreviewRenderer
+
+
+def write_fax(path, pages=2):
+    frames = [Image.new("1", (800, 1000), color=page % 2) for page in range(pages)]
+    frames[0].save(path, save_all=True, append_images=frames[1:])
+    return path
+
+
+def test_pages_are_rendered_once_and_then_served_from_disk(tmp_path):
+    fax = write_fax(tmp_path / "fax.tiff")
+    renderer = PreviewRenderer(tmp_path / "previews", default_format="png")
+    data, mimetype, key = renderer.render(fax, page=1, size="thumb")
+    assert mimetype == "image/png"
+    assert max(Image.open(fax.parent / "previews" / f"{key}.bin").size) == 240
+
+    # A new renderer over the same directory (e.g. after a restart) reuses it
+    assert PreviewRenderer(tmp_path / "previews", default_format="png").render(fax, page=1, size="thumb")[0] == data
+    assert renderer.renders == 1
+
+
+def test_racing_requests_share_one_render(tmp_path):
+    fax = write_fax(tmp_path / "fax.tiff")
+    renderer = PreviewRenderer(tmp_path / "previews", default_format="png")
+    render = renderer._render
+
+    def slow_render(*args):
+        time.sleep(0.05)
+        return render(*args)
+
+    renderer._render = slow_render
+    threads = [threading.Thread(target=renderer.render, args=(fax,)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # Stragglers that start after the first render finished find it on disk
+    renderer.render(fax)
+    assert renderer.renders == 1
+    assert len(renderer._render_locks) == 0
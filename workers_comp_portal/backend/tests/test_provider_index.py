@@ -0,0 +1,73 @@
+import random
+
+import pytest
+
+import synthetic
+from provider_index import ProviderIndex, haversine_miles
+
+
+@pytest.fixture(scope="module")
+def providers():
+    rng = random.Random(7)
+    return [synthetic.provider(rng, number) for number in range(1, 801)]
+
+
+@pytest.fixture(scope="module")
+def index(providers):
+    index = ProviderIndex(lambda: providers, cell_degrees=0.5)
+    assert index.reload()
+    return index
+
+
+def brute_force(providers, latitude, longitude, proc_code=None, limit=5):
+    candidates = [p for p in providers if proc_code is None or proc_code in p["rates"]]
+    distances = sorted((haversine_miles(latitude, longitude, p["latitude"], p["longitude"]), p["provider_id"])
+                       for p in candidates)
+    return distances[:limit]
+
+
+def points(count=40):
+    rng = random.Random(11)
+    for _ in range(count):
+        _, _, lat, lon = rng.choice(synthetic.CITIES)
+        yield lat + rng.uniform(-3, 3), lon + rng.uniform(-3, 3)
+
+
+@pytest.mark.parametrize("proc_code", [None, "73721", "20610"])
+def test_nearest_matches_brute_force(index, providers, proc_code):
+    for latitude, longitude in points():
+        found = index.nearest(latitude, longitude, proc_code=proc_code, limit=5)
+        expected = brute_force(providers, latitude, longitude, proc_code)
+        assert [p["distance_miles"] for p in found] == [round(d, 2) for d, _ in expected]
+        assert {p["provider_id"] for p in found} == {provider_id for _, provider_id in expected}
+        if proc_code:
+            assert all(p["rate"] is not None for p in found)
+
+
+def test_match_procedures_matches_nearest(index):
+    for latitude, longitude in points(10):
+        matches = index.match_procedures(latitude, longitude, ["73721", "97110"], limit=3)
+        for code in ("73721", "97110"):
+            nearest = index.nearest(latitude, longitude, proc_code=code, limit=3)
+            assert [p["provider_id"] for p in matches[code]] == [p["provider_id"] for p in nearest]
+
+
+def test_far_away_point_still_finds_providers(index, providers):
+    found = index.nearest(61.2, -149.9, limit=3)  # Anchorage, far outside every cell
+    assert [p["provider_id"] for p in found] == [pid for _, pid in brute_force(providers, 61.2, -149.9, limit=3)]
+
+
+def test_failed_reload_keeps_old_snapshot(providers):
+    calls = []
+
+    def loader():
+        calls.append(1)
+        if len(calls) > 1:
+            raise RuntimeError("database unavailable")
+        return providers
+
+    index = ProviderIndex(loader)
+    assert index.reload()
+    assert not index.reload()
+    assert index.ready and index.last_error == "database unavailable"
+    assert index.nearest(39.95, -75.16, limit=1)
@@ -0,0 +1,49 @@
+import json
+import os
+import threading
+
+import pytest
+
+from results_store import JSONResultsStore
+
+
+def test_read_rides_out_a_half_written_results_file(tmp_path):
+    store = JSONResultsStore(tmp_path)
+    data = json.dumps({"order_id": "ORD-1", "status": "Processed"}, indent=2)
+    # Like save_results, which writes the file in place
+    store.path("ORD-1").write_text(data[:10], encoding='utf-8')
+    finish = threading.Timer(0.08, store.path("ORD-1").write_text, (data,), {"encoding": 'utf-8'})
+    finish.start()
+    try:
+        results, _ = store.read("ORD-1")
+    finally:
+        finish.join()
+    assert results["status"] == "Processed"
+    assert store.read_retries >= 1
+
+
+def test_read_of_a_corrupt_results_file_still_fails(tmp_path):
+    store = JSONResultsStore(tmp_path)
+    store.path("ORD-1").write_text("{not json", encoding='utf-8')
+    with pytest.raises(ValueError):
+        store.read("ORD-1")
+
+
+def test_writes_within_one_mtime_tick_get_different_versions(tmp_path):
+    store = JSONResultsStore(tmp_path)
+    store.write("ORD-1", {"order_id": "ORD-1", "status": "Processed"})
+    first = store.version("ORD-1")
+    mtime_ns = store.path("ORD-1").stat().st_mtime_ns
+    store.write("ORD-1", {"order_id": "ORD-1", "status": "Approved"})
+    os.utime(store.path("ORD-1"), ns=(mtime_ns, mtime_ns))
+    assert store.version("ORD-1") != first
+    assert store.versions() == {"ORD-1": store.version("ORD-1")}
+
+
+def test_order_locks_are_dropped_once_released(tmp_path):
+    store = JSONResultsStore(tmp_path)
+    for number in range(100):
+        with store.lock(f"ORD-{number}"):
+            with store.lock(f"ORD-{number}"):  # re-entrant
+                assert len(store._locks) == 1
+    assert len(store._locks) == 0
@@ -0,0 +1,111 @@
+import os
+
+import watcher
+from watcher import OrderFolderWatcher, NEW, MODIFIED, EXISTING
+
+
+def add_order(orders_dir, order_id, name="referral.pdf", data=b"%PDF-1.4"):
+    folder = orders_dir / order_id
+    folder.mkdir(exist_ok=True)
+    (folder / name).write_bytes(data)
+    return folder
+
+
+def make_watcher(orders_dir, handed_off, **options):
+    return OrderFolderWatcher(orders_dir, lambda order_id, reason: handed_off.append((order_id, reason)),
+                              settle_seconds=10, mode="poll", **options)
+
+
+def test_existing_folders_are_handed_off_at_start_up(tmp_path):
+    add_order(tmp_path, "ORD-1")
+    handed_off = []
+    order_watcher = make_watcher(tmp_path, handed_off)
+    order_watcher._baseline()
+    order_watcher.scan(full=False)
+    assert handed_off == [("ORD-1", EXISTING)]
+
+    remembered = []
+    order_watcher = make_watcher(tmp_path, remembered, include_existing=False)
+    order_watcher._baseline()
+    order_watcher.scan(full=False)
+    assert remembered == []
+
+
+def test_polling_only_looks_into_new_or_changed_folders(tmp_path, monkeypatch):
+    for number in range(20):
+        add_order(tmp_path, f"ORD-{number}")
+    handed_off = []
+    order_watcher = make_watcher(tmp_path, handed_off, include_existing=False)
+    order_watcher._baseline()
+
+    looked_into = []
+    folder_signature = watcher.folder_signature
+    monkeypatch.setattr(watcher, "folder_signature", lambda folder: (looked_into.append(folder.name),
+                                                                      folder_signature(folder))[1])
+    order_watcher.scan(now=0)
+    assert looked_into == []
+
+    add_order(tmp_path, "ORD-NEW")
+    folder = add_order(tmp_path, "ORD-3", name="addendum.pdf")
+    os.utime(folder, ns=(1, 1))  # coarse clocks: any mtime change counts
+    order_watcher.scan(now=0)
+    assert sorted(looked_into) == ["ORD-3", "ORD-NEW"]
+
+    # Settling folders are looked into on every pass until handed off
+    looked_into.clear()
+    order_watcher.scan(now=10)
+    assert sorted(looked_into) == ["ORD-3", "ORD-NEW"]
+    assert sorted(handed_off) == [("ORD-3", MODIFIED), ("ORD-NEW", NEW)]
+
+    looked_into.clear()
+    order_watcher.scan(now=20, deep=True)
+    assert len(looked_into) == 21
+
+
+def test_file_rewritten_in_place_is_caught_by_the_deep_scan(tmp_path):
+    folder = add_order(tmp_path, "ORD-1")
+    handed_off = []
+    order_watcher = make_watcher(tmp_path, handed_off, include_existing=False)
+    order_watcher._baseline()
+    mtime = folder.stat().st_mtime_ns
+
+    (folder / "referral.pdf").write_bytes(b"%PDF-1.4 rescanned")
+    os.utime(folder, ns=(mtime, mtime))
+    order_watcher.scan(now=0)
+    order_watcher.scan(now=10)
+    assert handed_off == []
+    order_watcher.scan(now=20, deep=True)
+    order_watcher.scan(now=30)
+    assert handed_off == [("ORD-1", MODIFIED)]
+
+
+def test_refused_hand_off_is_offered_again_after_a_backoff(tmp_path):
+    offered, full = [], [True]
+
+    def on_ready(order_id, reason):
+        offered.append(order_id)
+        if full[0]:
+            raise watcher.HandOffLater("processing queue full")
+
+    order_watcher = OrderFolderWatcher(tmp_path, on_ready, settle_seconds=10, mode="poll",
+                                       include_existing=False, retry_seconds=30, max_retry_seconds=60)
+    order_watcher._baseline()
+    for order_id in ("ORD-1", "ORD-2"):
+        add_order(tmp_path, order_id)
+    order_watcher.scan(now=0)
+    assert order_watcher.scan(now=10) == []
+    # The first refusal defers the rest of the pass without offering it
+    assert offered == ["ORD-1"]
+    assert order_watcher.stats()["pending"] == 2
+
+    order_watcher.scan(now=30)
+    assert offered == ["ORD-1"]
+    order_watcher.scan(now=40)
+    assert offered == ["ORD-1", "ORD-1"]
+
+    # Refused twice: the wait doubles
+    full[0] = False
+    order_watcher.scan(now=90)
+    assert offered == ["ORD-1", "ORD-1"]
+    assert sorted(order_watcher.scan(now=100)) == ["ORD-1", "ORD-2"]
+    assert order_watcher.stats()["pending"] == 0
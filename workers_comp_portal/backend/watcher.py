@@ -0,0 +1,292 @@
+"""Watches INPUT_DIR for new or changed order folders and hands them off once their files settle."""
+import os
+import threading
+import time
+
+from fingerprints import is_document_name
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:  # watchdog is optional; polling works everywhere
+    FileSystemEventHandler = object
+    Observer = None
+
+# Why a folder is handed off
+NEW = "new"
+MODIFIED = "modified"
+EXISTING = "existing"
+
+
+class HandOffLater(Exception):
+    """Raised by ``on_ready`` when the folder can't be taken right now (e.g. the job queue is full)"""
+
+
+def folder_signature(folder):
+    """(file count, total bytes, newest mtime) of the files directly in an order folder, or None if it's gone"""
+    count = size = newest = 0
+    try:
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                # Skip partial uploads and editor/sync temp files
+                if not is_document_name(entry.name):
+                    continue
+                if entry.is_file():
+                    stat = entry.stat()
+                    count += 1
+                    size += stat.st_size
+                    newest = max(newest, stat.st_mtime_ns)
+    except (FileNotFoundError, NotADirectoryError):
+        return None
+    return (count, size, newest)
+
+
+class _EventHandler(FileSystemEventHandler):
+    """Turns native filesystem events into "look at this order folder" hints"""
+
+    def __init__(self, watcher):
+        self.watcher = watcher
+
+    def on_any_event(self, event):
+        for path in (getattr(event, "src_path", None), getattr(event, "dest_path", None)):
+            if path:
+                self.watcher.touch(path)
+
+
+class OrderFolderWatcher:
+    """Finds order folders that are new or whose files changed, and calls
+    ``on_ready(order_id, reason)`` once a folder has stopped changing for
+    ``settle_seconds`` (files copied from a scanner or a synced drive arrive
+    over a while, and a half-copied folder must not be processed).
+
+    With watchdog installed (``mode="auto"`` or ``"native"``) inotify/FSEvents
+    events point the watcher at changed folders straight away and a full
+    rescan only runs every ``rescan_seconds`` as a safety net. Without it, or
+    with ``mode="poll"`` (network shares often deliver no events), INPUT_DIR
+    is listed every ``poll_seconds`` and only folders that are new, whose own
+    mtime moved (a file was added, removed or renamed) or that are still
+    settling are looked into; every folder is looked into each
+    ``rescan_seconds`` to catch files rewritten in place.
+
+    Folders present at start-up are reported as ``EXISTING`` (so orders that
+    arrived while the app was down get processed) unless ``include_existing``
+    is off, in which case they are only remembered, so later changes to them
+    are noticed.
+
+    If ``on_ready`` raises HandOffLater the folder, and the rest of that
+    pass's settled folders, go back to pending and are offered again after
+    ``retry_seconds``, doubling up to ``max_retry_seconds`` while it keeps
+    being refused.
+    """
+
+    def __init__(self, input_dir, on_ready, settle_seconds=10, poll_seconds=5, rescan_seconds=300,
+                 mode="auto", include_existing=True, retry_seconds=10, max_retry_seconds=300):
+        self.input_dir = input_dir
+        self.on_ready = on_ready
+        self.settle_seconds = settle_seconds
+        self.poll_seconds = poll_seconds
+        self.rescan_seconds = rescan_seconds
+        self.mode = mode
+        self.include_existing = include_existing
+        self.retry_seconds = retry_seconds
+        self.max_retry_seconds = max_retry_seconds
+        self._known = {}      # order_id -> signature last handed off (or seen at start-up)
+        self._pending = {}    # order_id -> (signature, reason, last changed at)
+        self._hinted = set()  # folders native events pointed at since the last pass
+        self._mtimes = {}     # order_id -> folder mtime at the last listing
+        self._refusals = {}   # order_id -> hand-offs refused in a row
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._observer = None
+        self.native = False
+        self.scans = 0
+        self.handed_off = 0
+        self.errors = 0
+        self.deferred = 0
+
+    # Lifecycle
+
+    def start(self):
+        if self._thread is not None:
+            return
+        if self.mode in ("auto", "native") and Observer is not None:
+            try:
+                self.input_dir.mkdir(parents=True, exist_ok=True)
+                self._observer = Observer()
+                self._observer.schedule(_EventHandler(self), str(self.input_dir), recursive=True)
+                self._observer.start()
+                self.native = True
+            except Exception as e:
+                print(f"Native file watching unavailable, polling instead: {str(e)}")
+                self._observer = None
+        elif self.mode == "native":
+            print("watchdog is not installed, polling for new orders instead")
+
+        self._thread = threading.Thread(target=self._run, name="order-folder-watcher", daemon=True)
+        self._thread.start()
+        print(f"Watching {self.input_dir} for new orders ({'native events' if self.native else 'polling'})")
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._observer is not None:
+            self._observer.stop()
+
+    def touch(self, path):
+        """Hint that something under ``path`` changed (called from native events)"""
+        try:
+            relative = os.path.relpath(path, self.input_dir)
+        except ValueError:
+            return
+        order_id = relative.split(os.sep)[0]
+        if order_id in ("", ".", "..") or order_id.startswith('.'):
+            return
+        with self._lock:
+            self._hinted.add(order_id)
+        self._wake.set()
+
+    # Scanning
+
+    def _folders(self):
+        """order_id -> mtime of every order folder, from one listing of INPUT_DIR"""
+        folders = {}
+        if not self.input_dir.exists():
+            return folders
+        with os.scandir(self.input_dir) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir() and not entry.name.startswith('.'):
+                        folders[entry.name] = entry.stat().st_mtime_ns
+                except FileNotFoundError:
+                    continue
+        return folders
+
+    def _check(self, order_id, now):
+        """Note whether one folder changed since it was last handed off"""
+        signature = folder_signature(self.input_dir / order_id)
+        if signature is None:
+            self._known.pop(order_id, None)
+            self._pending.pop(order_id, None)
+            return
+        pending = self._pending.get(order_id)
+        if pending is not None:
+            if pending[0] != signature:
+                # Still being written: restart the settle clock
+                self._pending[order_id] = (signature, pending[1], now)
+        elif self._known.get(order_id) != signature:
+            reason = MODIFIED if order_id in self._known else NEW
+            self._pending[order_id] = (signature, reason, now)
+
+    def scan(self, full=True, deep=False, now=None):
+        """One pass, then hand off settled folders.
+
+        ``full`` lists INPUT_DIR and looks into new, changed and settling
+        folders; ``deep`` looks into every folder; otherwise only folders
+        native events pointed at and settling ones are looked into.
+        """
+        now = now if now is not None else time.monotonic()
+        with self._lock:
+            hinted, self._hinted = self._hinted, set()
+        order_ids = hinted | set(self._pending)
+        if full or deep:
+            folders = self._folders()
+            for order_id in set(self._known) - set(folders):
+                order_ids.add(order_id)  # gone: _check forgets it
+            if deep:
+                order_ids.update(folders)
+            else:
+                order_ids.update(order_id for order_id, mtime in folders.items()
+                                 if self._mtimes.get(order_id) != mtime)
+            self._mtimes = folders
+        for order_id in order_ids:
+            self._check(order_id, now)
+        self.scans += 1
+
+        ready = []
+        for order_id, (signature, reason, changed_at) in list(self._pending.items()):
+            # Empty folders are still being created; wait for files
+            if signature[0] > 0 and now - changed_at >= self.settle_seconds:
+                del self._pending[order_id]
+                self._known[order_id] = signature
+                ready.append((changed_at, order_id, reason))
+
+        # Hand off in arrival order so the queue sees the oldest order first
+        ready.sort()
+        handed_off = []
+        for position, (changed_at, order_id, reason) in enumerate(ready):
+            try:
+                self.on_ready(order_id, reason)
+                self.handed_off += 1
+                self._refusals.pop(order_id, None)
+                handed_off.append(order_id)
+            except HandOffLater as e:
+                print(f"Order folder {order_id} not taken ({str(e)}), offering it again later")
+                for _, later_id, later_reason in ready[position:]:
+                    self._defer(later_id, later_reason, now)
+                break
+            except Exception as e:
+                self.errors += 1
+                print(f"Error handing off order folder {order_id}: {str(e)}")
+        return handed_off
+
+    def _defer(self, order_id, reason, now):
+        """Put a settled folder back in pending, to be offered again after a backoff"""
+        refusals = self._refusals.get(order_id, 0)
+        self._refusals[order_id] = refusals + 1
+        delay = min(self.max_retry_seconds, self.retry_seconds * 2 ** refusals)
+        # Settled already: make it due again ``delay`` seconds from now
+        self._pending[order_id] = (self._known.pop(order_id), reason, now + delay - self.settle_seconds)
+        self.deferred += 1
+
+    def _baseline(self):
+        """Remember what is already there at start-up"""
+        now = time.monotonic()
+        self._mtimes = self._folders()
+        for order_id in self._mtimes:
+            signature = folder_signature(self.input_dir / order_id)
+            if signature is None:
+                continue
+            if self.include_existing:
+                self._pending[order_id] = (signature, EXISTING, now - self.settle_seconds)
+            else:
+                self._known[order_id] = signature
+
+    def _run(self):
+        try:
+            self._baseline()
+        except Exception as e:
+            print(f"Error scanning {self.input_dir}: {str(e)}")
+        last_full = last_deep = time.monotonic()
+        interval = self.rescan_seconds if self.native else self.poll_seconds
+        while not self._stop.is_set():
+            # Wake on native events, and often enough to notice folders that have settled
+            self._wake.wait(min(interval, max(1, self.settle_seconds / 2)) if self._pending else interval)
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+            now = time.monotonic()
+            full = now - last_full >= interval
+            deep = now - last_deep >= self.rescan_seconds
+            try:
+                self.scan(full=full, deep=deep, now=now)
+            except Exception as e:
+                self.errors += 1
+                print(f"Error scanning {self.input_dir}: {str(e)}")
+            if full or deep:
+                last_full = now
+            if deep:
+                last_deep = now
+
+    def stats(self):
+        return {
+            "running": self._thread is not None and not self._stop.is_set(),
+            "native": self.native,
+            "pending": len(self._pending),
+            "known": len(self._known),
+            "scans": self.scans,
+            "handed_off": self.handed_off,
+            "errors": self.errors,
+            "deferred": self.deferred,
+        }
@@ -0,0 +1,36 @@
+"""Production entry point.
+
+    gunicorn -c gunicorn.conf.py wsgi:application    (Linux/macOS: forked workers, threads in each)
+    python wsgi.py                                    (waitress, one process with WEB_THREADS threads; works on Windows)
+
+``python app.py`` is still the development server with the debug reloader.
+"""
+import os
+import sys
+
+from app import create_app, start_background_services, WATCH_ORDERS, WEB_THREADS
+
+application = create_app()
+
+
+def main():
+    try:
+        from waitress import serve
+    except ImportError:
+        print("waitress is not installed (pip install waitress), or run under gunicorn -c gunicorn.conf.py wsgi:application")
+        return 1
+
+    start_background_services(watch=WATCH_ORDERS)
+    serve(application,
+          host=os.environ.get('WEB_HOST', '127.0.0.1'),
+          port=int(os.environ.get('PORT', 5003)),
+          # Same default as app.py, which lets event streams (/api/events) take at most half of them
+          threads=WEB_THREADS,
+          # Idle keep-alive connections don't hold a thread, so this can be well above WEB_THREADS
+          connection_limit=int(os.environ.get('WEB_CONNECTION_LIMIT', 200)),
+          channel_timeout=int(os.environ.get('WEB_TIMEOUT', 120)))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())